@@ -0,0 +1,274 @@
+"""
+Audit Archive Module für Praivio
+Monatliche Partitionierung der Audit-Logs mit komprimierten, versiegelten Archiv-Segmenten
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import datetime, date
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Iterator
+
+from database import BaseDatabaseManager
+from audit_logger import AuditLogger
+from data_export import iter_keyset_pages
+
+logger = logging.getLogger(__name__)
+
+def _month_start(day: date, months_back: int = 0) -> date:
+    """Erster Tag des Monats, optional um months_back Monate zurückversetzt"""
+    month_index = day.year * 12 + (day.month - 1) - months_back
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+def _period_bounds(period: str) -> tuple:
+    """Liefert (start, ende) einer Periode 'YYYY-MM' als vergleichbare Strings"""
+    start = datetime.strptime(period, "%Y-%m").date()
+    end = _month_start(start, months_back=-1)
+    return start.isoformat(), end.isoformat()
+
+class AuditArchive:
+    """Verwaltet heiße und archivierte Audit-Partitionen"""
+    
+    def __init__(self, db_manager: BaseDatabaseManager, audit_logger: AuditLogger,
+                 archive_dir: str = "./data/audit_archive", hot_months: int = 2,
+                 retention_months: int = 120):
+        self.db_manager = db_manager
+        self.audit_logger = audit_logger
+        self.archive_dir = Path(archive_dir)
+        self.hot_months = max(1, hot_months)
+        self.retention_months = retention_months
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        
+        self._seal_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+    
+    def start(self, interval_hours: float = 24.0):
+        """Startet die periodische Versiegelung und Retention im Hintergrund"""
+        if self._worker is not None:
+            return
+        self._stop_event.clear()
+        
+        def run():
+            while not self._stop_event.is_set():
+                try:
+                    self.run_once()
+                except Exception as e:
+                    logger.error(f"Audit archive run failed: {e}")
+                self._stop_event.wait(interval_hours * 3600)
+        
+        self._worker = threading.Thread(target=run, name="audit-archive", daemon=True)
+        self._worker.start()
+    
+    def stop(self):
+        """Stoppt den Hintergrund-Thread"""
+        if self._worker is None:
+            return
+        self._stop_event.set()
+        self._worker.join(30)
+        self._worker = None
+    
+    def run_once(self) -> Dict[str, Any]:
+        """Versiegelt abgeschlossene Partitionen und wendet die Retention an"""
+        sealed = self.seal_closed_partitions()
+        expired = self.apply_retention()
+        return {'sealed': sealed, 'expired': expired}
+    
+    def hot_cutoff(self) -> str:
+        """Alles vor diesem Datum gehört in eine versiegelte Partition"""
+        return _month_start(date.today(), self.hot_months - 1).isoformat()
+    
+    def seal_closed_partitions(self) -> List[Dict[str, Any]]:
+        """Exportiert alle abgeschlossenen Monate aus der heißen Tabelle ins Archiv"""
+        with self._seal_lock:
+            # Gepufferte Einträge zuerst schreiben, damit nichts im Puffer zurückbleibt
+            self.audit_logger.flush()
+            
+            periods = self.db_manager.get_audit_periods_before(self.hot_cutoff())
+            
+            return [self._seal_period(period) for period in periods]
+    
+    def _seal_period(self, period: str) -> Dict[str, Any]:
+        """Schreibt ein neues, unveränderliches Segment für eine Periode und löscht die Zeilen"""
+        start, end = _period_bounds(period)
+        
+        segment = self.db_manager.next_audit_partition_segment(period)
+        final_path = self.archive_dir / f"audit_logs_{period}_{segment:04d}.ndjson.gz"
+        tmp_path = final_path.with_suffix(".tmp")
+        
+        row_count = 0
+        min_id = max_id = None
+        with open(tmp_path, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as gz:
+                for record in self.db_manager.iter_audit_logs_range(start, end):
+                    gz.write((json.dumps(record, default=str) + "\n").encode("utf-8"))
+                    row_count += 1
+                    min_id = record['id'] if min_id is None else min(min_id, record['id'])
+                    max_id = record['id'] if max_id is None else max(max_id, record['id'])
+            raw.flush()
+            os.fsync(raw.fileno())
+        
+        if row_count == 0:
+            tmp_path.unlink()
+            return {'period': period, 'rows': 0}
+        
+        sha256 = self._file_sha256(tmp_path)
+        os.replace(tmp_path, final_path)
+        os.chmod(final_path, 0o444)
+        self._fsync_dir()
+        
+        # Partition registrieren und exportierte Zeilen atomar aus der heißen Tabelle entfernen
+        self.db_manager.seal_audit_partition({
+            'period': period,
+            'segment': segment,
+            'archive_path': str(final_path),
+            'row_count': row_count,
+            'min_id': min_id,
+            'max_id': max_id,
+            'sha256': sha256
+        }, start, end)
+        
+        logger.info(f"Sealed audit partition {period} segment {segment}: {row_count} rows -> {final_path}")
+        return {'period': period, 'segment': segment, 'rows': row_count, 'path': str(final_path)}
+    
+    def apply_retention(self) -> List[str]:
+        """Löscht Archiv-Segmente, die älter als die Aufbewahrungsfrist sind"""
+        if self.retention_months <= 0:
+            return []
+        
+        cutoff = _month_start(date.today(), self.retention_months).strftime("%Y-%m")
+        expired = []
+        for partition in self.db_manager.get_audit_partitions():
+            if partition['status'] != 'sealed' or partition['period'] >= cutoff:
+                continue
+            path = Path(partition['archive_path'])
+            if path.exists():
+                os.chmod(path, 0o644)
+                path.unlink()
+            self.db_manager.set_audit_partition_status(partition['id'], 'expired')
+            expired.append(path.name)
+        
+        if expired:
+            logger.info(f"Audit retention removed {len(expired)} archive segments older than {cutoff}")
+        return expired
+    
+    def list_partitions(self) -> List[Dict[str, Any]]:
+        """Listet alle versiegelten und abgelaufenen Partitionen"""
+        return self.db_manager.get_audit_partitions()
+    
+    def verify_partition(self, partition: Dict[str, Any]) -> bool:
+        """Prüft die Prüfsumme eines Archiv-Segments"""
+        path = Path(partition['archive_path'])
+        return path.exists() and self._file_sha256(path) == partition['sha256']
+    
+    def _sealed_partitions(self, start: Optional[str], end: Optional[str], descending: bool = False) -> List[Dict[str, Any]]:
+        """Versiegelte Partitionen, die den Zeitraum [start, end) überlappen"""
+        partitions = [
+            partition for partition in self.db_manager.get_audit_partitions()
+            if partition['status'] == 'sealed'
+        ]
+        # get_audit_partitions liefert absteigend sortiert
+        if not descending:
+            partitions.reverse()
+        
+        result = []
+        for partition in partitions:
+            period_start, period_end = _period_bounds(partition['period'])
+            if (start and period_end <= start) or (end and period_start >= end):
+                continue
+            result.append(partition)
+        return result
+    
+    def _read_segment(self, path: str, start: Optional[str], end: Optional[str]) -> Iterator[Dict[str, Any]]:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if start and record['created_at'] < start:
+                    continue
+                if end and record['created_at'] >= end:
+                    continue
+                yield record
+    
+    def iter_archived(self, start: Optional[str] = None, end: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Iteriert in Segment-Reihenfolge über archivierte Einträge im Zeitraum [start, end)"""
+        for partition in self._sealed_partitions(start, end):
+            yield from self._read_segment(partition['archive_path'], start, end)
+    
+    def iter_export_chunks(self, action: Optional[str] = None, success: Optional[bool] = None,
+                           start: Optional[str] = None, end: Optional[str] = None,
+                           chunk_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+        """Chunks für Exporte: zuerst archivierte Einträge (chronologisch), dann die heiße Tabelle (neueste zuerst)
+        
+        Versiegelte Monate stehen nicht mehr in audit_logs und fehlten sonst im Export.
+        """
+        archive_end = min(end, self.hot_cutoff()) if end else self.hot_cutoff()
+        chunk: List[Dict[str, Any]] = []
+        for record in self.iter_archived(start, archive_end):
+            if action and record.get('action') != action:
+                continue
+            if success is not None and bool(record.get('success')) != success:
+                continue
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+        yield from iter_keyset_pages(
+            self.db_manager.get_audit_logs_page, chunk_size=chunk_size,
+            action=action, success=success, start=start, end=end
+        )
+    
+    def query(self, user_id: Optional[str] = None, action: Optional[str] = None,
+              start: Optional[str] = None, end: Optional[str] = None,
+              limit: int = 100) -> List[Dict[str, Any]]:
+        """Sucht Audit-Einträge über heiße und archivierte Partitionen, neueste zuerst"""
+        if limit < 1:
+            raise ValueError(f"Ungültiges Seitenlimit: {limit}")
+        results = self.db_manager.get_audit_logs_page(
+            user_id=user_id, limit=limit, action=action, start=start, end=end
+        )['items']
+        
+        if len(results) >= limit:
+            return results
+        
+        # Archiv monatsweise von neu nach alt lesen, bis das Limit erreicht ist
+        archive_end = min(end, self.hot_cutoff()) if end else self.hot_cutoff()
+        partitions = self._sealed_partitions(start, archive_end, descending=True)
+        for index, partition in enumerate(partitions):
+            if index > 0 and partitions[index - 1]['period'] == partition['period']:
+                continue
+            period_records = [
+                record
+                for segment in partitions if segment['period'] == partition['period']
+                for record in self._read_segment(segment['archive_path'], start, archive_end)
+                if (not user_id or str(record.get('user_id')) == str(user_id))
+                and (not action or record.get('action') == action)
+            ]
+            period_records.sort(key=lambda record: record['created_at'], reverse=True)
+            results.extend(period_records[:limit - len(results)])
+            if len(results) >= limit:
+                break
+        
+        return results
+    
+    def _file_sha256(self, path: Path) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    def _fsync_dir(self):
+        try:
+            fd = os.open(self.archive_dir, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
@@ -3,33 +3,228 @@ Audit Logger Module für Praivio
 Saubere Implementierung für Compliance und Security
 """
 
+import asyncio
 import logging
+import queue
+import threading
+import time
 from datetime import datetime
-from typing import Optional
-from database import DatabaseManager
+from typing import Optional, List, Dict, Any, Tuple
+from database import BaseDatabaseManager
 
 logger = logging.getLogger(__name__)
 
+# (user_id, action, details, ip_address, success, error_message, created_at, enqueued_at)
+AuditEntry = Tuple[Optional[str], str, str, str, bool, Optional[str], datetime, float]
+
+def _on_event_loop() -> bool:
+    """True, wenn der Aufrufer im Thread einer laufenden asyncio-Loop ist"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
 class AuditLogger:
-    """Saubere Audit-Logging-Implementierung"""
+    """Saubere Audit-Logging-Implementierung
+    
+    Overflow-Policy 'block' wartet bei vollem Puffer nur in Threads ohne Event-Loop; aus
+    async-Code (Middleware, Endpunkte) wird stattdessen synchron geschrieben wie bei 'sync'.
+    """
+    
+    DURABILITY_MODES = ('sync', 'buffered')
+    OVERFLOW_POLICIES = ('sync', 'block', 'drop')
+    # Erlaubte Werte für PRAGMA synchronous (wird in das Statement eingesetzt)
+    SYNCHRONOUS_MODES = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
     
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self, db_manager: BaseDatabaseManager, durability: str = "buffered",
+                 flush_interval_ms: int = 200, batch_size: int = 500, queue_size: int = 10000,
+                 overflow_policy: str = "sync", synchronous: str = "NORMAL"):
+        if durability not in self.DURABILITY_MODES:
+            raise ValueError(f"Unbekannter Audit-Durability-Modus: {durability}")
+        if overflow_policy not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"Unbekannte Overflow-Policy: {overflow_policy}")
+        if synchronous.upper() not in self.SYNCHRONOUS_MODES:
+            raise ValueError(f"Unbekannter synchronous-Modus: {synchronous}")
+        
         self.db_manager = db_manager
+        self.durability = durability
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.batch_size = batch_size
+        self.overflow_policy = overflow_policy
+        self.synchronous = synchronous.upper()
+        
+        self._queue: "queue.Queue[AuditEntry]" = queue.Queue(maxsize=queue_size)
+        self._stop_event = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            'enqueued': 0,
+            'flushed_rows': 0,
+            'batches': 0,
+            'dropped': 0,
+            'sync_fallbacks': 0,
+            'failed_rows': 0,
+            'last_batch_size': 0,
+            'last_flush_duration_ms': 0.0,
+            'last_flush_lag_ms': 0.0,
+            'max_flush_lag_ms': 0.0
+        }
+    
+    def start(self):
+        """Startet den Hintergrund-Writer (nur im Modus 'buffered')"""
+        if self.durability != 'buffered' or self._writer is not None:
+            return
+        self._stop_event.clear()
+        self._writer = threading.Thread(target=self._run_writer, name="audit-writer", daemon=True)
+        self._writer.start()
+        logger.info(
+            f"Audit writer started (interval={self.flush_interval * 1000:.0f}ms, "
+            f"batch={self.batch_size}, overflow={self.overflow_policy})"
+        )
+    
+    def stop(self, timeout: float = 10.0):
+        """Stoppt den Writer und schreibt alle gepufferten Einträge"""
+        if self._writer is None:
+            return
+        self._stop_event.set()
+        self._writer.join(timeout)
+        if self._writer.is_alive():
+            logger.error(f"Audit writer did not drain within {timeout}s, {self._queue.qsize()} entries pending")
+        else:
+            self._writer = None
+            # Einträge, die nach dem letzten Durchlauf eingereiht wurden
+            self._drain_remaining()
+        logger.info("Audit writer stopped")
+    
+    def flush(self):
+        """Blockiert, bis alle bisher eingereihten Einträge geschrieben wurden"""
+        if self._writer is not None:
+            self._queue.join()
     
-    def log_user_action(self, user_id: Optional[str], action: str, details: str, 
+    def log_user_action(self, user_id: Optional[str], action: str, details: str,
                        ip_address: str, success: bool = True, error_message: Optional[str] = None):
         """Loggt Benutzeraktionen für Compliance"""
+        entry = (user_id, action, details, ip_address, success, error_message, datetime.now(), time.monotonic())
+        
+        if self._writer is None:
+            self._write_batch([entry])
+            return
+        
         try:
-            with self.db_manager.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO audit_logs (user_id, action, details, ip_address, success, error_message, created_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, (user_id, action, details, ip_address, success, error_message, datetime.now()))
-                conn.commit()
-        except Exception as e:
-            logger.error(f"Audit logging failed: {e}")
-            # Don't raise the exception - audit logging should not break the main functionality
+            if self.overflow_policy == 'block' and not _on_event_loop():
+                self._queue.put(entry)
+            else:
+                self._queue.put_nowait(entry)
+            self._increment('enqueued')
+        except queue.Full:
+            if self.overflow_policy == 'drop':
+                self._increment('dropped')
+                logger.warning(f"Audit queue full, dropped {action} event")
+            else:
+                # Kein Datenverlust: bei vollem Puffer synchron schreiben (auch 'block' auf der Event-Loop)
+                self._increment('sync_fallbacks')
+                self._write_batch([entry])
+    
+    def _increment(self, metric: str, value: int = 1):
+        with self._metrics_lock:
+            self._metrics[metric] += value
+    
+    def _run_writer(self):
+        """Hintergrund-Writer: sammelt Einträge und schreibt sie als Gruppen-Commit"""
+        while True:
+            batch = self._collect_batch()
+            if batch:
+                try:
+                    self._write_batch(batch)
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+            elif self._stop_event.is_set():
+                break
+    
+    def _collect_batch(self) -> List[AuditEntry]:
+        """Wartet höchstens flush_interval bzw. bis batch_size Einträge vorliegen"""
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop_event.is_set():
+                # Beim Herunterfahren nicht mehr warten, nur noch leeren
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except queue.Empty:
+                    break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+    
+    def _drain_remaining(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self._write_batch(batch)
+            for _ in batch:
+                self._queue.task_done()
+    
+    def _write_batch(self, batch: List[AuditEntry], retries: int = 3):
+        """Schreibt einen Batch in einer Transaktion"""
+        rows = [entry[:7] for entry in batch]
+        start = time.monotonic()
+        for attempt in range(1, retries + 1):
+            try:
+                self.db_manager.insert_audit_logs(rows, synchronous=self.synchronous)
+                break
+            except Exception as e:
+                if attempt == retries:
+                    # Don't raise the exception - audit logging should not break the main functionality
+                    logger.error(f"Audit logging failed, {len(batch)} entries lost: {e}")
+                    self._increment('failed_rows', len(batch))
+                    return
+                logger.warning(f"Audit logging attempt {attempt} failed: {e}")
+                time.sleep(0.05 * attempt)
+        
+        now = time.monotonic()
+        lag_ms = (now - min(entry[7] for entry in batch)) * 1000
+        with self._metrics_lock:
+            self._metrics['flushed_rows'] += len(batch)
+            self._metrics['batches'] += 1
+            self._metrics['last_batch_size'] = len(batch)
+            self._metrics['last_flush_duration_ms'] = round((now - start) * 1000, 2)
+            self._metrics['last_flush_lag_ms'] = round(lag_ms, 2)
+            self._metrics['max_flush_lag_ms'] = round(max(self._metrics['max_flush_lag_ms'], lag_ms), 2)
+        
+        self.db_manager.notify_write('audit_logs', [
+            {'user_id': entry[0], 'action': entry[1], 'success': entry[4]} for entry in batch
+        ])
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Liefert Queue- und Flush-Metriken des Writers"""
+        with self._queue.mutex:
+            depth = len(self._queue.queue)
+            oldest = self._queue.queue[0][7] if depth else None
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        metrics.update({
+            'durability': self.durability,
+            'overflow_policy': self.overflow_policy,
+            'running': self._writer is not None,
+            'queue_depth': depth,
+            'queue_capacity': self._queue.maxsize,
+            'queue_lag_ms': round((time.monotonic() - oldest) * 1000, 2) if oldest is not None else 0.0
+        })
+        return metrics
     
     def log_data_access(self, user_id: str, data_type: str, record_id: int, ip_address: str):
         """Loggt Datenzugriffe für DSGVO-Compliance"""
@@ -77,4 +272,4 @@ class AuditLogger:
             details=f"User logout: {email}",
             ip_address=ip_address,
             success=True
-        ) 
\ No newline at end of file
+        )
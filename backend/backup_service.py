@@ -0,0 +1,308 @@
+"""
+Backup Service Module für Praivio
+Online-Backups der SQLite-Dateien über die Backup-API: schrittweise, komprimiert, verifiziert
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional, List, Dict, Any
+
+from database import BaseDatabaseManager
+
+logger = logging.getLogger(__name__)
+
+class BackupInProgressError(RuntimeError):
+    """Es läuft bereits ein Backup"""
+
+class _BackupRestarted(Exception):
+    """Die Quelle wurde zu oft während des schrittweisen Kopierens geändert"""
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class BackupService:
+    """Erstellt Snapshots aller SQLite-Dateien (mit Sharding: Katalog und Shards)
+    
+    Kopiert wird mit sqlite3.Connection.backup in kleinen Seitenschritten mit Pause dazwischen,
+    Schreiber warten daher höchstens einen Schritt lang. Jede Kopie wird komprimiert und
+    inhaltsadressiert unter objects/ abgelegt; unveränderte Dateien verweisen auf das Objekt
+    des vorherigen Snapshots (inkrementell auf Dateiebene). Neue Objekte werden nach dem
+    Schreiben probeweise wiederhergestellt und per integrity_check geprüft.
+    """
+    
+    def __init__(self, db_manager: BaseDatabaseManager, backup_dir: str = "./backups",
+                 pages_per_step: int = 256, step_pause: float = 0.05, retention: int = 14,
+                 max_restarts: int = 20):
+        self.db_manager = db_manager
+        self.backup_dir = Path(backup_dir)
+        self.objects_dir = self.backup_dir / "objects"
+        self.snapshots_dir = self.backup_dir / "snapshots"
+        self.pages_per_step = pages_per_step
+        self.step_pause = step_pause
+        self.retention = retention
+        self.max_restarts = max_restarts
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.snapshots_dir.mkdir(parents=True, exist_ok=True)
+        
+        self._run_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        self._progress: Optional[Dict[str, Any]] = None
+        self._metrics = {
+            'runs': 0,
+            'failures': 0,
+            'last_error': None,
+            'max_step_ms': 0.0
+        }
+    
+    # Zeitplan
+    def start(self, daily_at: str = "02:30"):
+        """Startet tägliche Snapshots zur Uhrzeit daily_at (HH:MM)"""
+        if self._worker is not None:
+            return
+        self._stop_event.clear()
+        at = datetime.strptime(daily_at, "%H:%M").time()
+        
+        def run():
+            while True:
+                now = datetime.now()
+                next_run = datetime.combine(now.date(), at)
+                if next_run <= now:
+                    next_run += timedelta(days=1)
+                if self._stop_event.wait((next_run - now).total_seconds()):
+                    break
+                try:
+                    self.run_backup()
+                except BackupInProgressError:
+                    logger.info("Scheduled backup skipped, another backup is running")
+                except Exception as e:
+                    logger.error(f"Scheduled backup failed: {e}")
+        
+        self._worker = threading.Thread(target=run, name="backup-scheduler", daemon=True)
+        self._worker.start()
+    
+    def stop(self):
+        """Stoppt den Zeitplan; ein laufendes Backup bricht nach dem aktuellen Schritt ab"""
+        self._stop_event.set()
+        if self._worker is None:
+            return
+        self._worker.join(30)
+        self._worker = None
+    
+    def trigger(self) -> Dict[str, Any]:
+        """Startet ein Backup im Hintergrund (für den Admin-Endpunkt)"""
+        if self._run_lock.locked():
+            raise BackupInProgressError("Es läuft bereits ein Backup")
+        
+        def run():
+            try:
+                self.run_backup()
+            except BackupInProgressError:
+                pass
+            except Exception as e:
+                logger.error(f"Manual backup failed: {e}")
+        
+        threading.Thread(target=run, name="backup-manual", daemon=True).start()
+        return self.get_status()
+    
+    # Snapshot
+    def run_backup(self) -> Dict[str, Any]:
+        """Erstellt einen Snapshot aller Quellen und wendet danach die Retention an"""
+        if not self._run_lock.acquire(blocking=False):
+            raise BackupInProgressError("Es läuft bereits ein Backup")
+        try:
+            sources = self.db_manager.get_backup_sources()
+            if not sources:
+                raise RuntimeError("Das Speicher-Backend hat keine SQLite-Dateien zu sichern")
+            
+            started = time.perf_counter()
+            snapshot_id = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+            previous = self._latest_snapshot()
+            with self._lock:
+                self._progress = {'snapshot': snapshot_id, 'started_at': datetime.now().isoformat(),
+                                  'sources': len(sources), 'completed': 0, 'current': None}
+            
+            manifest = {'id': snapshot_id, 'created_at': datetime.now().isoformat(), 'files': {}}
+            try:
+                for name, path in sources.items():
+                    with self._lock:
+                        self._progress['current'] = name
+                    reuse = previous['files'].get(name) if previous else None
+                    manifest['files'][name] = self._backup_source(path, reuse)
+                    with self._lock:
+                        self._progress['completed'] += 1
+            except Exception as e:
+                self._metrics['failures'] += 1
+                self._metrics['last_error'] = str(e)
+                raise
+            finally:
+                with self._lock:
+                    self._progress = None
+            
+            manifest['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+            manifest['verified'] = all(entry['verified'] for entry in manifest['files'].values())
+            self._write_manifest(manifest)
+            self._metrics['runs'] += 1
+            self._metrics['last_error'] = None
+            self.apply_retention()
+            logger.info(f"Backup {snapshot_id} finished: {len(sources)} files in {manifest['duration_ms']} ms")
+            return manifest
+        finally:
+            self._run_lock.release()
+    
+    def _backup_source(self, path: str, previous: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Kopiert eine Datei, komprimiert sie und verifiziert neue Objekte"""
+        with tempfile.TemporaryDirectory(dir=self.backup_dir) as tmp:
+            copy_path = Path(tmp) / "copy.db"
+            restarts = self._copy(path, copy_path)
+            sha256 = _file_sha256(copy_path)
+            entry = {
+                'object': f"{sha256}.db.gz",
+                'sha256': sha256,
+                'size_bytes': copy_path.stat().st_size,
+                'restarts': restarts
+            }
+            object_path = self.objects_dir / entry['object']
+            
+            if previous and previous['sha256'] == sha256 and object_path.exists():
+                # Unverändert seit dem letzten Snapshot
+                return {**entry, 'compressed_bytes': object_path.stat().st_size,
+                        'reused': True, 'verified': previous.get('verified', False)}
+            
+            tmp_object = Path(tmp) / entry['object']
+            with open(copy_path, "rb") as src, open(tmp_object, "wb") as raw:
+                with gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as gz:
+                    shutil.copyfileobj(src, gz, 1024 * 1024)
+                raw.flush()
+                os.fsync(raw.fileno())
+            os.replace(tmp_object, object_path)
+        
+        return {**entry, 'compressed_bytes': object_path.stat().st_size,
+                'reused': False, 'verified': self.verify_object(object_path, sha256)}
+    
+    def _copy(self, path: str, target: Path) -> int:
+        """Schrittweise Online-Kopie, liefert die Anzahl der Neustarts
+        
+        Ändert eine andere Verbindung die Quelle, beginnt die Backup-API von vorn. Nach
+        max_restarts Neustarts wird der Rest in einem Schritt kopiert: im WAL-Modus hält
+        das nur einen Lese-Snapshot und blockiert keine Schreiber.
+        """
+        state = {'remaining': None, 'restarts': 0, 'step_started': time.perf_counter()}
+        
+        def progress(status, remaining, total):
+            step_ms = (time.perf_counter() - state['step_started']) * 1000
+            self._metrics['max_step_ms'] = max(self._metrics['max_step_ms'], round(step_ms, 1))
+            if state['remaining'] is not None and remaining > state['remaining']:
+                state['restarts'] += 1
+            state['remaining'] = remaining
+            with self._lock:
+                if self._progress is not None:
+                    self._progress.update({'pages_total': total, 'pages_remaining': remaining})
+            if self._stop_event.is_set():
+                raise RuntimeError("Backup abgebrochen (Dienst wird beendet)")
+            if state['restarts'] > self.max_restarts:
+                raise _BackupRestarted()
+            time.sleep(self.step_pause)
+            state['step_started'] = time.perf_counter()
+        
+        source = sqlite3.connect(f"{Path(path).resolve().as_uri()}?mode=ro", uri=True)
+        dest = sqlite3.connect(str(target))
+        try:
+            try:
+                source.backup(dest, pages=self.pages_per_step, progress=progress)
+            except _BackupRestarted:
+                logger.warning(f"Backup of {path} restarted {state['restarts']} times, copying the rest in one step")
+                source.backup(dest, pages=-1)
+            # Eigenständige Datei ohne WAL
+            dest.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            dest.close()
+            source.close()
+        return state['restarts']
+    
+    def verify_object(self, object_path: Path, sha256: str) -> bool:
+        """Stellt ein Objekt probeweise wieder her: Prüfsumme und integrity_check"""
+        with tempfile.TemporaryDirectory(dir=self.backup_dir) as tmp:
+            restored = Path(tmp) / "restored.db"
+            with gzip.open(object_path, "rb") as gz, open(restored, "wb") as out:
+                shutil.copyfileobj(gz, out, 1024 * 1024)
+            if _file_sha256(restored) != sha256:
+                logger.error(f"Backup object {object_path.name} failed checksum verification")
+                return False
+            conn = sqlite3.connect(str(restored))
+            try:
+                result = conn.execute("PRAGMA integrity_check").fetchall()
+            finally:
+                conn.close()
+        if [row[0] for row in result] != ["ok"]:
+            logger.error(f"Backup object {object_path.name} failed integrity_check: {result[:5]}")
+            return False
+        return True
+    
+    # Manifeste und Retention
+    def _write_manifest(self, manifest: Dict[str, Any]):
+        final_path = self.snapshots_dir / f"{manifest['id']}.json"
+        tmp_path = final_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, final_path)
+    
+    def list_snapshots(self) -> List[Dict[str, Any]]:
+        """Alle Snapshots, neueste zuerst"""
+        snapshots = []
+        for path in sorted(self.snapshots_dir.glob("*.json"), reverse=True):
+            with open(path) as f:
+                snapshots.append(json.load(f))
+        return snapshots
+    
+    def _latest_snapshot(self) -> Optional[Dict[str, Any]]:
+        snapshots = self.list_snapshots()
+        return snapshots[0] if snapshots else None
+    
+    def apply_retention(self) -> List[str]:
+        """Behält die neuesten retention Snapshots und löscht nicht mehr referenzierte Objekte"""
+        if self.retention <= 0:
+            return []
+        snapshots = self.list_snapshots()
+        expired = [snapshot['id'] for snapshot in snapshots[self.retention:]]
+        for snapshot_id in expired:
+            (self.snapshots_dir / f"{snapshot_id}.json").unlink(missing_ok=True)
+        
+        referenced = {
+            entry['object'] for snapshot in snapshots[:self.retention] for entry in snapshot['files'].values()
+        }
+        for path in self.objects_dir.glob("*.db.gz"):
+            if path.name not in referenced:
+                path.unlink()
+        if expired:
+            logger.info(f"Backup retention removed {len(expired)} snapshots")
+        return expired
+    
+    def get_status(self) -> Dict[str, Any]:
+        """Laufendes Backup und letzter Snapshot für den Admin-Endpunkt"""
+        with self._lock:
+            progress = dict(self._progress) if self._progress else None
+        latest = self._latest_snapshot()
+        return {
+            'running': progress is not None,
+            'progress': progress,
+            'latest': latest,
+            'metrics': dict(self._metrics)
+        }
@@ -0,0 +1,158 @@
+"""
+Blob GC Module für Praivio
+Verzögertes Löschen deduplizierter Datei-Inhalte, auf die keine Datei mehr verweist
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+from file_storage import BaseFileStorage
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS blob_candidates (
+        storage_path TEXT PRIMARY KEY,
+        content_hash TEXT,
+        due_at REAL NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_blob_candidates_due ON blob_candidates (due_at)",
+    "CREATE INDEX IF NOT EXISTS idx_blob_candidates_hash ON blob_candidates (content_hash)"
+]
+
+class BlobCollector:
+    """Entfernt Inhalte erst nach einer Karenzzeit und nur, wenn keine Datei mehr darauf verweist
+    
+    Deduplizierung und Löschen sind Check-then-Act über zwei Speicher (Metadaten, Ablage):
+    Ein Upload, der einen vorhandenen Inhalt wiederverwendet, und das Löschen der letzten
+    Datei mit diesem Inhalt dürfen sich nicht überholen. Deshalb vormerken statt löschen:
+    Beim Löschen und bei jedem Upload wird der Inhalt mit due_at = jetzt + grace_seconds
+    eingetragen (ein laufender Upload schiebt die Frist also hinaus). Der Sweep prüft
+    fällige Einträge unter dem Schreib-Lock der GC-Datei erneut gegen die Metadaten, erst
+    dann wird der Inhalt entfernt; ein gleichzeitiger Upload wartet am Lock und legt den
+    Inhalt danach neu ab. Nebenbei werden Inhalte abgebrochener Uploads aufgeräumt.
+    
+    Die GC-Datei muss von allen API-Prozessen geteilt werden, die dieselbe Ablage nutzen.
+    grace_seconds muss länger sein als ein Upload (inklusive Extraktion im Request) dauert.
+    """
+    
+    def __init__(self, storage: BaseFileStorage, db_path: str = "./data/blob_gc.db",
+                 grace_seconds: float = 3600.0, interval_seconds: float = 600.0, batch_size: int = 100):
+        self.storage = storage
+        self.db_path = db_path
+        self.grace_seconds = grace_seconds
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            for statement in SCHEMA:
+                conn.execute(statement)
+            conn.commit()
+        
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        self._metrics = {
+            'removed': 0,
+            'kept': 0,
+            'failed': 0
+        }
+    
+    @contextmanager
+    def _connection(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+    
+    def schedule(self, storage_path: str, content_hash: Optional[str] = None):
+        """Merkt einen Inhalt zum Löschen vor (bzw. verschiebt die Frist eines vorgemerkten)"""
+        with self._connection() as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO blob_candidates (storage_path, content_hash, due_at)
+                VALUES (?, ?, ?)
+            """, (storage_path, content_hash, time.time() + self.grace_seconds))
+            conn.commit()
+    
+    def sweep(self) -> Dict[str, int]:
+        """Entfernt fällige Inhalte ohne verweisende Datei, behält die übrigen"""
+        removed = kept = failed = 0
+        with self._connection() as conn:
+            due = conn.execute("""
+                SELECT storage_path, content_hash, due_at FROM blob_candidates
+                WHERE due_at <= ? ORDER BY due_at LIMIT ?
+            """, (time.time(), self.batch_size)).fetchall()
+            for row in due:
+                # Schreib-Lock: schedule() eines gleichzeitigen Uploads wartet bis zum Commit
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    current = conn.execute(
+                        "SELECT due_at FROM blob_candidates WHERE storage_path = ?", (row['storage_path'],)
+                    ).fetchone()
+                    if current is None or current['due_at'] != row['due_at']:
+                        # Inzwischen erneut vorgemerkt: neue Frist abwarten
+                        conn.rollback()
+                        continue
+                    referenced = row['content_hash'] is not None and \
+                        self.storage.find_content(row['content_hash']) is not None
+                    if not referenced:
+                        self.storage.remove_blob(row['storage_path'])
+                    conn.execute("DELETE FROM blob_candidates WHERE storage_path = ?", (row['storage_path'],))
+                    conn.commit()
+                except Exception as e:
+                    conn.rollback()
+                    failed += 1
+                    logger.warning(f"Blob GC of {row['storage_path']} failed: {e}")
+                    continue
+                if referenced:
+                    kept += 1
+                else:
+                    removed += 1
+        with self._lock:
+            self._metrics['removed'] += removed
+            self._metrics['kept'] += kept
+            self._metrics['failed'] += failed
+        if removed:
+            logger.info(f"Blob GC removed {removed} unreferenced blobs")
+        return {'removed': removed, 'kept': kept, 'failed': failed}
+    
+    def start(self):
+        """Startet den GC-Thread"""
+        if self._worker is not None:
+            return
+        self._stop_event.clear()
+        
+        def run():
+            while not self._stop_event.wait(self.interval_seconds):
+                try:
+                    self.sweep()
+                except Exception as e:
+                    logger.error(f"Blob GC sweep failed: {e}")
+        
+        self._worker = threading.Thread(target=run, name="blob-gc", daemon=True)
+        self._worker.start()
+    
+    def stop(self):
+        """Stoppt den GC-Thread"""
+        if self._worker is None:
+            return
+        self._stop_event.set()
+        self._worker.join(30)
+        self._worker = None
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._connection() as conn:
+            pending = conn.execute("SELECT COUNT(*) FROM blob_candidates").fetchone()[0]
+        with self._lock:
+            return {**self._metrics, 'pending': pending}
@@ -0,0 +1,148 @@
+"""
+Chat Cache Module für Praivio
+LRU-Cache aktiver Chat-Sessions mit Verlauf (Dateianhänge cacht file_upload.py nach Datei-ID)
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List
+
+from database import DatabaseManager, CHAT_PREVIEW_LENGTH
+
+logger = logging.getLogger(__name__)
+
+def _estimate_size(value: Any) -> int:
+    """Grobe Schätzung des Speicherbedarfs (Zeichen der enthaltenen Strings)"""
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(_estimate_size(v) for v in value.values()) + 16 * len(value)
+    if isinstance(value, (list, tuple)):
+        return sum(_estimate_size(v) for v in value) + 8 * len(value)
+    return 8
+
+class ChatSessionCache:
+    """Begrenzter LRU-Cache für heiße Chat-Sessions (Write-Through über den DatabaseManager)"""
+    
+    def __init__(self, db_manager: DatabaseManager, max_sessions: int = 1000,
+                 max_bytes: int = 64 * 1024 * 1024, window: int = 100):
+        self.db_manager = db_manager
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.window = window
+        
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._bytes = 0
+        # Sessions, die gerade geladen werden -> True, falls währenddessen geschrieben wurde
+        self._loading: Dict[str, bool] = {}
+        
+        # Metriken
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+        db_manager.add_write_listener(self._on_write)
+    
+    def get_session(self, session_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """Liefert Session-Metadaten und das Nachrichtenfenster, lädt bei Bedarf aus der Datenbank"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None and entry['session']['user_id'] == user_id:
+                self._entries.move_to_end(session_id)
+                self.hits += 1
+                return self._snapshot(entry)
+            self.misses += 1
+            self._loading.setdefault(session_id, False)
+        
+        try:
+            session = self.db_manager.get_chat_session_with_messages(session_id, user_id, limit=self.window)
+        except Exception:
+            with self._lock:
+                self._loading.pop(session_id, None)
+            raise
+        
+        with self._lock:
+            written_during_load = self._loading.pop(session_id, False)
+            if not session:
+                return None
+            messages = session.pop('messages')
+            for key in ('has_more', 'next_before'):
+                session.pop(key, None)
+            entry = {'session': session, 'messages': messages}
+            # Nicht cachen, wenn parallel geschrieben wurde - der geladene Stand könnte veraltet sein
+            if not written_during_load:
+                self._store(session_id, entry)
+            return self._snapshot(entry)
+    
+    def invalidate(self, session_id: str):
+        """Entfernt eine Session aus dem Cache"""
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+            if entry is not None:
+                self._bytes -= entry['size']
+    
+    def _snapshot(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        return {'session': dict(entry['session']), 'messages': list(entry['messages'])}
+    
+    def _store(self, session_id: str, entry: Dict[str, Any]):
+        previous = self._entries.pop(session_id, None)
+        if previous is not None:
+            self._bytes -= previous['size']
+        entry['size'] = 0
+        self._entries[session_id] = entry
+        self._resize(entry)
+        self._evict()
+    
+    def _resize(self, entry: Dict[str, Any]):
+        size = _estimate_size(entry['session']) + _estimate_size(entry['messages'])
+        self._bytes += size - entry['size']
+        entry['size'] = size
+    
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_sessions or self._bytes > self.max_bytes):
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry['size']
+            self.evictions += 1
+    
+    def _on_write(self, table: str, rows: List[Dict[str, Any]]):
+        """Write-Listener: neue Nachrichten anhängen, geänderte Sessions verwerfen"""
+        if table == 'chat_messages':
+            with self._lock:
+                for row in rows:
+                    if row['chat_session_id'] in self._loading:
+                        self._loading[row['chat_session_id']] = True
+                    entry = self._entries.get(row['chat_session_id'])
+                    if entry is None:
+                        continue
+                    entry['messages'].append(dict(row))
+                    if len(entry['messages']) > self.window:
+                        del entry['messages'][:-self.window]
+                    session = entry['session']
+                    session['message_count'] = (session.get('message_count') or 0) + 1
+                    session['updated_at'] = row['timestamp']
+                    session['last_message_at'] = row['timestamp']
+                    session['last_message_preview'] = row['content'][:CHAT_PREVIEW_LENGTH]
+                    self._resize(entry)
+                self._evict()
+        elif table == 'chat_sessions':
+            for row in rows:
+                with self._lock:
+                    if row['id'] in self._loading:
+                        self._loading[row['id']] = True
+                self.invalidate(row['id'])
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Liefert Cache-Metriken"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / total, 3) if total else 0.0
+            }
@@ -0,0 +1,106 @@
+"""
+Data Export Module für Praivio
+Streamt Audit-Logs und Generierungen als NDJSON oder CSV mit konstantem Speicherbedarf
+"""
+
+import csv
+import io
+import json
+import logging
+import zlib
+from typing import Optional, Dict, Any, Iterator, Iterable, List, Callable
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+
+AUDIT_LOG_COLUMNS = [
+    'id', 'user_id', 'username', 'action', 'details', 'ip_address',
+    'user_agent', 'success', 'error_message', 'created_at'
+]
+
+TEXT_GENERATION_COLUMNS = [
+    'id', 'user_id', 'prompt', 'generated_text', 'model_used', 'tokens_used',
+    'processing_time', 'template_used', 'context', 'is_encrypted', 'created_at'
+]
+
+def iter_keyset_pages(fetch_page: Callable[..., Dict[str, Any]], chunk_size: int = 1000,
+                      **filters) -> Iterator[List[Dict[str, Any]]]:
+    """Liest eine Tabelle seitenweise über Keyset-Cursor, jede Seite in einer kurzen Lesetransaktion"""
+    cursor = None
+    while True:
+        page = fetch_page(limit=chunk_size, cursor=cursor, **filters)
+        if page['items']:
+            yield page['items']
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+
+def _encode_ndjson(chunk: List[Dict[str, Any]], columns: List[str]) -> str:
+    return "".join(
+        json.dumps({column: row.get(column) for column in columns}, default=str, ensure_ascii=False) + "\n"
+        for row in chunk
+    )
+
+def _encode_csv(chunk: List[Dict[str, Any]], columns: List[str]) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([[row.get(column) for column in columns] for row in chunk])
+    return buffer.getvalue()
+
+def _csv_header(columns: List[str]) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(columns)
+    return buffer.getvalue()
+
+class StreamingExport:
+    """Kodiert Zeilen-Chunks inkrementell und zählt die exportierten Datensätze"""
+    
+    def __init__(self, chunks: Iterable[List[Dict[str, Any]]], columns: List[str],
+                 export_format: str = "ndjson", compress: bool = False,
+                 on_complete: Optional[Callable[[int], None]] = None):
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unbekanntes Exportformat: {export_format}")
+        self.chunks = chunks
+        self.columns = columns
+        self.export_format = export_format
+        self.compress = compress
+        self.on_complete = on_complete
+        self.row_count = 0
+    
+    @property
+    def media_type(self) -> str:
+        return "application/gzip" if self.compress else EXPORT_FORMATS[self.export_format]
+    
+    def filename(self, base: str) -> str:
+        return f"{base}.{self.export_format}" + (".gz" if self.compress else "")
+    
+    def __iter__(self) -> Iterator[bytes]:
+        # wbits=31: gzip-Container, damit die Datei direkt mit gunzip lesbar ist
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if self.compress else None
+        encode = _encode_ndjson if self.export_format == "ndjson" else _encode_csv
+        
+        def emit(text: str) -> bytes:
+            data = text.encode("utf-8")
+            return compressor.compress(data) if compressor else data
+        
+        try:
+            if self.export_format == "csv":
+                yield emit(_csv_header(self.columns))
+            for chunk in self.chunks:
+                data = emit(encode(chunk, self.columns))
+                self.row_count += len(chunk)
+                if data:
+                    yield data
+            if compressor:
+                yield compressor.flush()
+        finally:
+            # Auch abgebrochene Exporte werden mit der tatsächlich gelieferten Zeilenzahl protokolliert
+            if self.on_complete:
+                try:
+                    self.on_complete(self.row_count)
+                except Exception as e:
+                    logger.error(f"Export completion callback failed: {e}")
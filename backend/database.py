@@ -5,20 +5,378 @@ Erweiterte Datenbankfunktionen für Benutzerverwaltung und Audit-Logging
 
 import sqlite3
 import logging
+from abc import ABC, abstractmethod
+import json
+import base64
 from pathlib import Path
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable, Iterator, Tuple
 from contextlib import contextmanager
 
+from write_queue import WriteQueue
+from migrations import CHAT_PREVIEW_LENGTH, schema_statements, pending_migrations
+from text_codec import (
+    TextCodec, decode_row, decode_text, dictionary_id, TEXT_GENERATION_COLUMNS, CHAT_MESSAGE_COLUMNS
+)
+
 logger = logging.getLogger(__name__)
 
-class DatabaseManager:
-    """Zentrale Datenbankverwaltung für Praivio"""
+# Spalten von uploaded_files, die beim Upload gesetzt bzw. danach geändert werden dürfen
+UPLOADED_FILE_COLUMNS = (
+    'id', 'filename', 'file_type', 'file_size', 'content_type', 'storage_path',
+    'content_hash', 'user_id', 'session_id', 'processed_content'
+)
+UPLOADED_FILE_UPDATABLE = ('session_id', 'processed_content')
+UPLOADED_FILE_SELECTABLE = UPLOADED_FILE_COLUMNS + ('created_at', 'updated_at')
+
+def uploaded_file_projection(columns: Optional[List[str]]) -> str:
+    """Spaltenliste für SELECT auf uploaded_files (nur bekannte Spalten)"""
+    if not columns:
+        return "*"
+    unknown = [column for column in columns if column not in UPLOADED_FILE_SELECTABLE]
+    if unknown:
+        raise ValueError(f"Unbekannte Spalten in uploaded_files: {unknown}")
+    return ", ".join(columns)
+
+class InvalidCursorError(ValueError):
+    """Ungültiger oder manipulierter Pagination-Cursor"""
+
+def encode_cursor(sort_value: Any, row_id: Any) -> str:
+    """Kodiert eine Keyset-Position (Sortierwert, ID) als opaken Cursor"""
+    raw = json.dumps([sort_value, row_id], default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple:
+    """Dekodiert einen Cursor aus encode_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return sort_value, row_id
+    except Exception:
+        raise InvalidCursorError("Ungültiger Cursor")
+
+class BaseDatabaseManager(ABC):
+    """Repository-Schnittstelle aller Speicher-Backends (SQLite, PostgreSQL)
+    
+    Abstrakte Methoden muss jedes Backend implementieren; fehlt eine, schlägt bereits das
+    Anlegen des Managers fehl und nicht erst der erste Aufruf im Betrieb.
+    """
+    
+    dialect = ""
+    
+    def __init__(self):
+        self._write_listeners: List[Callable[[str, List[Dict[str, Any]]], None]] = []
+        # Optionale Feldverschlüsselung der Generierungen (field_encryption.FieldEncryptor)
+        self.encryptor = None
+    
+    def add_write_listener(self, listener: Callable[[str, List[Dict[str, Any]]], None]):
+        """Registriert einen Listener, der nach jedem erfolgreichen Schreibvorgang aufgerufen wird"""
+        self._write_listeners.append(listener)
+    
+    def notify_write(self, table: str, rows: List[Dict[str, Any]]):
+        """Benachrichtigt alle Listener über neu geschriebene Zeilen einer Tabelle"""
+        for listener in self._write_listeners:
+            try:
+                listener(table, rows)
+            except Exception as e:
+                logger.error(f"Write listener failed for {table}: {e}")
+    
+    @abstractmethod
+    def ping(self) -> bool:
+        """Prüft, ob die Datenbank erreichbar ist"""
+        raise NotImplementedError
+    
+    def close(self):
+        """Gibt Verbindungen und Ressourcen frei"""
+    
+    def get_write_metrics(self) -> Optional[Dict[str, Any]]:
+        """Kennzahlen des Schreibpfads (None, wenn das Backend keine eigenen erfasst)"""
+        return None
+    
+    def set_field_encryptor(self, encryptor):
+        """Aktiviert die Verschlüsselung gespeicherter Generierungen (prompt, generated_text, context)"""
+        self.encryptor = encryptor
+    
+    # Mandanten und Datenschlüssel
+    @abstractmethod
+    def get_user_organization(self, user_id: Any) -> Optional[int]:
+        """Organisation eines Benutzers (None = unbekannt, z.B. Benutzer ohne Eintrag in users)"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_organization_key(self, organization_id: int) -> Optional[bytes]:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def create_organization_key(self, organization_id: int, wrapped_key: bytes) -> bytes:
+        """Speichert einen verpackten Schlüssel, falls noch keiner existiert, und liefert den gültigen"""
+        raise NotImplementedError
+    
+    # Benutzer und Sessions
+    @abstractmethod
+    def create_user(self, username: str, email: str, password_hash: str,
+                    password_salt: str, role_id: int, organization_id: int) -> int:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_user_by_username(self, username: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_user_by_id(self, user_id: int) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def update_user_last_login(self, user_id: int):
+        raise NotImplementedError
+    
+    @abstractmethod
+    def create_session(self, user_id: int, session_token: str, expires_at: datetime,
+                       ip_address: str, user_agent: str) -> int:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_valid_session(self, session_token: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def invalidate_session(self, session_token: str):
+        raise NotImplementedError
+    
+    @abstractmethod
+    def cleanup_expired_sessions(self):
+        raise NotImplementedError
+    
+    # Audit-Logs
+    @abstractmethod
+    def log_audit_event(self, user_id: Optional[int], action: str, details: str,
+                        ip_address: str, user_agent: str, success: bool = True,
+                        error_message: Optional[str] = None):
+        raise NotImplementedError
+    
+    @abstractmethod
+    def insert_audit_logs(self, rows: List[tuple], synchronous: str = "NORMAL"):
+        """Schreibt (user_id, action, details, ip_address, success, error_message, created_at) als Batch"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_audit_logs_page(self, user_id: Optional[int] = None, limit: int = 100,
+                            cursor: Optional[str] = None, action: Optional[str] = None,
+                            success: Optional[bool] = None, start: Optional[str] = None,
+                            end: Optional[str] = None) -> Dict[str, Any]:
+        raise NotImplementedError
+    
+    def get_audit_logs(self, user_id: Optional[int] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Holt Audit-Logs"""
+        return self.get_audit_logs_page(user_id=user_id, limit=limit)['items']
+    
+    # Audit-Archiv
+    @abstractmethod
+    def get_audit_periods_before(self, cutoff: str) -> List[str]:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def next_audit_partition_segment(self, period: str) -> int:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def iter_audit_logs_range(self, start: str, end: str, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def seal_audit_partition(self, partition: Dict[str, Any], start: str, end: str):
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_audit_partitions(self) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def set_audit_partition_status(self, partition_id: int, status: str):
+        raise NotImplementedError
+    
+    # Text-Generierungen und Statistiken
+    @abstractmethod
+    def save_text_generation(self, user_id: int, prompt: str, generated_text: str,
+                             model_used: str, tokens_used: int, processing_time: float,
+                             template_used: Optional[str] = None, context: Optional[str] = None,
+                             is_encrypted: bool = False, uid: Optional[str] = None,
+                             created_at: Optional[str] = None) -> int:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_generations_page(self, user_id: Optional[int] = None, limit: int = 50, cursor: Optional[str] = None,
+                             model: Optional[str] = None, start: Optional[str] = None,
+                             end: Optional[str] = None) -> Dict[str, Any]:
+        raise NotImplementedError
+    
+    def get_user_generations_page(self, user_id: int, limit: int = 50, cursor: Optional[str] = None,
+                                  model: Optional[str] = None, start: Optional[str] = None,
+                                  end: Optional[str] = None) -> Dict[str, Any]:
+        """Holt eine Seite Text-Generierungen eines Benutzers (neueste zuerst)"""
+        return self.get_generations_page(user_id, limit, cursor, model, start, end)
+    
+    def get_user_generations(self, user_id: int, limit: int = 50) -> List[Dict[str, Any]]:
+        """Holt Text-Generierungen eines Benutzers"""
+        return self.get_user_generations_page(user_id, limit)['items']
+    
+    @abstractmethod
+    def count_failed_generations(self, user_id: Optional[int] = None, days: int = 30) -> int:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_statistics(self, user_id: Optional[int] = None) -> Dict[str, Any]:
+        raise NotImplementedError
+    
+    # Chat
+    @abstractmethod
+    def create_chat_session(self, session_id: str, user_id: str, title: str, model: str,
+                            system_prompt: str = None) -> str:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_chat_sessions_page(self, user_id: str, limit: int = 50, cursor: Optional[str] = None,
+                               model: Optional[str] = None, start: Optional[str] = None,
+                               end: Optional[str] = None) -> Dict[str, Any]:
+        raise NotImplementedError
+    
+    def get_chat_sessions(self, user_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """Holt alle Chat-Sessions eines Benutzers"""
+        return self.get_chat_sessions_page(user_id, limit)['items']
+    
+    @abstractmethod
+    def get_chat_session(self, session_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def update_chat_session_title(self, session_id: str, user_id: str, title: str):
+        raise NotImplementedError
+    
+    @abstractmethod
+    def update_chat_session(self, session_id: str, user_id: str, title: str,
+                            system_prompt: Optional[str] = None) -> bool:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def delete_chat_session(self, session_id: str, user_id: str) -> bool:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def add_chat_message(self, message_id: str, chat_session_id: str, role: str,
+                         content: str, generation_id: Optional[str] = None) -> str:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def delete_chat_message(self, message_id: str, chat_session_id: str) -> bool:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_chat_messages(self, chat_session_id: str, limit: int = 100) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_chat_session_with_messages(self, session_id: str, user_id: str, limit: int = 50,
+                                       before: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+    
+    # Textkompression
+    @abstractmethod
+    def train_compression_dictionary(self, sample_limit: int = 500) -> Optional[int]:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def recompress_text_columns(self, batch_size: int = 200) -> Dict[str, int]:
+        raise NotImplementedError
+    
+    # Extraktions-Cache hochgeladener Dateien
+    @abstractmethod
+    def get_cached_extraction(self, content_hash: str, processor: str) -> Optional[str]:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def save_cached_extraction(self, content_hash: str, processor: str, result: str):
+        raise NotImplementedError
+    
+    @abstractmethod
+    def save_pdf_pages(self, content_hash: str, processor: str, pages: List[str]):
+        """Speichert den Text aller Seiten eines PDFs (Seite 1 = pages[0])"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_pdf_pages(self, content_hash: str, processor: str, start: int, end: int) -> List[Dict[str, Any]]:
+        """Seiten start..end (1-basiert, inklusive) als {'page_number', 'text'}"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def count_pdf_pages(self, content_hash: str, processor: str) -> int:
+        raise NotImplementedError
+    
+    # Hochgeladene Dateien (Metadaten bei lokaler Ablage, siehe file_storage.py)
+    @abstractmethod
+    def save_uploaded_file(self, file: Dict[str, Any]):
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_uploaded_file(self, file_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_session_uploaded_files(self, session_id: str, user_id: str) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_uploaded_files(self, file_ids: List[str], user_id: str,
+                           columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Mehrere Dateien des Benutzers in einer Abfrage (columns: Projektion, None = alle)"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def link_uploaded_files(self, file_ids: List[str], user_id: str, session_id: str) -> int:
+        """Ordnet Dateien des Benutzers in einem Statement einer Chat-Session zu"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def update_uploaded_file(self, file_id: str, user_id: str, values: Dict[str, Any]) -> bool:
+        """Ändert session_id und/oder processed_content einer Datei des Benutzers"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def delete_uploaded_file(self, file_id: str, user_id: str) -> bool:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def find_uploaded_content(self, content_hash: str) -> Optional[str]:
+        """storage_path einer beliebigen Datei mit diesem Inhalt (Deduplikation)"""
+        raise NotImplementedError
+    
+    # Wartung
+    @abstractmethod
+    def run_maintenance(self, task: str, page_budget: int = 1000) -> Dict[str, Any]:
+        """Wartungsaufgabe: optimize, analyze, incremental_vacuum, enable_auto_vacuum, checkpoint, truncate_wal, quick_check"""
+        raise NotImplementedError
+    
+    def get_backup_sources(self) -> Dict[str, str]:
+        """SQLite-Dateien für backup_service.py (Name -> Pfad); PostgreSQL sichert per pg_dump/PITR"""
+        return {}
+
+class DatabaseManager(BaseDatabaseManager):
+    """Zentrale Datenbankverwaltung für Praivio (SQLite)"""
+    
+    dialect = "sqlite"
     
-    def __init__(self, db_path: str = "./data/app.db"):
+    def __init__(self, db_path: str = "./data/app.db", codec: Optional[TextCodec] = None,
+                 group_commit: bool = False):
+        super().__init__()
         self.db_path = db_path
+        # Optionale transparente Kompression großer Textspalten
+        self.codec = codec
+        self._dictionaries: Dict[int, bytes] = {}
+        self._active_dictionary: Optional[Tuple[int, bytes]] = None
         self._ensure_data_directory()
         self._init_database()
+        self._load_active_dictionary()
+        # Optional ein einziger Schreib-Thread mit Gruppen-Commit für Generierungen und Chats
+        self._writer: Optional[WriteQueue] = WriteQueue(db_path) if group_commit else None
     
     def _ensure_data_directory(self):
         """Stellt sicher, dass das Datenverzeichnis existiert"""
@@ -27,139 +385,14 @@ class DatabaseManager:
     def _init_database(self):
         """Initialisiert die Datenbank mit allen Tabellen"""
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            
-            # Erweiterte Benutzer-Tabelle
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT UNIQUE NOT NULL,
-                    email TEXT UNIQUE,
-                    password_hash TEXT NOT NULL,
-                    password_salt TEXT NOT NULL,
-                    role_id INTEGER NOT NULL,
-                    organization_id INTEGER NOT NULL,
-                    is_active BOOLEAN DEFAULT 1,
-                    last_login TIMESTAMP,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (role_id) REFERENCES roles (id),
-                    FOREIGN KEY (organization_id) REFERENCES organizations (id)
-                )
-            """)
-            
-            # Rollen-Tabelle
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS roles (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT UNIQUE NOT NULL,
-                    description TEXT,
-                    permissions TEXT,  -- JSON string of permissions
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # Organisationen-Tabelle
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS organizations (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    type TEXT NOT NULL,  -- 'hospital', 'law_firm', 'government', etc.
-                    address TEXT,
-                    contact_person TEXT,
-                    contact_email TEXT,
-                    is_active BOOLEAN DEFAULT 1,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
+            # Wirkt nur auf neue, noch leere Dateien; Bestandsdateien stellt die Wartung um (enable_auto_vacuum)
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            # WAL: Leser blockieren den Schreiber nicht, Commits brauchen kein fsync pro Transaktion
+            conn.execute("PRAGMA journal_mode=WAL")
             
-            # Erweiterte Text-Generierungen-Tabelle
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS text_generations (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    prompt TEXT NOT NULL,
-                    generated_text TEXT NOT NULL,
-                    model_used TEXT NOT NULL,
-                    tokens_used INTEGER,
-                    processing_time REAL,
-                    template_used TEXT,
-                    context TEXT,
-                    is_encrypted BOOLEAN DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                )
-            """)
-            
-            # Erweiterte Audit-Logs-Tabelle
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS audit_logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    action TEXT NOT NULL,
-                    details TEXT,
-                    ip_address TEXT,
-                    user_agent TEXT,
-                    success BOOLEAN DEFAULT 1,
-                    error_message TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                )
-            """)
-            
-            # Sessions-Tabelle für JWT-Token-Management
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS user_sessions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    session_token TEXT UNIQUE NOT NULL,
-                    expires_at TIMESTAMP NOT NULL,
-                    ip_address TEXT,
-                    user_agent TEXT,
-                    is_active BOOLEAN DEFAULT 1,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                )
-            """)
-            
-            # Rate Limiting-Tabelle
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS rate_limits (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    endpoint TEXT NOT NULL,
-                    request_count INTEGER DEFAULT 1,
-                    window_start TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                )
-            """)
-            
-            # Chat-Sessions-Tabelle
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS chat_sessions (
-                    id TEXT PRIMARY KEY,
-                    user_id TEXT NOT NULL,  -- Changed from INTEGER to TEXT for Supabase user IDs
-                    title TEXT NOT NULL,
-                    model TEXT NOT NULL,
-                    system_prompt TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # Chat-Messages-Tabelle
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS chat_messages (
-                    id TEXT PRIMARY KEY,
-                    chat_session_id TEXT NOT NULL,
-                    role TEXT NOT NULL CHECK (role IN ('user', 'assistant')),
-                    content TEXT NOT NULL,
-                    generation_id TEXT,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (chat_session_id) REFERENCES chat_sessions (id) ON DELETE CASCADE
-                )
-            """)
+            cursor = conn.cursor()
+            for statement in schema_statements(self.dialect):
+                cursor.execute(statement)
             
             # Erstelle Standard-Rollen
             self._create_default_roles(cursor)
@@ -168,6 +401,38 @@ class DatabaseManager:
             self._create_default_organization(cursor)
             
             conn.commit()
+            
+            self._apply_migrations(conn)
+    
+    def _apply_migrations(self, conn):
+        """Wendet ausstehende Schema-Migrationen an (Versionierung über PRAGMA user_version)
+        
+        Im Legacy-Modus von sqlite3 öffnet nur DML implizit eine Transaktion, ALTER TABLE würde
+        sofort festgeschrieben. Daher Autocommit-Modus und ein explizites BEGIN/COMMIT pro
+        Migration; VACUUM ist in einer Transaktion nicht erlaubt und läuft nach dem COMMIT.
+        """
+        current_version = conn.execute("PRAGMA user_version").fetchone()[0]
+        isolation_level = conn.isolation_level
+        conn.isolation_level = None
+        try:
+            for version, name, statements in pending_migrations(current_version, self.dialect):
+                logger.info(f"Applying database migration {version}: {name}")
+                vacuum = [statement for statement in statements if statement.strip().upper().startswith("VACUUM")]
+                cursor = conn.cursor()
+                cursor.execute("BEGIN")
+                try:
+                    for statement in statements:
+                        if statement not in vacuum:
+                            cursor.execute(statement)
+                    cursor.execute(f"PRAGMA user_version = {version}")
+                    cursor.execute("COMMIT")
+                except Exception:
+                    cursor.execute("ROLLBACK")
+                    raise
+                for statement in vacuum:
+                    cursor.execute(statement)
+        finally:
+            conn.isolation_level = isolation_level
     
     def _create_default_roles(self, cursor):
         """Erstellt Standard-Rollen"""
@@ -201,6 +466,378 @@ class DatabaseManager:
         finally:
             conn.close()
     
+    def ping(self) -> bool:
+        """Prüft, ob die Datenbank erreichbar ist"""
+        with self.get_connection() as conn:
+            conn.execute("SELECT 1").fetchone()
+        return True
+    
+    def close(self):
+        """Arbeitet ausstehende Schreiboperationen ab und stoppt den Schreib-Thread"""
+        if self._writer is not None:
+            self._writer.close()
+    
+    def _write(self, operation: Callable[[sqlite3.Cursor], Any]) -> Any:
+        """Führt eine Schreiboperation aus: über die Schreib-Queue oder in eigener Verbindung
+        
+        Kehrt erst nach dem Commit zurück, anschließende Lesezugriffe sehen die Änderung.
+        Aus async Endpoints per asyncio.to_thread aufrufen: sonst steht die Event-Loop bis zum
+        Commit, und es kann sich keine weitere Anfrage für denselben Commit einreihen.
+        """
+        if self._writer is not None:
+            return self._writer.run(operation)
+        with self.get_connection() as conn:
+            result = operation(conn.cursor())
+            conn.commit()
+            return result
+    
+    def get_write_metrics(self) -> Optional[Dict[str, Any]]:
+        """Kennzahlen des Schreib-Threads (None ohne Gruppen-Commit)"""
+        return self._writer.get_metrics() if self._writer is not None else None
+    
+    def _load_active_dictionary(self):
+        """Lädt das neueste Wörterbuch für den konfigurierten Algorithmus"""
+        if not (self.codec and self.codec.use_dictionary):
+            return
+        with self.get_connection() as conn:
+            row = conn.execute("""
+                SELECT id, data FROM compression_dictionaries
+                WHERE algorithm = ?
+                ORDER BY created_at DESC, rowid DESC
+                LIMIT 1
+            """, (self.codec.algorithm,)).fetchone()
+        self._active_dictionary = (row['id'], bytes(row['data'])) if row else None
+    
+    def _get_dictionary(self, dict_id: int) -> bytes:
+        """Wörterbuch für die Dekompression (Cache, sonst aus der Datenbank)"""
+        data = self._dictionaries.get(dict_id)
+        if data is None:
+            with self.get_connection() as conn:
+                row = conn.execute(
+                    "SELECT data FROM compression_dictionaries WHERE id = ?", (dict_id,)
+                ).fetchone()
+            if row is None:
+                raise KeyError(f"Kompressions-Wörterbuch {dict_id} fehlt")
+            data = self._dictionaries[dict_id] = bytes(row['data'])
+        return data
+    
+    def _encode_columns(self, values: Dict[str, Optional[str]], columns: Dict[str, int]) -> Tuple[Dict[str, Any], int]:
+        """Komprimiert die Textspalten einer Zeile, liefert (Werte, codec_flags)"""
+        if self.codec is None:
+            return values, 0
+        encoded, flags = dict(values), 0
+        for column, bit in columns.items():
+            value, compressed = self.codec.encode(values.get(column), self._active_dictionary)
+            if compressed:
+                encoded[column] = value
+                flags |= bit
+        return encoded, flags
+    
+    def _decode_generations(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Entschlüsselt (gebündelt pro Organisation) und dekomprimiert Generierungen in place"""
+        encrypted = [row for row in rows if row.get('is_encrypted')]
+        if encrypted:
+            if self.encryptor is None:
+                raise RuntimeError("Verschlüsselte Generierungen gefunden, aber keine Feldverschlüsselung konfiguriert")
+            self.encryptor.decrypt_rows(encrypted, TEXT_GENERATION_COLUMNS)
+            for row in encrypted:
+                flags = row.get('codec_flags') or 0
+                for column, bit in TEXT_GENERATION_COLUMNS.items():
+                    if row.get(column) is not None and not flags & bit:
+                        row[column] = row[column].decode("utf-8")
+        for row in rows:
+            decode_row(row, TEXT_GENERATION_COLUMNS, self._get_dictionary)
+        return rows
+    
+    def train_compression_dictionary(self, sample_limit: int = 500) -> Optional[int]:
+        """Trainiert ein Wörterbuch aus den neuesten großen Texten dieser Datenbank
+        
+        Mit Sharding liegt jede Organisation in einer eigenen Datei, das Wörterbuch ist dann
+        organisationsspezifisch (Briefköpfe, Textbausteine).
+        """
+        if not (self.codec and self.codec.use_dictionary):
+            return None
+        with self.get_connection() as conn:
+            generations = conn.execute("""
+                SELECT id, user_id, generated_text, codec_flags, is_encrypted FROM text_generations
+                ORDER BY id DESC LIMIT ?
+            """, (sample_limit,)).fetchall()
+            messages = conn.execute("""
+                SELECT content, codec_flags FROM chat_messages
+                ORDER BY rowid DESC LIMIT ?
+            """, (sample_limit,)).fetchall()
+        samples = [
+            row['generated_text'] for row in self._decode_generations([dict(row) for row in generations])
+        ] + [
+            decode_row(dict(row), CHAT_MESSAGE_COLUMNS, self._get_dictionary)['content']
+            for row in messages
+        ]
+        data = self.codec.train_dictionary(samples)
+        if not data:
+            return None
+        
+        dict_id = dictionary_id(data)
+        with self.get_connection() as conn:
+            conn.execute("""
+                INSERT OR IGNORE INTO compression_dictionaries (id, algorithm, data, sample_count)
+                VALUES (?, ?, ?, ?)
+            """, (dict_id, self.codec.algorithm, data, len(samples)))
+            conn.commit()
+        self._dictionaries[dict_id] = data
+        self._active_dictionary = (dict_id, data)
+        return dict_id
+    
+    def recompress_text_columns(self, batch_size: int = 200) -> Dict[str, int]:
+        """Komprimiert Bestandszeilen (codec_flags = 0) oberhalb des Schwellwerts in kurzen Batches"""
+        if self.codec is None:
+            return {}
+        if self.codec.use_dictionary and self._active_dictionary is None:
+            self.train_compression_dictionary()
+        
+        counts = {}
+        # Verschlüsselte Generierungen wurden bereits vor dem Verschlüsseln komprimiert
+        for table, key, columns, plain in (
+            ('text_generations', 'id', TEXT_GENERATION_COLUMNS, "COALESCE(is_encrypted, 0) = 0"),
+            ('chat_messages', 'rowid', CHAT_MESSAGE_COLUMNS, "1 = 1")
+        ):
+            counts[table] = 0
+            # length() zählt bei TEXT Zeichen, der Schwellwert gilt für Bytes
+            large = " OR ".join(f"length(CAST({column} AS BLOB)) >= ?" for column in columns)
+            last_key = 0
+            while True:
+                with self.get_connection() as conn:
+                    rows = conn.execute(f"""
+                        SELECT {key} AS row_key, {', '.join(columns)} FROM {table}
+                        WHERE codec_flags = 0 AND {plain} AND {key} > ? AND ({large})
+                        ORDER BY {key}
+                        LIMIT ?
+                    """, (last_key, *[self.codec.threshold] * len(columns), batch_size)).fetchall()
+                    if not rows:
+                        break
+                    for row in rows:
+                        encoded, flags = self._encode_columns(
+                            {column: row[column] for column in columns}, columns
+                        )
+                        if not flags:
+                            continue
+                        assignments = ", ".join(f"{column} = ?" for column in columns)
+                        # codec_flags = 0 schützt vor doppelter Kompression bei parallelen Läufen
+                        conn.execute(
+                            f"UPDATE {table} SET {assignments}, codec_flags = ? WHERE {key} = ? AND codec_flags = 0",
+                            (*[encoded[column] for column in columns], flags, row['row_key'])
+                        )
+                        counts[table] += 1
+                    conn.commit()
+                last_key = rows[-1]['row_key']
+        return counts
+    
+    def get_backup_sources(self) -> Dict[str, str]:
+        return {Path(self.db_path).stem: self.db_path}
+    
+    def run_maintenance(self, task: str, page_budget: int = 1000) -> Dict[str, Any]:
+        """Führt eine Wartungsaufgabe auf dieser Datenbankdatei aus (Zeitplan in db_maintenance.py)
+        
+        page_budget begrenzt die I/O eines Aufrufs: freigegebene Seiten bei incremental_vacuum,
+        untersuchte Zeilen pro Index bei analyze (PRAGMA analysis_limit).
+        """
+        with self.get_connection() as conn:
+            if task == 'optimize':
+                # analysis_limit begrenzt auch die ANALYZE-Läufe, die optimize selbst anstößt
+                conn.execute(f"PRAGMA analysis_limit = {int(page_budget)}")
+                conn.execute("PRAGMA optimize")
+                result = {}
+            elif task == 'analyze':
+                conn.execute(f"PRAGMA analysis_limit = {int(page_budget)}")
+                conn.execute("ANALYZE")
+                result = {'analysis_limit': int(page_budget)}
+            elif task == 'incremental_vacuum':
+                if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                    return {'skipped': 'auto_vacuum ist nicht INCREMENTAL'}
+                before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                # Jeder sqlite3_step gibt nur eine Seite frei; executescript läuft bis zum Ende,
+                # execute() stoppt bei Pragmas ohne Ergebnisspalten nach dem ersten Schritt
+                conn.executescript(f"PRAGMA incremental_vacuum({int(page_budget)});")
+                after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                result = {'freed_pages': before - after, 'free_pages': after}
+            elif task == 'enable_auto_vacuum':
+                if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                    return {'skipped': 'auto_vacuum ist bereits INCREMENTAL'}
+                # Bestandsdateien übernehmen den Modus erst mit einem vollständigen VACUUM (schreibt die Datei neu)
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                conn.execute("VACUUM")
+                result = {'auto_vacuum': conn.execute("PRAGMA auto_vacuum").fetchone()[0]}
+            elif task in ('checkpoint', 'truncate_wal'):
+                # PASSIVE wartet nie auf Leser/Schreiber; TRUNCATE setzt zusätzlich die WAL-Datei zurück
+                mode = 'TRUNCATE' if task == 'truncate_wal' else 'PASSIVE'
+                busy, wal_pages, checkpointed = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+                result = {'mode': mode, 'busy': bool(busy), 'wal_pages': wal_pages, 'checkpointed_pages': checkpointed}
+            elif task == 'quick_check':
+                problems = [row[0] for row in conn.execute("PRAGMA quick_check(20)") if row[0] != 'ok']
+                result = {'ok': not problems, 'problems': problems}
+            else:
+                raise ValueError(f"Unbekannte Wartungsaufgabe: {task}")
+            
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            result['size_bytes'] = conn.execute("PRAGMA page_count").fetchone()[0] * page_size
+            result['free_bytes'] = conn.execute("PRAGMA freelist_count").fetchone()[0] * page_size
+        return result
+    
+    def get_user_organization(self, user_id: Any) -> Optional[int]:
+        """Organisation eines Benutzers laut users.organization_id"""
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            # Externe IDs (z.B. Supabase-UUIDs) stehen nicht in users
+            return None
+        with self.get_connection() as conn:
+            row = conn.execute("SELECT organization_id FROM users WHERE id = ?", (user_id,)).fetchone()
+        return row['organization_id'] if row else None
+    
+    def get_organization_key(self, organization_id: int) -> Optional[bytes]:
+        """Verpackter Datenschlüssel einer Organisation"""
+        with self.get_connection() as conn:
+            row = conn.execute(
+                "SELECT wrapped_key FROM organization_keys WHERE organization_id = ?", (organization_id,)
+            ).fetchone()
+        return bytes(row['wrapped_key']) if row else None
+    
+    def create_organization_key(self, organization_id: int, wrapped_key: bytes) -> bytes:
+        """Speichert einen verpackten Schlüssel, falls noch keiner existiert, und liefert den gültigen"""
+        with self.get_connection() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO organization_keys (organization_id, wrapped_key) VALUES (?, ?)",
+                (organization_id, wrapped_key)
+            )
+            conn.commit()
+            row = conn.execute(
+                "SELECT wrapped_key FROM organization_keys WHERE organization_id = ?", (organization_id,)
+            ).fetchone()
+        return bytes(row['wrapped_key'])
+    
+    def get_cached_extraction(self, content_hash: str, processor: str) -> Optional[str]:
+        """Extrahierter Text einer Datei mit diesem Inhalt, falls schon einmal verarbeitet"""
+        with self.get_connection() as conn:
+            row = conn.execute(
+                "SELECT result FROM extraction_cache WHERE content_hash = ? AND processor = ?",
+                (content_hash, processor)
+            ).fetchone()
+        return row['result'] if row else None
+    
+    def save_cached_extraction(self, content_hash: str, processor: str, result: str):
+        """Speichert ein Extraktionsergebnis (das erste gewinnt, gleicher Inhalt ergibt gleichen Text)"""
+        with self.get_connection() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO extraction_cache (content_hash, processor, result) VALUES (?, ?, ?)",
+                (content_hash, processor, result)
+            )
+            conn.commit()
+    
+    def save_pdf_pages(self, content_hash: str, processor: str, pages: List[str]):
+        """Speichert den Text aller Seiten eines PDFs (Seite 1 = pages[0])"""
+        with self.get_connection() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO pdf_pages (content_hash, processor, page_number, text) VALUES (?, ?, ?, ?)",
+                [(content_hash, processor, number, text) for number, text in enumerate(pages, start=1)]
+            )
+            conn.commit()
+    
+    def get_pdf_pages(self, content_hash: str, processor: str, start: int, end: int) -> List[Dict[str, Any]]:
+        """Seiten start..end (1-basiert, inklusive) als {'page_number', 'text'}"""
+        with self.get_connection() as conn:
+            rows = conn.execute("""
+                SELECT page_number, text FROM pdf_pages
+                WHERE content_hash = ? AND processor = ? AND page_number BETWEEN ? AND ?
+                ORDER BY page_number
+            """, (content_hash, processor, start, end)).fetchall()
+        return [dict(row) for row in rows]
+    
+    def count_pdf_pages(self, content_hash: str, processor: str) -> int:
+        with self.get_connection() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM pdf_pages WHERE content_hash = ? AND processor = ?", (content_hash, processor)
+            ).fetchone()[0]
+    
+    def save_uploaded_file(self, file: Dict[str, Any]):
+        """Speichert die Metadaten einer hochgeladenen Datei"""
+        values = {column: file.get(column) for column in UPLOADED_FILE_COLUMNS}
+        values['user_id'] = str(values['user_id'])
+        with self.get_connection() as conn:
+            conn.execute(
+                f"INSERT INTO uploaded_files ({', '.join(values)}) VALUES ({', '.join('?' for _ in values)})",
+                tuple(values.values())
+            )
+            conn.commit()
+    
+    def get_uploaded_file(self, file_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        with self.get_connection() as conn:
+            row = conn.execute(
+                "SELECT * FROM uploaded_files WHERE id = ? AND user_id = ?", (file_id, str(user_id))
+            ).fetchone()
+        return dict(row) if row else None
+    
+    def get_session_uploaded_files(self, session_id: str, user_id: str) -> List[Dict[str, Any]]:
+        with self.get_connection() as conn:
+            rows = conn.execute("""
+                SELECT * FROM uploaded_files WHERE user_id = ? AND session_id = ? ORDER BY created_at
+            """, (str(user_id), session_id)).fetchall()
+        return [dict(row) for row in rows]
+    
+    def get_uploaded_files(self, file_ids: List[str], user_id: str,
+                           columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Mehrere Dateien des Benutzers in einer Abfrage (columns: Projektion, None = alle)"""
+        if not file_ids:
+            return []
+        placeholders = ", ".join("?" for _ in file_ids)
+        with self.get_connection() as conn:
+            rows = conn.execute(f"""
+                SELECT {uploaded_file_projection(columns)} FROM uploaded_files
+                WHERE user_id = ? AND id IN ({placeholders})
+            """, (str(user_id), *file_ids)).fetchall()
+        return [dict(row) for row in rows]
+    
+    def link_uploaded_files(self, file_ids: List[str], user_id: str, session_id: str) -> int:
+        """Ordnet Dateien des Benutzers in einem Statement einer Chat-Session zu"""
+        if not file_ids:
+            return 0
+        placeholders = ", ".join("?" for _ in file_ids)
+        with self.get_connection() as conn:
+            updated = conn.execute(f"""
+                UPDATE uploaded_files SET session_id = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE user_id = ? AND id IN ({placeholders})
+            """, (session_id, str(user_id), *file_ids)).rowcount
+            conn.commit()
+        return updated
+    
+    def update_uploaded_file(self, file_id: str, user_id: str, values: Dict[str, Any]) -> bool:
+        """Ändert session_id und/oder processed_content einer Datei des Benutzers"""
+        columns = [column for column in values if column in UPLOADED_FILE_UPDATABLE]
+        if not columns:
+            return False
+        assignments = ", ".join(f"{column} = ?" for column in columns)
+        with self.get_connection() as conn:
+            updated = conn.execute(
+                f"UPDATE uploaded_files SET {assignments}, updated_at = CURRENT_TIMESTAMP WHERE id = ? AND user_id = ?",
+                (*(values[column] for column in columns), file_id, str(user_id))
+            ).rowcount
+            conn.commit()
+        return updated > 0
+    
+    def delete_uploaded_file(self, file_id: str, user_id: str) -> bool:
+        with self.get_connection() as conn:
+            deleted = conn.execute(
+                "DELETE FROM uploaded_files WHERE id = ? AND user_id = ?", (file_id, str(user_id))
+            ).rowcount
+            conn.commit()
+        return deleted > 0
+    
+    def find_uploaded_content(self, content_hash: str) -> Optional[str]:
+        """storage_path einer beliebigen Datei mit diesem Inhalt (Deduplikation)"""
+        with self.get_connection() as conn:
+            row = conn.execute(
+                "SELECT storage_path FROM uploaded_files WHERE content_hash = ? LIMIT 1", (content_hash,)
+            ).fetchone()
+        return row['storage_path'] if row else None
+    
     def create_user(self, username: str, email: str, password_hash: str, 
                    password_salt: str, role_id: int, organization_id: int) -> int:
         """Erstellt einen neuen Benutzer"""
@@ -211,7 +848,10 @@ class DatabaseManager:
                 VALUES (?, ?, ?, ?, ?, ?)
             """, (username, email, password_hash, password_salt, role_id, organization_id))
             conn.commit()
-            return cursor.lastrowid
+            user_id = cursor.lastrowid
+        
+        self.notify_write('users', [{'id': user_id, 'organization_id': organization_id}])
+        return user_id
     
     def get_user_by_username(self, username: str) -> Optional[Dict[str, Any]]:
         """Holt einen Benutzer anhand des Benutzernamens"""
@@ -293,58 +933,208 @@ class DatabaseManager:
                 VALUES (?, ?, ?, ?, ?, ?, ?)
             """, (user_id, action, details, ip_address, user_agent, success, error_message))
             conn.commit()
+        
+        self.notify_write('audit_logs', [{'user_id': user_id, 'action': action, 'success': success}])
     
-    def get_audit_logs(self, user_id: Optional[int] = None, limit: int = 100) -> List[Dict[str, Any]]:
-        """Holt Audit-Logs"""
+    def insert_audit_logs(self, rows: List[tuple], synchronous: str = "NORMAL"):
+        """Schreibt (user_id, action, details, ip_address, success, error_message, created_at) als Batch"""
         with self.get_connection() as conn:
+            conn.execute(f"PRAGMA synchronous = {synchronous}")
             cursor = conn.cursor()
-            if user_id:
-                cursor.execute("""
-                    SELECT al.*, u.username FROM audit_logs al
-                    LEFT JOIN users u ON al.user_id = u.id
-                    WHERE al.user_id = ?
-                    ORDER BY al.created_at DESC
-                    LIMIT ?
-                """, (user_id, limit))
-            else:
-                cursor.execute("""
-                    SELECT al.*, u.username FROM audit_logs al
-                    LEFT JOIN users u ON al.user_id = u.id
-                    ORDER BY al.created_at DESC
-                    LIMIT ?
-                """, (limit,))
-            
-            return [dict(row) for row in cursor.fetchall()]
+            cursor.executemany("""
+                INSERT INTO audit_logs (user_id, action, details, ip_address, success, error_message, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            conn.commit()
     
-    def save_text_generation(self, user_id: int, prompt: str, generated_text: str, 
-                           model_used: str, tokens_used: int, processing_time: float,
-                           template_used: Optional[str] = None, context: Optional[str] = None,
-                           is_encrypted: bool = False) -> int:
-        """Speichert eine Text-Generierung"""
+    def get_audit_periods_before(self, cutoff: str) -> List[str]:
+        """Monate ('YYYY-MM') mit Audit-Einträgen vor dem Stichtag"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                INSERT INTO text_generations 
-                (user_id, prompt, generated_text, model_used, tokens_used, processing_time, 
-                 template_used, context, is_encrypted)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (user_id, prompt, generated_text, model_used, tokens_used, processing_time,
-                  template_used, context, is_encrypted))
-            conn.commit()
-            return cursor.lastrowid
+                SELECT DISTINCT substr(created_at, 1, 7) AS period
+                FROM audit_logs
+                WHERE created_at < ?
+                ORDER BY period
+            """, (cutoff,))
+            return [row['period'] for row in cursor.fetchall()]
     
-    def get_user_generations(self, user_id: int, limit: int = 50) -> List[Dict[str, Any]]:
-        """Holt Text-Generierungen eines Benutzers"""
+    def next_audit_partition_segment(self, period: str) -> int:
+        """Nächste freie Segmentnummer einer Periode"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                SELECT * FROM text_generations
-                WHERE user_id = ?
-                ORDER BY created_at DESC
-                LIMIT ?
-            """, (user_id, limit))
+                SELECT COALESCE(MAX(segment), 0) + 1 FROM audit_partitions WHERE period = ?
+            """, (period,))
+            return cursor.fetchone()[0]
+    
+    def iter_audit_logs_range(self, start: str, end: str, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """Iteriert nach ID sortiert über Audit-Einträge im Zeitraum [start, end)"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT al.*, u.username FROM audit_logs al
+                LEFT JOIN users u ON al.user_id = u.id
+                WHERE al.created_at >= ? AND al.created_at < ?
+                ORDER BY al.id
+            """, (start, end))
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(row)
+    
+    def seal_audit_partition(self, partition: Dict[str, Any], start: str, end: str):
+        """Registriert ein Archiv-Segment und entfernt die exportierten Zeilen atomar"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO audit_partitions (period, segment, archive_path, row_count, min_id, max_id, sha256)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (partition['period'], partition['segment'], partition['archive_path'], partition['row_count'],
+                  partition['min_id'], partition['max_id'], partition['sha256']))
+            cursor.execute("""
+                DELETE FROM audit_logs
+                WHERE created_at >= ? AND created_at < ? AND id <= ?
+            """, (start, end, partition['max_id']))
+            conn.commit()
+    
+    def get_audit_partitions(self) -> List[Dict[str, Any]]:
+        """Alle Audit-Partitionen, neueste zuerst"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM audit_partitions ORDER BY period DESC, segment DESC")
             return [dict(row) for row in cursor.fetchall()]
     
+    def set_audit_partition_status(self, partition_id: int, status: str):
+        """Setzt den Status einer Partition ('sealed', 'expired')"""
+        with self.get_connection() as conn:
+            conn.execute("UPDATE audit_partitions SET status = ? WHERE id = ?", (status, partition_id))
+            conn.commit()
+    
+    def _keyset_page(self, sql: str, conditions: List[str], params: List[Any],
+                     sort_column: str, id_column: str, limit: int,
+                     cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Führt eine absteigende Keyset-Abfrage auf (sort_column, id_column) aus"""
+        if limit < 1:
+            # 0 endete in rows[-1] auf einer leeren Liste, negative Werte wären in SQLite unbegrenzt
+            raise ValueError(f"Ungültiges Seitenlimit: {limit}")
+        conditions = list(conditions)
+        params = list(params)
+        if cursor:
+            sort_value, row_id = decode_cursor(cursor)
+            conditions.append(f"({sort_column}, {id_column}) < (?, ?)")
+            params.extend([sort_value, row_id])
+        
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self.get_connection() as conn:
+            db_cursor = conn.cursor()
+            # Eine Zeile mehr lesen, um festzustellen, ob es eine weitere Seite gibt
+            db_cursor.execute(f"""
+                {sql}
+                {where}
+                ORDER BY {sort_column} DESC, {id_column} DESC
+                LIMIT ?
+            """, (*params, limit + 1))
+            rows = [dict(row) for row in db_cursor.fetchall()]
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            sort_key = sort_column.split(".")[-1]
+            id_key = id_column.split(".")[-1]
+            next_cursor = encode_cursor(rows[-1][sort_key], rows[-1][id_key])
+        return {'items': rows, 'next_cursor': next_cursor}
+    
+    def get_audit_logs_page(self, user_id: Optional[int] = None, limit: int = 100,
+                            cursor: Optional[str] = None, action: Optional[str] = None,
+                            success: Optional[bool] = None, start: Optional[str] = None,
+                            end: Optional[str] = None) -> Dict[str, Any]:
+        """Holt eine Seite Audit-Logs (neueste zuerst) mit optionalen Filtern"""
+        conditions = []
+        params: List[Any] = []
+        if user_id:
+            conditions.append("al.user_id = ?")
+            params.append(user_id)
+        if action:
+            conditions.append("al.action = ?")
+            params.append(action)
+        if success is not None:
+            conditions.append("al.success = ?")
+            params.append(1 if success else 0)
+        if start:
+            conditions.append("al.created_at >= ?")
+            params.append(start)
+        if end:
+            conditions.append("al.created_at < ?")
+            params.append(end)
+        
+        return self._keyset_page("""
+            SELECT al.*, u.username FROM audit_logs al
+            LEFT JOIN users u ON al.user_id = u.id
+        """, conditions, params, "al.created_at", "al.id", limit, cursor)
+    
+    def save_text_generation(self, user_id: int, prompt: str, generated_text: str, 
+                           model_used: str, tokens_used: int, processing_time: float,
+                           template_used: Optional[str] = None, context: Optional[str] = None,
+                           is_encrypted: bool = False, uid: Optional[str] = None,
+                           created_at: Optional[str] = None) -> int:
+        """Speichert eine Text-Generierung (mit uid idempotent: eine vorhandene Zeile wird nicht dupliziert)"""
+        # Erst komprimieren, dann verschlüsseln (Chiffretext ist nicht komprimierbar)
+        texts, codec_flags = self._encode_columns(
+            {'prompt': prompt, 'generated_text': generated_text, 'context': context}, TEXT_GENERATION_COLUMNS
+        )
+        if self.encryptor is not None:
+            texts = self.encryptor.encrypt_fields(user_id, texts)
+            is_encrypted = True
+        
+        def insert(cursor):
+            cursor.execute("""
+                INSERT INTO text_generations 
+                (user_id, prompt, generated_text, model_used, tokens_used, processing_time, 
+                 template_used, context, is_encrypted, codec_flags, uid, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+                ON CONFLICT (uid) DO NOTHING
+            """, (user_id, texts['prompt'], texts['generated_text'], model_used, tokens_used, processing_time,
+                  template_used, texts['context'], is_encrypted, codec_flags, uid, created_at))
+            if cursor.rowcount == 0:
+                cursor.execute("SELECT id FROM text_generations WHERE uid = ?", (uid,))
+                return cursor.fetchone()[0], False
+            return cursor.lastrowid, True
+        
+        generation_id, inserted = self._write(insert)
+        if not inserted:
+            return generation_id
+        
+        self.notify_write('text_generations', [{'id': generation_id, 'user_id': user_id, 'model_used': model_used}])
+        return generation_id
+    
+    def get_generations_page(self, user_id: Optional[int] = None, limit: int = 50, cursor: Optional[str] = None,
+                             model: Optional[str] = None, start: Optional[str] = None,
+                             end: Optional[str] = None) -> Dict[str, Any]:
+        """Holt eine Seite Text-Generierungen (neueste zuerst), optional für einen Benutzer"""
+        conditions = []
+        params: List[Any] = []
+        if user_id:
+            conditions.append("user_id = ?")
+            params.append(user_id)
+        if model:
+            conditions.append("model_used = ?")
+            params.append(model)
+        if start:
+            conditions.append("created_at >= ?")
+            params.append(start)
+        if end:
+            conditions.append("created_at < ?")
+            params.append(end)
+        
+        page = self._keyset_page(
+            "SELECT * FROM text_generations", conditions, params, "created_at", "id", limit, cursor
+        )
+        self._decode_generations(page['items'])
+        return page
+    
     def cleanup_expired_sessions(self):
         """Bereinigt abgelaufene Sessions"""
         with self.get_connection() as conn:
@@ -355,6 +1145,24 @@ class DatabaseManager:
             """, (datetime.now(),))
             conn.commit()
     
+    def count_failed_generations(self, user_id: Optional[int] = None, days: int = 30) -> int:
+        """Fehlgeschlagene Generierungen der letzten Tage (aus Audit-Logs)"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            if user_id:
+                cursor.execute("""
+                    SELECT COUNT(*) FROM audit_logs 
+                    WHERE user_id = ? AND action = 'text_generation' AND success = 0
+                    AND created_at >= DATE('now', ?)
+                """, (user_id, f"-{days} days"))
+            else:
+                cursor.execute("""
+                    SELECT COUNT(*) FROM audit_logs 
+                    WHERE action = 'text_generation' AND success = 0
+                    AND created_at >= DATE('now', ?)
+                """, (f"-{days} days",))
+            return cursor.fetchone()[0]
+    
     def get_statistics(self, user_id: Optional[int] = None) -> Dict[str, Any]:
         """Holt erweiterte Statistiken"""
         with self.get_connection() as conn:
@@ -391,12 +1199,7 @@ class DatabaseManager:
                 successful_generations = cursor.fetchone()[0]
                 
                 # Fehlgeschlagene Generierungen (aus Audit-Logs)
-                cursor.execute("""
-                    SELECT COUNT(*) FROM audit_logs 
-                    WHERE user_id = ? AND action = 'text_generation' AND success = 0
-                    AND DATE(created_at) >= DATE('now', '-30 days')
-                """, (user_id,))
-                failed_generations = cursor.fetchone()[0]
+                failed_generations = self.count_failed_generations(user_id)
                 
                 total_attempts = successful_generations + failed_generations
                 if total_attempts > 0:
@@ -408,12 +1211,7 @@ class DatabaseManager:
                 cursor.execute("SELECT COUNT(*) FROM text_generations")
                 successful_generations = cursor.fetchone()[0]
                 
-                cursor.execute("""
-                    SELECT COUNT(*) FROM audit_logs 
-                    WHERE action = 'text_generation' AND success = 0
-                    AND DATE(created_at) >= DATE('now', '-30 days')
-                """)
-                failed_generations = cursor.fetchone()[0]
+                failed_generations = self.count_failed_generations()
                 
                 total_attempts = successful_generations + failed_generations
                 if total_attempts > 0:
@@ -505,9 +1303,10 @@ class DatabaseManager:
             stats['active_users'] = cursor.fetchone()[0]
             
             # Audit-Events heute
+            # Bereichsabfrage statt DATE(created_at), damit der Index genutzt wird
             cursor.execute("""
                 SELECT COUNT(*) FROM audit_logs 
-                WHERE DATE(created_at) = DATE('now')
+                WHERE created_at >= DATE('now') AND created_at < DATE('now', '+1 day')
             """)
             stats['audit_events_today'] = cursor.fetchone()[0]
             
@@ -529,34 +1328,32 @@ class DatabaseManager:
     # Chat-Funktionalität Methoden
     def create_chat_session(self, session_id: str, user_id: str, title: str, model: str, system_prompt: str = None) -> str:
         """Erstellt eine neue Chat-Session"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO chat_sessions (id, user_id, title, model, system_prompt)
-                VALUES (?, ?, ?, ?, ?)
-            """, (session_id, user_id, title, model, system_prompt))
-            conn.commit()
-            return session_id
+        self._write(lambda cursor: cursor.execute("""
+            INSERT INTO chat_sessions (id, user_id, title, model, system_prompt)
+            VALUES (?, ?, ?, ?, ?)
+        """, (session_id, user_id, title, model, system_prompt)))
+        return session_id
     
-    def get_chat_sessions(self, user_id: str, limit: int = 50) -> List[Dict[str, Any]]:
-        """Holt alle Chat-Sessions eines Benutzers"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT cs.*, 
-                       COUNT(cm.id) as message_count
-                FROM chat_sessions cs
-                LEFT JOIN chat_messages cm ON cs.id = cm.chat_session_id
-                WHERE cs.user_id = ?
-                GROUP BY cs.id
-                ORDER BY cs.updated_at DESC
-                LIMIT ?
-            """, (user_id, limit))
-            
-            sessions = []
-            for row in cursor.fetchall():
-                sessions.append(dict(row))
-            return sessions
+    def get_chat_sessions_page(self, user_id: str, limit: int = 50, cursor: Optional[str] = None,
+                               model: Optional[str] = None, start: Optional[str] = None,
+                               end: Optional[str] = None) -> Dict[str, Any]:
+        """Holt eine Seite Chat-Sessions eines Benutzers (zuletzt aktualisierte zuerst)"""
+        conditions = ["cs.user_id = ?"]
+        params: List[Any] = [user_id]
+        if model:
+            conditions.append("cs.model = ?")
+            params.append(model)
+        if start:
+            conditions.append("cs.updated_at >= ?")
+            params.append(start)
+        if end:
+            conditions.append("cs.updated_at < ?")
+            params.append(end)
+        
+        # Zähler und Vorschau sind denormalisiert, daher reicht ein Index-Range-Scan
+        return self._keyset_page(
+            "SELECT * FROM chat_sessions cs", conditions, params, "cs.updated_at", "cs.id", limit, cursor
+        )
     
     def get_chat_session(self, session_id: str, user_id: str) -> Optional[Dict[str, Any]]:
         """Holt eine spezifische Chat-Session"""
@@ -572,68 +1369,217 @@ class DatabaseManager:
     
     def update_chat_session_title(self, session_id: str, user_id: str, title: str):
         """Aktualisiert den Titel einer Chat-Session"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                UPDATE chat_sessions 
-                SET title = ?, updated_at = CURRENT_TIMESTAMP
-                WHERE id = ? AND user_id = ?
-            """, (title, session_id, user_id))
-            conn.commit()
+        self._write(lambda cursor: cursor.execute("""
+            UPDATE chat_sessions 
+            SET title = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND user_id = ?
+        """, (title, session_id, user_id)))
+        
+        self.notify_write('chat_sessions', [{'id': session_id, 'event': 'update'}])
+    
+    def update_chat_session(self, session_id: str, user_id: str, title: str,
+                            system_prompt: Optional[str] = None) -> bool:
+        """Aktualisiert Titel und System-Prompt einer Chat-Session"""
+        updated = self._write(lambda cursor: cursor.execute("""
+            UPDATE chat_sessions 
+            SET title = ?, system_prompt = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND user_id = ?
+        """, (title, system_prompt, session_id, user_id)).rowcount) > 0
+        
+        self.notify_write('chat_sessions', [{'id': session_id, 'event': 'update'}])
+        return updated
     
     def delete_chat_session(self, session_id: str, user_id: str) -> bool:
         """Löscht eine Chat-Session und alle zugehörigen Nachrichten"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
+        def delete(cursor):
             cursor.execute("""
                 DELETE FROM chat_sessions 
                 WHERE id = ? AND user_id = ?
             """, (session_id, user_id))
-            conn.commit()
-            return cursor.rowcount > 0
+            deleted = cursor.rowcount > 0
+            
+            # Foreign Keys sind in SQLite nicht aktiv, Nachrichten daher explizit löschen
+            if deleted:
+                cursor.execute("""
+                    DELETE FROM chat_messages WHERE chat_session_id = ?
+                """, (session_id,))
+            return deleted
+        
+        deleted = self._write(delete)
+        
+        self.notify_write('chat_sessions', [{'id': session_id, 'event': 'delete'}])
+        return deleted
     
     def add_chat_message(self, message_id: str, chat_session_id: str, role: str, 
                         content: str, generation_id: Optional[str] = None) -> str:
         """Fügt eine neue Nachricht zu einer Chat-Session hinzu"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
+        # Gleiches Format wie CURRENT_TIMESTAMP (UTC), damit Caches den Zeitstempel ohne Lesezugriff kennen
+        timestamp = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+        stored, codec_flags = self._encode_columns({'content': content}, CHAT_MESSAGE_COLUMNS)
+        
+        def insert(cursor):
             cursor.execute("""
-                INSERT INTO chat_messages (id, chat_session_id, role, content, generation_id)
-                VALUES (?, ?, ?, ?, ?)
-            """, (message_id, chat_session_id, role, content, generation_id))
+                INSERT INTO chat_messages (id, chat_session_id, role, content, generation_id, timestamp, codec_flags)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (message_id, chat_session_id, role, stored['content'], generation_id, timestamp, codec_flags))
             
-            # Aktualisiere updated_at der Chat-Session
+            # Aktualisiere updated_at, Zähler und Vorschau der Chat-Session
             cursor.execute("""
                 UPDATE chat_sessions 
-                SET updated_at = CURRENT_TIMESTAMP
+                SET updated_at = ?,
+                    message_count = message_count + 1,
+                    last_message_at = ?,
+                    last_message_preview = ?
                 WHERE id = ?
+            """, (timestamp, timestamp, content[:CHAT_PREVIEW_LENGTH], chat_session_id))
+        
+        self._write(insert)
+        
+        self.notify_write('chat_messages', [{
+            'id': message_id,
+            'chat_session_id': chat_session_id,
+            'role': role,
+            'content': content,
+            'generation_id': generation_id,
+            'timestamp': timestamp
+        }])
+        return message_id
+    
+    def delete_chat_message(self, message_id: str, chat_session_id: str) -> bool:
+        """Löscht eine Nachricht und aktualisiert die Zähler der Chat-Session"""
+        def delete(cursor):
+            cursor.execute("""
+                DELETE FROM chat_messages 
+                WHERE id = ? AND chat_session_id = ?
+            """, (message_id, chat_session_id))
+            if cursor.rowcount == 0:
+                return False
+            
+            # Vorschau in Python, da der Inhalt komprimiert gespeichert sein kann
+            cursor.execute("""
+                SELECT content, codec_flags, timestamp FROM chat_messages
+                WHERE chat_session_id = ?
+                ORDER BY timestamp DESC, rowid DESC
+                LIMIT 1
             """, (chat_session_id,))
+            last = cursor.fetchone()
+            last = decode_row(dict(last), CHAT_MESSAGE_COLUMNS, self._get_dictionary) if last else None
             
-            conn.commit()
-            return message_id
+            cursor.execute("""
+                UPDATE chat_sessions 
+                SET message_count = MAX(message_count - 1, 0),
+                    last_message_at = ?,
+                    last_message_preview = ?
+                WHERE id = ?
+            """, (last['timestamp'] if last else None,
+                  last['content'][:CHAT_PREVIEW_LENGTH] if last else None, chat_session_id))
+            return True
+        
+        if not self._write(delete):
+            return False
+        self.notify_write('chat_sessions', [{'id': chat_session_id, 'event': 'update'}])
+        return True
     
     def get_chat_messages(self, chat_session_id: str, limit: int = 100) -> List[Dict[str, Any]]:
-        """Holt alle Nachrichten einer Chat-Session"""
+        """Holt die neuesten Nachrichten einer Chat-Session in chronologischer Reihenfolge"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                SELECT * FROM chat_messages 
-                WHERE chat_session_id = ?
-                ORDER BY timestamp ASC
-                LIMIT ?
+                SELECT id, chat_session_id, role, content, generation_id, timestamp, codec_flags FROM (
+                    SELECT cm.*, cm.rowid AS message_rowid FROM chat_messages cm
+                    WHERE cm.chat_session_id = ?
+                    ORDER BY cm.timestamp DESC, cm.rowid DESC
+                    LIMIT ?
+                )
+                ORDER BY timestamp ASC, message_rowid ASC
             """, (chat_session_id, limit))
             
             messages = []
             for row in cursor.fetchall():
-                messages.append(dict(row))
+                messages.append(decode_row(dict(row), CHAT_MESSAGE_COLUMNS, self._get_dictionary))
             return messages
     
-    def get_chat_session_with_messages(self, session_id: str, user_id: str) -> Optional[Dict[str, Any]]:
-        """Holt eine Chat-Session mit allen Nachrichten"""
-        session = self.get_chat_session(session_id, user_id)
-        if not session:
+    def get_chat_session_with_messages(self, session_id: str, user_id: str, limit: int = 50,
+                                       before: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Holt eine Chat-Session mit den neuesten Nachrichten (vor dem Cursor 'before') in einer Abfrage"""
+        if limit < 1:
+            # 0 endete in message_rows[0] auf einer leeren Liste, negative Werte laden den ganzen Verlauf
+            raise ValueError(f"Ungültiges Seitenlimit: {limit}")
+        conditions = ["cm.chat_session_id = ?"]
+        params: List[Any] = [session_id]
+        if before:
+            timestamp, message_rowid = decode_cursor(before)
+            conditions.append("(cm.timestamp, cm.rowid) < (?, ?)")
+            params.extend([timestamp, message_rowid])
+        
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            # Eine Nachricht mehr lesen, um festzustellen, ob ältere Nachrichten existieren
+            cursor.execute(f"""
+                WITH page AS (
+                    SELECT cm.id AS message_id, cm.role, cm.content, cm.generation_id,
+                           cm.timestamp, cm.rowid AS message_rowid, cm.codec_flags AS message_codec_flags
+                    FROM chat_messages cm
+                    WHERE {' AND '.join(conditions)}
+                    ORDER BY cm.timestamp DESC, cm.rowid DESC
+                    LIMIT ?
+                )
+                SELECT cs.*, page.* FROM chat_sessions cs
+                LEFT JOIN page ON 1 = 1
+                WHERE cs.id = ? AND cs.user_id = ?
+                ORDER BY page.timestamp ASC, page.message_rowid ASC
+            """, (*params, limit + 1, session_id, user_id))
+            rows = [dict(row) for row in cursor.fetchall()]
+        
+        if not rows:
             return None
         
-        messages = self.get_chat_messages(session_id)
-        session['messages'] = messages
-        return session 
\ No newline at end of file
+        message_keys = ('message_id', 'role', 'content', 'generation_id', 'timestamp', 'message_rowid',
+                        'message_codec_flags')
+        session = {key: value for key, value in rows[0].items() if key not in message_keys}
+        message_rows = [row for row in rows if row['message_id'] is not None]
+        
+        has_more = len(message_rows) > limit
+        if has_more:
+            message_rows = message_rows[1:]
+        
+        session['messages'] = [
+            {
+                'id': row['message_id'],
+                'chat_session_id': session_id,
+                'role': row['role'],
+                'content': (
+                    decode_text(row['content'], self._get_dictionary) if row['message_codec_flags'] else row['content']
+                ),
+                'generation_id': row['generation_id'],
+                'timestamp': row['timestamp']
+            }
+            for row in message_rows
+        ]
+        session['has_more'] = has_more
+        session['next_before'] = (
+            encode_cursor(message_rows[0]['timestamp'], message_rows[0]['message_rowid']) if has_more else None
+        )
+        return session
+
+def create_database_manager(database_url: str, pool_size: int = 10, shard_dir: Optional[str] = None,
+                            codec: Optional[TextCodec] = None, group_commit: bool = False) -> BaseDatabaseManager:
+    """Wählt das Speicher-Backend anhand von DATABASE_URL (und optional SQLite-Sharding)
+    
+    Text-Codec und Gruppen-Commit gelten nur für SQLite; PostgreSQL komprimiert große Werte
+    selbst (TOAST) und verteilt Schreibvorgänge über den Verbindungspool.
+    """
+    if database_url.startswith(("postgresql://", "postgres://")):
+        if shard_dir:
+            raise ValueError("Sharding wird nur mit SQLite unterstützt")
+        # Optionale Abhängigkeit, nur für PostgreSQL benötigt
+        from database_postgres import PostgresDatabaseManager
+        return PostgresDatabaseManager(database_url, min_size=min(2, pool_size), max_size=pool_size)
+    if database_url.startswith("sqlite:///"):
+        if shard_dir:
+            from database_sharding import ShardedDatabaseManager
+            return ShardedDatabaseManager(
+                database_url[len("sqlite:///"):], shard_dir, codec=codec, group_commit=group_commit
+            )
+        return DatabaseManager(database_url[len("sqlite:///"):], codec=codec, group_commit=group_commit)
+    raise ValueError(f"Nicht unterstützte DATABASE_URL: {database_url.split('://')[0]}")
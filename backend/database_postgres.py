@@ -0,0 +1,868 @@
+"""
+PostgreSQL Database Module für Praivio
+Speicher-Backend auf Basis eines asyncpg-Verbindungspools für mehrere parallel schreibende API-Worker
+"""
+
+import asyncio
+import base64
+import logging
+import re
+import threading
+from datetime import datetime, date, timezone
+from typing import Optional, List, Dict, Any, Iterator
+
+import asyncpg
+
+from database import (
+    BaseDatabaseManager, InvalidCursorError, encode_cursor, decode_cursor,
+    UPLOADED_FILE_COLUMNS, UPLOADED_FILE_UPDATABLE, uploaded_file_projection
+)
+from migrations import CHAT_PREVIEW_LENGTH, schema_statements, pending_migrations
+
+logger = logging.getLogger(__name__)
+
+# Schlüssel für pg_advisory_xact_lock, damit parallel startende Worker nicht gleichzeitig migrieren
+SCHEMA_LOCK_ID = 7243_1001
+
+_PLACEHOLDER = re.compile(r"\?")
+
+def _numbered(sql: str) -> str:
+    """Übersetzt ?-Platzhalter in die nummerierten Platzhalter von PostgreSQL ($1, $2, ...)"""
+    counter = iter(range(1, 10000))
+    return _PLACEHOLDER.sub(lambda _: f"${next(counter)}", sql)
+
+def _timestamp(value: Any) -> Optional[datetime]:
+    """Wandelt Zeitstempel-Strings (Cursor, Filter) in naive UTC-datetimes für asyncpg"""
+    if value is None or isinstance(value, datetime):
+        return value
+    parsed = datetime.fromisoformat(str(value))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def _user_ref(user_id: Any) -> Optional[str]:
+    """Benutzer-Referenzen sind in PostgreSQL TEXT (Supabase-UUIDs und lokale IDs)"""
+    return str(user_id) if user_id is not None else None
+
+def _row(record: Optional[asyncpg.Record]) -> Optional[Dict[str, Any]]:
+    """Record -> dict, Zeitstempel im gleichen Textformat wie SQLite"""
+    if record is None:
+        return None
+    row = {}
+    for key, value in record.items():
+        if isinstance(value, datetime):
+            value = value.isoformat(sep=" ")
+        elif isinstance(value, date):
+            value = value.isoformat()
+        row[key] = value
+    return row
+
+def _rowcount(status: str) -> int:
+    """Anzahl betroffener Zeilen aus dem Status-String ('UPDATE 3', 'DELETE 0', ...)"""
+    try:
+        return int(status.split()[-1])
+    except (ValueError, IndexError):
+        return 0
+
+class PostgresDatabaseManager(BaseDatabaseManager):
+    """Datenbankverwaltung für PostgreSQL mit asyncpg-Pool
+    
+    Die Schnittstelle bleibt synchron wie beim SQLite-Backend: alle Abfragen laufen auf
+    einer eigenen Event-Loop in einem Hintergrund-Thread und teilen sich den Pool. Jeder
+    Aufruf wartet auf sein Ergebnis; async Endpoints rufen ihn deshalb per asyncio.to_thread
+    auf, damit gleichzeitige Anfragen parallel Verbindungen aus dem Pool nutzen.
+    """
+    
+    dialect = "postgresql"
+    
+    def __init__(self, dsn: str, min_size: int = 2, max_size: int = 10):
+        super().__init__()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="postgres-loop", daemon=True)
+        self._thread.start()
+        
+        self._pool: asyncpg.Pool = self._run(asyncpg.create_pool(
+            dsn,
+            min_size=min_size,
+            max_size=max_size,
+            # CURRENT_TIMESTAMP und CURRENT_DATE in UTC wie bei SQLite
+            server_settings={'timezone': 'UTC'}
+        ))
+        self._run(self._init_database())
+    
+    def _run(self, coro):
+        """Führt eine Coroutine auf der Datenbank-Loop aus und wartet auf das Ergebnis"""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+    
+    async def _init_database(self):
+        """Legt das Schema an und wendet ausstehende Migrationen an"""
+        async with self._pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute("SELECT pg_advisory_xact_lock($1)", SCHEMA_LOCK_ID)
+                
+                for statement in schema_statements(self.dialect):
+                    await conn.execute(statement)
+                
+                # Standard-Rollen und Standard-Organisation
+                await conn.executemany("""
+                    INSERT INTO roles (name, description, permissions)
+                    VALUES ($1, $2, $3)
+                    ON CONFLICT (name) DO NOTHING
+                """, [
+                    ('admin', 'Systemadministrator', '["all"]'),
+                    ('manager', 'Manager/Leitung', '["read", "write", "export", "manage_users"]'),
+                    ('user', 'Standardbenutzer', '["read", "write"]'),
+                    ('viewer', 'Nur Lesen', '["read"]')
+                ])
+                await conn.execute("""
+                    INSERT INTO organizations (name, type, contact_person, contact_email)
+                    SELECT $1, $2, $3, $4
+                    WHERE NOT EXISTS (SELECT 1 FROM organizations)
+                """, 'Demo Organisation', 'hospital', 'Admin', 'admin@demo.org')
+                
+                # Versionierung über eine eigene Tabelle (Gegenstück zu PRAGMA user_version)
+                await conn.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)")
+                current_version = await conn.fetchval("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+                for version, name, statements in pending_migrations(current_version, self.dialect):
+                    logger.info(f"Applying database migration {version}: {name}")
+                    for statement in statements:
+                        await conn.execute(statement)
+                    await conn.execute("INSERT INTO schema_version (version) VALUES ($1)", version)
+    
+    # Grundoperationen
+    async def _fetch_async(self, sql: str, args: tuple) -> List[asyncpg.Record]:
+        async with self._pool.acquire() as conn:
+            return await conn.fetch(_numbered(sql), *args)
+    
+    async def _execute_async(self, sql: str, args: tuple) -> str:
+        async with self._pool.acquire() as conn:
+            return await conn.execute(_numbered(sql), *args)
+    
+    def _fetch(self, sql: str, *args) -> List[Dict[str, Any]]:
+        return [_row(record) for record in self._run(self._fetch_async(sql, args))]
+    
+    def _fetchrow(self, sql: str, *args) -> Optional[Dict[str, Any]]:
+        rows = self._fetch(sql, *args)
+        return rows[0] if rows else None
+    
+    def _fetchval(self, sql: str, *args) -> Any:
+        records = self._run(self._fetch_async(sql, args))
+        return records[0][0] if records else None
+    
+    def _execute(self, sql: str, *args) -> int:
+        return _rowcount(self._run(self._execute_async(sql, args)))
+    
+    def _transaction(self, statements: List[tuple]) -> List[int]:
+        """Führt (sql, args)-Paare in einer Transaktion aus und liefert die betroffenen Zeilen"""
+        async def run():
+            async with self._pool.acquire() as conn:
+                async with conn.transaction():
+                    return [
+                        _rowcount(await conn.execute(_numbered(sql), *args))
+                        for sql, args in statements
+                    ]
+        return self._run(run())
+    
+    def ping(self) -> bool:
+        """Prüft, ob die Datenbank erreichbar ist"""
+        return self._fetchval("SELECT 1") == 1
+    
+    def close(self):
+        """Schließt den Pool und beendet die Datenbank-Loop"""
+        if self._loop.is_closed():
+            return
+        self._run(self._pool.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+        self._loop.close()
+    
+    # Benutzer und Sessions
+    def create_user(self, username: str, email: str, password_hash: str,
+                    password_salt: str, role_id: int, organization_id: int) -> int:
+        """Erstellt einen neuen Benutzer"""
+        user_id = self._fetchval("""
+            INSERT INTO users (username, email, password_hash, password_salt, role_id, organization_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+            RETURNING id
+        """, username, email, password_hash, password_salt, role_id, organization_id)
+        
+        self.notify_write('users', [{'id': user_id, 'organization_id': organization_id}])
+        return user_id
+    
+    def get_user_by_username(self, username: str) -> Optional[Dict[str, Any]]:
+        """Holt einen Benutzer anhand des Benutzernamens"""
+        return self._fetchrow("""
+            SELECT u.*, r.name as role_name, r.permissions, o.name as organization_name
+            FROM users u
+            JOIN roles r ON u.role_id = r.id
+            JOIN organizations o ON u.organization_id = o.id
+            WHERE u.username = ? AND u.is_active = TRUE
+        """, username)
+    
+    def get_user_by_id(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Holt einen Benutzer anhand der ID"""
+        return self._fetchrow("""
+            SELECT u.*, r.name as role_name, r.permissions, o.name as organization_name
+            FROM users u
+            JOIN roles r ON u.role_id = r.id
+            JOIN organizations o ON u.organization_id = o.id
+            WHERE u.id = ? AND u.is_active = TRUE
+        """, int(user_id))
+    
+    def update_user_last_login(self, user_id: int):
+        """Aktualisiert den letzten Login-Zeitpunkt"""
+        self._execute("UPDATE users SET last_login = ? WHERE id = ?", datetime.now(), int(user_id))
+    
+    def create_session(self, user_id: int, session_token: str, expires_at: datetime,
+                       ip_address: str, user_agent: str) -> int:
+        """Erstellt eine neue Benutzersession"""
+        return self._fetchval("""
+            INSERT INTO user_sessions (user_id, session_token, expires_at, ip_address, user_agent)
+            VALUES (?, ?, ?, ?, ?)
+            RETURNING id
+        """, int(user_id), session_token, expires_at, ip_address, user_agent)
+    
+    def get_valid_session(self, session_token: str) -> Optional[Dict[str, Any]]:
+        """Holt eine gültige Session"""
+        return self._fetchrow("""
+            SELECT * FROM user_sessions
+            WHERE session_token = ? AND expires_at > ? AND is_active = TRUE
+        """, session_token, datetime.now())
+    
+    def invalidate_session(self, session_token: str):
+        """Macht eine Session ungültig"""
+        self._execute("UPDATE user_sessions SET is_active = FALSE WHERE session_token = ?", session_token)
+    
+    def cleanup_expired_sessions(self):
+        """Bereinigt abgelaufene Sessions"""
+        self._execute("UPDATE user_sessions SET is_active = FALSE WHERE expires_at < ?", datetime.now())
+    
+    # Audit-Logs
+    def log_audit_event(self, user_id: Optional[int], action: str, details: str,
+                        ip_address: str, user_agent: str, success: bool = True,
+                        error_message: Optional[str] = None):
+        """Loggt ein Audit-Event"""
+        self._execute("""
+            INSERT INTO audit_logs (user_id, action, details, ip_address, user_agent, success, error_message)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, _user_ref(user_id), action, details, ip_address, user_agent, bool(success), error_message)
+        
+        self.notify_write('audit_logs', [{'user_id': user_id, 'action': action, 'success': success}])
+    
+    def insert_audit_logs(self, rows: List[tuple], synchronous: str = "NORMAL"):
+        """Schreibt (user_id, action, details, ip_address, success, error_message, created_at) als Batch"""
+        records = [
+            (_user_ref(user_id), action, details, ip_address, bool(success), error_message, _timestamp(created_at))
+            for user_id, action, details, ip_address, success, error_message, created_at in rows
+        ]
+        
+        async def run():
+            async with self._pool.acquire() as conn:
+                async with conn.transaction():
+                    # Gegenstück zu PRAGMA synchronous = OFF: Commit wartet nicht auf den WAL-Flush
+                    if synchronous.upper() == "OFF":
+                        await conn.execute("SET LOCAL synchronous_commit = off")
+                    await conn.executemany("""
+                        INSERT INTO audit_logs (user_id, action, details, ip_address, success, error_message, created_at)
+                        VALUES ($1, $2, $3, $4, $5, $6, $7)
+                    """, records)
+        self._run(run())
+    
+    def _keyset_page(self, sql: str, conditions: List[str], params: List[Any],
+                     sort_column: str, id_column: str, limit: int,
+                     cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Führt eine absteigende Keyset-Abfrage auf (sort_column, id_column) aus"""
+        if limit < 1:
+            # 0 endete in rows[-1] auf einer leeren Liste, negative Werte lehnt PostgreSQL ab
+            raise ValueError(f"Ungültiges Seitenlimit: {limit}")
+        conditions = list(conditions)
+        params = list(params)
+        if cursor:
+            sort_value, row_id = decode_cursor(cursor)
+            try:
+                sort_value = _timestamp(sort_value)
+            except ValueError:
+                raise InvalidCursorError("Ungültiger Cursor")
+            conditions.append(f"({sort_column}, {id_column}) < (?, ?)")
+            params.extend([sort_value, row_id])
+        
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        # Eine Zeile mehr lesen, um festzustellen, ob es eine weitere Seite gibt
+        rows = self._fetch(f"""
+            {sql}
+            {where}
+            ORDER BY {sort_column} DESC, {id_column} DESC
+            LIMIT ?
+        """, *params, limit + 1)
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            sort_key = sort_column.split(".")[-1]
+            id_key = id_column.split(".")[-1]
+            next_cursor = encode_cursor(rows[-1][sort_key], rows[-1][id_key])
+        return {'items': rows, 'next_cursor': next_cursor}
+    
+    def get_audit_logs_page(self, user_id: Optional[int] = None, limit: int = 100,
+                            cursor: Optional[str] = None, action: Optional[str] = None,
+                            success: Optional[bool] = None, start: Optional[str] = None,
+                            end: Optional[str] = None) -> Dict[str, Any]:
+        """Holt eine Seite Audit-Logs (neueste zuerst) mit optionalen Filtern"""
+        conditions = []
+        params: List[Any] = []
+        if user_id:
+            conditions.append("al.user_id = ?")
+            params.append(_user_ref(user_id))
+        if action:
+            conditions.append("al.action = ?")
+            params.append(action)
+        if success is not None:
+            conditions.append("al.success = ?")
+            params.append(bool(success))
+        if start:
+            conditions.append("al.created_at >= ?")
+            params.append(_timestamp(start))
+        if end:
+            conditions.append("al.created_at < ?")
+            params.append(_timestamp(end))
+        
+        return self._keyset_page("""
+            SELECT al.*, u.username FROM audit_logs al
+            LEFT JOIN users u ON al.user_id = u.id::text
+        """, conditions, params, "al.created_at", "al.id", limit, cursor)
+    
+    # Audit-Archiv
+    def get_audit_periods_before(self, cutoff: str) -> List[str]:
+        """Monate ('YYYY-MM') mit Audit-Einträgen vor dem Stichtag"""
+        return [row['period'] for row in self._fetch("""
+            SELECT DISTINCT to_char(created_at, 'YYYY-MM') AS period
+            FROM audit_logs
+            WHERE created_at < ?
+            ORDER BY period
+        """, _timestamp(cutoff))]
+    
+    def next_audit_partition_segment(self, period: str) -> int:
+        """Nächste freie Segmentnummer einer Periode"""
+        return self._fetchval("SELECT COALESCE(MAX(segment), 0) + 1 FROM audit_partitions WHERE period = ?", period)
+    
+    def iter_audit_logs_range(self, start: str, end: str, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """Iteriert nach ID sortiert über Audit-Einträge im Zeitraum [start, end)"""
+        last_id = 0
+        while True:
+            rows = self._fetch("""
+                SELECT al.*, u.username FROM audit_logs al
+                LEFT JOIN users u ON al.user_id = u.id::text
+                WHERE al.created_at >= ? AND al.created_at < ? AND al.id > ?
+                ORDER BY al.id
+                LIMIT ?
+            """, _timestamp(start), _timestamp(end), last_id, batch_size)
+            if not rows:
+                break
+            yield from rows
+            last_id = rows[-1]['id']
+    
+    def seal_audit_partition(self, partition: Dict[str, Any], start: str, end: str):
+        """Registriert ein Archiv-Segment und entfernt die exportierten Zeilen atomar"""
+        self._transaction([
+            ("""
+                INSERT INTO audit_partitions (period, segment, archive_path, row_count, min_id, max_id, sha256)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (partition['period'], partition['segment'], partition['archive_path'], partition['row_count'],
+                  partition['min_id'], partition['max_id'], partition['sha256'])),
+            ("""
+                DELETE FROM audit_logs
+                WHERE created_at >= ? AND created_at < ? AND id <= ?
+            """, (_timestamp(start), _timestamp(end), partition['max_id']))
+        ])
+    
+    def get_audit_partitions(self) -> List[Dict[str, Any]]:
+        """Alle Audit-Partitionen, neueste zuerst"""
+        return self._fetch("SELECT * FROM audit_partitions ORDER BY period DESC, segment DESC")
+    
+    def set_audit_partition_status(self, partition_id: int, status: str):
+        """Setzt den Status einer Partition ('sealed', 'expired')"""
+        self._execute("UPDATE audit_partitions SET status = ? WHERE id = ?", status, partition_id)
+    
+    # Text-Generierungen und Statistiken
+    def save_text_generation(self, user_id: int, prompt: str, generated_text: str,
+                             model_used: str, tokens_used: int, processing_time: float,
+                             template_used: Optional[str] = None, context: Optional[str] = None,
+                             is_encrypted: bool = False, uid: Optional[str] = None,
+                             created_at: Optional[str] = None) -> int:
+        """Speichert eine Text-Generierung (mit uid idempotent: eine vorhandene Zeile wird nicht dupliziert)"""
+        if self.encryptor is not None:
+            # TEXT-Spalten: Chiffretext Base64-kodiert
+            encrypted = self.encryptor.encrypt_fields(
+                user_id, {'prompt': prompt, 'generated_text': generated_text, 'context': context}
+            )
+            prompt, generated_text, context = (
+                base64.b64encode(encrypted[column]).decode("ascii") if encrypted[column] is not None else None
+                for column in ('prompt', 'generated_text', 'context')
+            )
+            is_encrypted = True
+        generation_id = self._fetchval("""
+            INSERT INTO text_generations
+            (user_id, prompt, generated_text, model_used, tokens_used, processing_time,
+             template_used, context, is_encrypted, uid, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+            ON CONFLICT (uid) DO NOTHING
+            RETURNING id
+        """, _user_ref(user_id), prompt, generated_text, model_used, tokens_used, processing_time,
+            template_used, context, bool(is_encrypted), uid, _timestamp(created_at) if created_at else None)
+        if generation_id is None:
+            # Bereits gespeichert (erneut nachgespieltes Journal)
+            return self._fetchval("SELECT id FROM text_generations WHERE uid = ?", uid)
+        
+        self.notify_write('text_generations', [{'id': generation_id, 'user_id': user_id, 'model_used': model_used}])
+        return generation_id
+    
+    def get_generations_page(self, user_id: Optional[int] = None, limit: int = 50, cursor: Optional[str] = None,
+                             model: Optional[str] = None, start: Optional[str] = None,
+                             end: Optional[str] = None) -> Dict[str, Any]:
+        """Holt eine Seite Text-Generierungen (neueste zuerst), optional für einen Benutzer"""
+        conditions = []
+        params: List[Any] = []
+        if user_id:
+            conditions.append("user_id = ?")
+            params.append(_user_ref(user_id))
+        if model:
+            conditions.append("model_used = ?")
+            params.append(model)
+        if start:
+            conditions.append("created_at >= ?")
+            params.append(_timestamp(start))
+        if end:
+            conditions.append("created_at < ?")
+            params.append(_timestamp(end))
+        
+        page = self._keyset_page(
+            "SELECT * FROM text_generations", conditions, params, "created_at", "id", limit, cursor
+        )
+        for row in page['items']:
+            row.pop('codec_flags', None)
+        self._decrypt_generations([row for row in page['items'] if row.get('is_encrypted')])
+        return page
+    
+    def _decrypt_generations(self, rows: List[Dict[str, Any]]):
+        if not rows:
+            return
+        if self.encryptor is None:
+            raise RuntimeError("Verschlüsselte Generierungen gefunden, aber keine Feldverschlüsselung konfiguriert")
+        columns = ('prompt', 'generated_text', 'context')
+        for row in rows:
+            for column in columns:
+                if row.get(column) is not None:
+                    row[column] = base64.b64decode(row[column])
+        self.encryptor.decrypt_rows(rows, columns)
+        for row in rows:
+            for column in columns:
+                if row.get(column) is not None:
+                    row[column] = row[column].decode("utf-8")
+    
+    def count_failed_generations(self, user_id: Optional[int] = None, days: int = 30) -> int:
+        """Fehlgeschlagene Generierungen der letzten Tage (aus Audit-Logs)"""
+        user_filter = "user_id = ?" if user_id else "TRUE"
+        user_params = (_user_ref(user_id),) if user_id else ()
+        return self._fetchval(f"""
+            SELECT COUNT(*) FROM audit_logs
+            WHERE {user_filter} AND action = 'text_generation' AND success = FALSE
+            AND created_at >= CURRENT_DATE - make_interval(days => ?)
+        """, *user_params, days)
+    
+    def get_statistics(self, user_id: Optional[int] = None) -> Dict[str, Any]:
+        """Holt erweiterte Statistiken"""
+        user_filter = "user_id = ?" if user_id else "TRUE"
+        user_params = (_user_ref(user_id),) if user_id else ()
+        
+        stats = {}
+        totals = self._fetchrow(f"""
+            SELECT COUNT(*) AS total_generations,
+                   COALESCE(SUM(tokens_used), 0) AS total_tokens_used,
+                   AVG(processing_time) AS avg_time,
+                   COUNT(*) FILTER (WHERE created_at >= CURRENT_DATE) AS generations_today
+            FROM text_generations
+            WHERE {user_filter}
+        """, *user_params)
+        stats['total_generations'] = totals['total_generations']
+        stats['total_tokens_used'] = totals['total_tokens_used']
+        stats['average_processing_time'] = round(totals['avg_time'], 2) if totals['avg_time'] else 0.0
+        
+        # Erfolgsrate (erfolgreiche Generierungen vs. fehlgeschlagene Audit-Logs der letzten 30 Tage)
+        failed_generations = self.count_failed_generations(user_id)
+        total_attempts = totals['total_generations'] + failed_generations
+        if total_attempts > 0:
+            stats['success_rate'] = round((totals['total_generations'] / total_attempts) * 100, 1)
+        else:
+            stats['success_rate'] = 100.0
+        
+        # Nutzungstrend (Generierungen der letzten 7 Tage)
+        stats['usage_trend'] = [
+            {'date': row['date'], 'count': row['count']}
+            for row in self._fetch(f"""
+                SELECT created_at::date AS date, COUNT(*) AS count
+                FROM text_generations
+                WHERE {user_filter} AND created_at >= CURRENT_DATE - INTERVAL '7 days'
+                GROUP BY created_at::date
+                ORDER BY date
+            """, *user_params)
+        ]
+        
+        # Detaillierte Modell-Nutzung
+        stats['model_usage'] = [
+            {
+                'model': row['model_used'],
+                'count': row['count'],
+                'total_tokens': row['total_tokens'] or 0,
+                'avg_time': round(row['avg_time'], 2) if row['avg_time'] else 0.0
+            }
+            for row in self._fetch(f"""
+                SELECT model_used, COUNT(*) AS count,
+                       SUM(tokens_used) AS total_tokens,
+                       AVG(processing_time) AS avg_time
+                FROM text_generations
+                WHERE {user_filter}
+                GROUP BY model_used
+                ORDER BY count DESC
+            """, *user_params)
+        ]
+        
+        # Template-Nutzung
+        stats['template_usage'] = [
+            {'template': row['template_used'], 'count': row['count']}
+            for row in self._fetch(f"""
+                SELECT template_used, COUNT(*) AS count
+                FROM text_generations
+                WHERE {user_filter} AND template_used IS NOT NULL
+                GROUP BY template_used
+                ORDER BY count DESC
+                LIMIT 5
+            """, *user_params)
+        ]
+        
+        stats['active_users'] = self._fetchval("SELECT COUNT(*) FROM users WHERE is_active = TRUE")
+        stats['audit_events_today'] = self._fetchval("""
+            SELECT COUNT(*) FROM audit_logs
+            WHERE created_at >= CURRENT_DATE AND created_at < CURRENT_DATE + 1
+        """)
+        stats['generations_today'] = totals['generations_today']
+        return stats
+    
+    # Chat-Funktionalität Methoden
+    def create_chat_session(self, session_id: str, user_id: str, title: str, model: str,
+                            system_prompt: str = None) -> str:
+        """Erstellt eine neue Chat-Session"""
+        self._execute("""
+            INSERT INTO chat_sessions (id, user_id, title, model, system_prompt)
+            VALUES (?, ?, ?, ?, ?)
+        """, session_id, _user_ref(user_id), title, model, system_prompt)
+        return session_id
+    
+    def get_chat_sessions_page(self, user_id: str, limit: int = 50, cursor: Optional[str] = None,
+                               model: Optional[str] = None, start: Optional[str] = None,
+                               end: Optional[str] = None) -> Dict[str, Any]:
+        """Holt eine Seite Chat-Sessions eines Benutzers (zuletzt aktualisierte zuerst)"""
+        conditions = ["cs.user_id = ?"]
+        params: List[Any] = [_user_ref(user_id)]
+        if model:
+            conditions.append("cs.model = ?")
+            params.append(model)
+        if start:
+            conditions.append("cs.updated_at >= ?")
+            params.append(_timestamp(start))
+        if end:
+            conditions.append("cs.updated_at < ?")
+            params.append(_timestamp(end))
+        
+        return self._keyset_page(
+            "SELECT * FROM chat_sessions cs", conditions, params, "cs.updated_at", "cs.id", limit, cursor
+        )
+    
+    def get_chat_session(self, session_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """Holt eine spezifische Chat-Session"""
+        return self._fetchrow("SELECT * FROM chat_sessions WHERE id = ? AND user_id = ?",
+                              session_id, _user_ref(user_id))
+    
+    def update_chat_session_title(self, session_id: str, user_id: str, title: str):
+        """Aktualisiert den Titel einer Chat-Session"""
+        self._execute("""
+            UPDATE chat_sessions
+            SET title = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND user_id = ?
+        """, title, session_id, _user_ref(user_id))
+        
+        self.notify_write('chat_sessions', [{'id': session_id, 'event': 'update'}])
+    
+    def update_chat_session(self, session_id: str, user_id: str, title: str,
+                            system_prompt: Optional[str] = None) -> bool:
+        """Aktualisiert Titel und System-Prompt einer Chat-Session"""
+        updated = self._execute("""
+            UPDATE chat_sessions
+            SET title = ?, system_prompt = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND user_id = ?
+        """, title, system_prompt, session_id, _user_ref(user_id)) > 0
+        
+        self.notify_write('chat_sessions', [{'id': session_id, 'event': 'update'}])
+        return updated
+    
+    def delete_chat_session(self, session_id: str, user_id: str) -> bool:
+        """Löscht eine Chat-Session (Nachrichten über ON DELETE CASCADE)"""
+        deleted = self._execute("DELETE FROM chat_sessions WHERE id = ? AND user_id = ?",
+                                session_id, _user_ref(user_id)) > 0
+        
+        self.notify_write('chat_sessions', [{'id': session_id, 'event': 'delete'}])
+        return deleted
+    
+    def add_chat_message(self, message_id: str, chat_session_id: str, role: str,
+                         content: str, generation_id: Optional[str] = None) -> str:
+        """Fügt eine neue Nachricht zu einer Chat-Session hinzu"""
+        # Sekundengenau wie CURRENT_TIMESTAMP in SQLite, damit beide Backends dieselben Werte liefern
+        timestamp = datetime.utcnow().replace(microsecond=0)
+        self._transaction([
+            ("""
+                INSERT INTO chat_messages (id, chat_session_id, role, content, generation_id, timestamp)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (message_id, chat_session_id, role, content, generation_id, timestamp)),
+            ("""
+                UPDATE chat_sessions
+                SET updated_at = ?,
+                    message_count = message_count + 1,
+                    last_message_at = ?,
+                    last_message_preview = ?
+                WHERE id = ?
+            """, (timestamp, timestamp, content[:CHAT_PREVIEW_LENGTH], chat_session_id))
+        ])
+        
+        self.notify_write('chat_messages', [{
+            'id': message_id,
+            'chat_session_id': chat_session_id,
+            'role': role,
+            'content': content,
+            'generation_id': generation_id,
+            'timestamp': timestamp.isoformat(sep=" ")
+        }])
+        return message_id
+    
+    def delete_chat_message(self, message_id: str, chat_session_id: str) -> bool:
+        """Löscht eine Nachricht und aktualisiert die Zähler der Chat-Session"""
+        async def run():
+            async with self._pool.acquire() as conn:
+                async with conn.transaction():
+                    status = await conn.execute("""
+                        DELETE FROM chat_messages WHERE id = $1 AND chat_session_id = $2
+                    """, message_id, chat_session_id)
+                    if _rowcount(status) == 0:
+                        return False
+                    await conn.execute("""
+                        UPDATE chat_sessions
+                        SET message_count = GREATEST(message_count - 1, 0),
+                            last_message_at = (
+                                SELECT MAX(timestamp) FROM chat_messages WHERE chat_session_id = $1
+                            ),
+                            last_message_preview = (
+                                SELECT substr(content, 1, $2) FROM chat_messages
+                                WHERE chat_session_id = $1
+                                ORDER BY timestamp DESC, rowid DESC
+                                LIMIT 1
+                            )
+                        WHERE id = $1
+                    """, chat_session_id, CHAT_PREVIEW_LENGTH)
+                    return True
+        
+        if not self._run(run()):
+            return False
+        
+        self.notify_write('chat_sessions', [{'id': chat_session_id, 'event': 'update'}])
+        return True
+    
+    def get_chat_messages(self, chat_session_id: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """Holt die neuesten Nachrichten einer Chat-Session in chronologischer Reihenfolge"""
+        return self._fetch("""
+            SELECT id, chat_session_id, role, content, generation_id, timestamp FROM (
+                SELECT cm.*, cm.rowid AS message_rowid FROM chat_messages cm
+                WHERE cm.chat_session_id = ?
+                ORDER BY cm.timestamp DESC, cm.rowid DESC
+                LIMIT ?
+            ) newest
+            ORDER BY timestamp ASC, message_rowid ASC
+        """, chat_session_id, limit)
+    
+    def get_chat_session_with_messages(self, session_id: str, user_id: str, limit: int = 50,
+                                       before: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Holt eine Chat-Session mit den neuesten Nachrichten (vor dem Cursor 'before') in einer Abfrage"""
+        if limit < 1:
+            # 0 endete in message_rows[0] auf einer leeren Liste, negative Werte lehnt PostgreSQL ab
+            raise ValueError(f"Ungültiges Seitenlimit: {limit}")
+        conditions = ["cm.chat_session_id = ?"]
+        params: List[Any] = [session_id]
+        if before:
+            timestamp, message_rowid = decode_cursor(before)
+            try:
+                timestamp = _timestamp(timestamp)
+            except ValueError:
+                raise InvalidCursorError("Ungültiger Cursor")
+            conditions.append("(cm.timestamp, cm.rowid) < (?, ?)")
+            params.extend([timestamp, message_rowid])
+        
+        # Eine Nachricht mehr lesen, um festzustellen, ob ältere Nachrichten existieren
+        rows = self._fetch(f"""
+            WITH page AS (
+                SELECT cm.id AS message_id, cm.role, cm.content, cm.generation_id,
+                       cm.timestamp, cm.rowid AS message_rowid
+                FROM chat_messages cm
+                WHERE {' AND '.join(conditions)}
+                ORDER BY cm.timestamp DESC, cm.rowid DESC
+                LIMIT ?
+            )
+            SELECT cs.*, page.* FROM chat_sessions cs
+            LEFT JOIN page ON TRUE
+            WHERE cs.id = ? AND cs.user_id = ?
+            ORDER BY page.timestamp ASC, page.message_rowid ASC
+        """, *params, limit + 1, session_id, _user_ref(user_id))
+        
+        if not rows:
+            return None
+        
+        message_keys = ('message_id', 'role', 'content', 'generation_id', 'timestamp', 'message_rowid')
+        session = {key: value for key, value in rows[0].items() if key not in message_keys}
+        message_rows = [row for row in rows if row['message_id'] is not None]
+        
+        has_more = len(message_rows) > limit
+        if has_more:
+            message_rows = message_rows[1:]
+        
+        session['messages'] = [
+            {
+                'id': row['message_id'],
+                'chat_session_id': session_id,
+                'role': row['role'],
+                'content': row['content'],
+                'generation_id': row['generation_id'],
+                'timestamp': row['timestamp']
+            }
+            for row in message_rows
+        ]
+        session['has_more'] = has_more
+        session['next_before'] = (
+            encode_cursor(message_rows[0]['timestamp'], message_rows[0]['message_rowid']) if has_more else None
+        )
+        return session
+    
+    # Datenschlüssel
+    def get_user_organization(self, user_id: Any) -> Optional[int]:
+        """Organisation eines Benutzers laut users.organization_id"""
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            # Externe IDs (z.B. Supabase-UUIDs) stehen nicht in users
+            return None
+        return self._fetchval("SELECT organization_id FROM users WHERE id = ?", user_id)
+    
+    def get_organization_key(self, organization_id: int) -> Optional[bytes]:
+        """Verpackter Datenschlüssel einer Organisation"""
+        return self._fetchval(
+            "SELECT wrapped_key FROM organization_keys WHERE organization_id = ?", organization_id
+        )
+    
+    def create_organization_key(self, organization_id: int, wrapped_key: bytes) -> bytes:
+        """Speichert einen verpackten Schlüssel, falls noch keiner existiert, und liefert den gültigen"""
+        self._execute(
+            "INSERT INTO organization_keys (organization_id, wrapped_key) VALUES (?, ?) ON CONFLICT DO NOTHING",
+            organization_id, wrapped_key
+        )
+        return self.get_organization_key(organization_id)
+    
+    def get_cached_extraction(self, content_hash: str, processor: str) -> Optional[str]:
+        """Extrahierter Text einer Datei mit diesem Inhalt, falls schon einmal verarbeitet"""
+        return self._fetchval(
+            "SELECT result FROM extraction_cache WHERE content_hash = ? AND processor = ?", content_hash, processor
+        )
+    
+    def save_cached_extraction(self, content_hash: str, processor: str, result: str):
+        self._execute(
+            "INSERT INTO extraction_cache (content_hash, processor, result) VALUES (?, ?, ?) ON CONFLICT DO NOTHING",
+            content_hash, processor, result
+        )
+    
+    def save_pdf_pages(self, content_hash: str, processor: str, pages: List[str]):
+        self._transaction([
+            ("""
+                INSERT INTO pdf_pages (content_hash, processor, page_number, text) VALUES (?, ?, ?, ?)
+                ON CONFLICT DO NOTHING
+            """, (content_hash, processor, number, text))
+            for number, text in enumerate(pages, start=1)
+        ])
+    
+    def get_pdf_pages(self, content_hash: str, processor: str, start: int, end: int) -> List[Dict[str, Any]]:
+        return self._fetch("""
+            SELECT page_number, text FROM pdf_pages
+            WHERE content_hash = ? AND processor = ? AND page_number BETWEEN ? AND ?
+            ORDER BY page_number
+        """, content_hash, processor, start, end)
+    
+    def count_pdf_pages(self, content_hash: str, processor: str) -> int:
+        return self._fetchval(
+            "SELECT COUNT(*) FROM pdf_pages WHERE content_hash = ? AND processor = ?", content_hash, processor
+        )
+    
+    # Hochgeladene Dateien
+    def save_uploaded_file(self, file: Dict[str, Any]):
+        """Speichert die Metadaten einer hochgeladenen Datei"""
+        values = {column: file.get(column) for column in UPLOADED_FILE_COLUMNS}
+        values['user_id'] = str(values['user_id'])
+        self._execute(
+            f"INSERT INTO uploaded_files ({', '.join(values)}) VALUES ({', '.join('?' for _ in values)})",
+            *values.values()
+        )
+    
+    def get_uploaded_file(self, file_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        return self._fetchrow("SELECT * FROM uploaded_files WHERE id = ? AND user_id = ?", file_id, str(user_id))
+    
+    def get_session_uploaded_files(self, session_id: str, user_id: str) -> List[Dict[str, Any]]:
+        return self._fetch(
+            "SELECT * FROM uploaded_files WHERE user_id = ? AND session_id = ? ORDER BY created_at",
+            str(user_id), session_id
+        )
+    
+    def get_uploaded_files(self, file_ids: List[str], user_id: str,
+                           columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        if not file_ids:
+            return []
+        return self._fetch(
+            f"SELECT {uploaded_file_projection(columns)} FROM uploaded_files WHERE user_id = ? AND id = ANY(?)",
+            str(user_id), list(file_ids)
+        )
+    
+    def link_uploaded_files(self, file_ids: List[str], user_id: str, session_id: str) -> int:
+        if not file_ids:
+            return 0
+        return self._execute("""
+            UPDATE uploaded_files SET session_id = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE user_id = ? AND id = ANY(?)
+        """, session_id, str(user_id), list(file_ids))
+    
+    def update_uploaded_file(self, file_id: str, user_id: str, values: Dict[str, Any]) -> bool:
+        columns = [column for column in values if column in UPLOADED_FILE_UPDATABLE]
+        if not columns:
+            return False
+        assignments = ", ".join(f"{column} = ?" for column in columns)
+        return self._execute(
+            f"UPDATE uploaded_files SET {assignments}, updated_at = CURRENT_TIMESTAMP WHERE id = ? AND user_id = ?",
+            *(values[column] for column in columns), file_id, str(user_id)
+        ) > 0
+    
+    def delete_uploaded_file(self, file_id: str, user_id: str) -> bool:
+        return self._execute("DELETE FROM uploaded_files WHERE id = ? AND user_id = ?", file_id, str(user_id)) > 0
+    
+    def find_uploaded_content(self, content_hash: str) -> Optional[str]:
+        return self._fetchval("SELECT storage_path FROM uploaded_files WHERE content_hash = ? LIMIT 1", content_hash)
+    
+    # Textkompression: PostgreSQL komprimiert große Werte selbst (TOAST), codec_flags bleibt 0
+    def train_compression_dictionary(self, sample_limit: int = 500) -> Optional[int]:
+        return None
+    
+    def recompress_text_columns(self, batch_size: int = 200) -> Dict[str, int]:
+        return {}
+    
+    # Wartung: VACUUM/ANALYZE übernimmt der Autovacuum-Daemon des Servers
+    def run_maintenance(self, task: str, page_budget: int = 1000) -> Dict[str, Any]:
+        return {'skipped': 'autovacuum'}
@@ -0,0 +1,690 @@
+"""
+Database Sharding Module für Praivio
+Verteilt Mandantendaten nach organization_id auf eigene SQLite-Shards mit globalem Katalog
+"""
+
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Iterator, Callable
+
+from database import BaseDatabaseManager, DatabaseManager, encode_cursor
+from text_codec import TextCodec
+
+logger = logging.getLogger(__name__)
+
+# Name des Shards, der im Katalog selbst liegt (Bestandsdaten und nicht zugeordnete Benutzer)
+MAIN_SHARD = "main"
+
+_SHARD_NAME = re.compile(r"^[a-z0-9_-]{1,64}$")
+
+# Routing-Tabellen des Katalogs
+CATALOG_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS tenant_shards (
+        organization_id INTEGER PRIMARY KEY,
+        shard TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'active',  -- 'active', 'moving'
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS tenant_members (
+        user_id TEXT PRIMARY KEY,
+        organization_id INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS chat_session_routes (
+        session_id TEXT PRIMARY KEY,
+        user_id TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_moves (
+        user_id TEXT PRIMARY KEY,
+        started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_tenant_members_org ON tenant_members (organization_id)"
+]
+
+class TenantUnavailableError(RuntimeError):
+    """Mandant oder Benutzer wird gerade auf einen anderen Shard verschoben"""
+
+def _merge_pages(pages: List[Dict[str, Any]], sort_key: str, id_key: str, limit: int) -> Dict[str, Any]:
+    """Führt absteigend sortierte Keyset-Seiten mehrerer Shards zu einer Seite zusammen"""
+    rows = sorted(
+        (row for page in pages for row in page['items']),
+        key=lambda row: (row[sort_key], row[id_key]),
+        reverse=True
+    )
+    has_more = len(rows) > limit or any(page['next_cursor'] for page in pages)
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1][sort_key], rows[-1][id_key]) if has_more and rows else None
+    return {'items': rows, 'next_cursor': next_cursor}
+
+class ShardedDatabaseManager(BaseDatabaseManager):
+    """Routet Mandantendaten (Generierungen, Chats) nach Organisation auf SQLite-Shards
+    
+    Benutzer, Rollen, Organisationen, Sessions und Audit-Logs bleiben im globalen Katalog.
+    Audit-Logs werden ohnehin gepuffert als Gruppen-Commit geschrieben und zentral archiviert.
+    Organisationen ohne Zuordnung liegen im Shard 'main', also in der Katalog-Datei selbst.
+    """
+    
+    dialect = "sqlite"
+    
+    def __init__(self, catalog_path: str = "./data/app.db", shard_dir: str = "./data/shards",
+                 route_cache_ttl: float = 5.0,
+                 codec: Optional[TextCodec] = None, group_commit: bool = False):
+        super().__init__()
+        self.shard_dir = Path(shard_dir)
+        self.shard_dir.mkdir(parents=True, exist_ok=True)
+        self.route_cache_ttl = route_cache_ttl
+        self.codec = codec
+        self.group_commit = group_commit
+        
+        self.catalog = DatabaseManager(catalog_path, codec=codec, group_commit=group_commit)
+        with self.catalog.get_connection() as conn:
+            for statement in CATALOG_SCHEMA:
+                conn.execute(statement)
+            conn.commit()
+        
+        self._lock = threading.Lock()
+        self._shards: Dict[str, DatabaseManager] = {MAIN_SHARD: self.catalog}
+        self._route_cache: Dict[Any, tuple] = {}
+        self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="shard-query")
+        
+        self.catalog.add_write_listener(self.notify_write)
+        for shard in self.list_shards():
+            self._get_shard(shard)
+    
+    # Shards und Routing
+    def _get_shard(self, name: str) -> DatabaseManager:
+        """Öffnet einen Shard (legt die Datei bei Bedarf an)"""
+        with self._lock:
+            shard = self._shards.get(name)
+            if shard is not None:
+                return shard
+        if not _SHARD_NAME.match(name):
+            raise ValueError(f"Ungültiger Shard-Name: {name}")
+        
+        shard = DatabaseManager(str(self.shard_dir / f"{name}.db"), codec=self.codec, group_commit=self.group_commit)
+        with self._lock:
+            if name in self._shards:
+                shard.close()
+                return self._shards[name]
+            shard.add_write_listener(self.notify_write)
+            shard.set_field_encryptor(self.encryptor)
+            self._shards[name] = shard
+        logger.info(f"Opened database shard {name}")
+        return shard
+    
+    def set_field_encryptor(self, encryptor):
+        """Gilt für alle Shards; die Datenschlüssel liegen im Katalog"""
+        with self._lock:
+            self.encryptor = encryptor
+            for shard in self._shards.values():
+                shard.set_field_encryptor(encryptor)
+    
+    def list_shards(self) -> List[str]:
+        """Alle bekannten Shards (Dateien im Shard-Verzeichnis und zugeordnete Shards)"""
+        with self.catalog.get_connection() as conn:
+            assigned = {row['shard'] for row in conn.execute("SELECT DISTINCT shard FROM tenant_shards")}
+        on_disk = {path.stem for path in self.shard_dir.glob("*.db")}
+        return sorted(assigned | on_disk | {MAIN_SHARD})
+    
+    def _cached(self, key: Any, load: Callable[[], Any]) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._route_cache.get(key)
+            if entry and entry[1] > now:
+                return entry[0]
+        value = load()
+        with self._lock:
+            if len(self._route_cache) > 10000:
+                self._route_cache = {k: v for k, v in self._route_cache.items() if v[1] > now}
+            self._route_cache[key] = (value, now + self.route_cache_ttl)
+        return value
+    
+    def _invalidate_routes(self):
+        with self._lock:
+            self._route_cache.clear()
+    
+    def _load_tenant_route(self, organization_id: Optional[int]) -> tuple:
+        if organization_id is None:
+            return MAIN_SHARD, 'active'
+        with self.catalog.get_connection() as conn:
+            row = conn.execute(
+                "SELECT shard, status FROM tenant_shards WHERE organization_id = ?", (organization_id,)
+            ).fetchone()
+        return (row['shard'], row['status']) if row else (MAIN_SHARD, 'active')
+    
+    def _load_member(self, user_id: str) -> tuple:
+        """(Organisation, wird verschoben) eines Benutzers laut Katalog"""
+        with self.catalog.get_connection() as conn:
+            row = conn.execute("""
+                SELECT (SELECT organization_id FROM tenant_members WHERE user_id = ?) AS organization_id,
+                       EXISTS (SELECT 1 FROM user_moves WHERE user_id = ?) AS moving
+            """, (user_id, user_id)).fetchone()
+        return row['organization_id'], bool(row['moving'])
+    
+    def get_user_organization(self, user_id: Any) -> Optional[int]:
+        """Organisation eines Benutzers laut Katalog (None = nicht zugeordnet)"""
+        return self._cached(('member', str(user_id)), lambda: self._load_member(str(user_id)))[0]
+    
+    def _shard_for_org(self, organization_id: Optional[int], for_write: bool = False) -> DatabaseManager:
+        shard, status = self._cached(('tenant', organization_id), lambda: self._load_tenant_route(organization_id))
+        if for_write and status == 'moving':
+            # Nicht warten: der Aufrufer blockiert sonst seinen Worker für alle Mandanten (503 mit Retry-After)
+            shard, status = self._load_tenant_route(organization_id)
+            if status == 'moving':
+                raise TenantUnavailableError(f"Organisation {organization_id} wird gerade verschoben")
+        return self._get_shard(shard)
+    
+    def _shard_for_user(self, user_id: Any, for_write: bool = False) -> DatabaseManager:
+        organization_id, moving = self._cached(('member', str(user_id)), lambda: self._load_member(str(user_id)))
+        if for_write and moving:
+            # Stand aus dem Cache: der Umzug kann bereits abgeschlossen sein (dann gilt die neue Organisation)
+            organization_id, moving = self._load_member(str(user_id))
+            if moving:
+                raise TenantUnavailableError(f"Benutzer {user_id} wird gerade verschoben")
+        return self._shard_for_org(organization_id, for_write)
+    
+    def _shard_for_chat_session(self, session_id: str, for_write: bool = False) -> DatabaseManager:
+        def load():
+            with self.catalog.get_connection() as conn:
+                row = conn.execute(
+                    "SELECT user_id FROM chat_session_routes WHERE session_id = ?", (session_id,)
+                ).fetchone()
+            return row['user_id'] if row else None
+        user_id = self._cached(('chat', session_id), load)
+        # Sessions aus der Zeit vor dem Sharding liegen im Katalog
+        if user_id is None:
+            return self._shard_for_org(None, for_write)
+        return self._shard_for_user(user_id, for_write)
+    
+    def _fan_out(self, func: Callable[[DatabaseManager], Any]) -> List[Any]:
+        """Führt eine Abfrage parallel auf allen Shards aus"""
+        shards = [self._get_shard(name) for name in self.list_shards()]
+        return list(self._executor.map(func, shards))
+    
+    def ping(self) -> bool:
+        """Prüft Katalog und alle geöffneten Shards"""
+        with self._lock:
+            shards = list(self._shards.values())
+        return all(shard.ping() for shard in shards)
+    
+    def close(self):
+        self._executor.shutdown(wait=False)
+        with self._lock:
+            shards = list(self._shards.values())
+        for shard in shards:
+            shard.close()
+    
+    def get_write_metrics(self) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            shards = dict(self._shards)
+        return {name: shard.get_write_metrics() for name, shard in shards.items()}
+    
+    # Benutzer und Sessions (Katalog)
+    def create_user(self, username: str, email: str, password_hash: str,
+                    password_salt: str, role_id: int, organization_id: int) -> int:
+        """Erstellt einen neuen Benutzer und ordnet ihn seiner Organisation zu"""
+        user_id = self.catalog.create_user(username, email, password_hash, password_salt, role_id, organization_id)
+        with self.catalog.get_connection() as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO tenant_members (user_id, organization_id) VALUES (?, ?)
+            """, (str(user_id), organization_id))
+            conn.commit()
+        return user_id
+    
+    def get_user_by_username(self, username: str) -> Optional[Dict[str, Any]]:
+        return self.catalog.get_user_by_username(username)
+    
+    def get_user_by_id(self, user_id: int) -> Optional[Dict[str, Any]]:
+        return self.catalog.get_user_by_id(user_id)
+    
+    def update_user_last_login(self, user_id: int):
+        self.catalog.update_user_last_login(user_id)
+    
+    def create_session(self, user_id: int, session_token: str, expires_at, ip_address: str, user_agent: str) -> int:
+        return self.catalog.create_session(user_id, session_token, expires_at, ip_address, user_agent)
+    
+    def get_valid_session(self, session_token: str) -> Optional[Dict[str, Any]]:
+        return self.catalog.get_valid_session(session_token)
+    
+    def invalidate_session(self, session_token: str):
+        self.catalog.invalidate_session(session_token)
+    
+    def cleanup_expired_sessions(self):
+        self.catalog.cleanup_expired_sessions()
+    
+    # Audit-Logs und Audit-Archiv (Katalog)
+    def log_audit_event(self, user_id: Optional[int], action: str, details: str,
+                        ip_address: str, user_agent: str, success: bool = True,
+                        error_message: Optional[str] = None):
+        self.catalog.log_audit_event(user_id, action, details, ip_address, user_agent, success, error_message)
+    
+    def insert_audit_logs(self, rows: List[tuple], synchronous: str = "NORMAL"):
+        self.catalog.insert_audit_logs(rows, synchronous)
+    
+    def get_audit_logs_page(self, user_id: Optional[int] = None, limit: int = 100,
+                            cursor: Optional[str] = None, action: Optional[str] = None,
+                            success: Optional[bool] = None, start: Optional[str] = None,
+                            end: Optional[str] = None) -> Dict[str, Any]:
+        return self.catalog.get_audit_logs_page(user_id, limit, cursor, action, success, start, end)
+    
+    def get_audit_periods_before(self, cutoff: str) -> List[str]:
+        return self.catalog.get_audit_periods_before(cutoff)
+    
+    def next_audit_partition_segment(self, period: str) -> int:
+        return self.catalog.next_audit_partition_segment(period)
+    
+    def iter_audit_logs_range(self, start: str, end: str, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        return self.catalog.iter_audit_logs_range(start, end, batch_size)
+    
+    def seal_audit_partition(self, partition: Dict[str, Any], start: str, end: str):
+        self.catalog.seal_audit_partition(partition, start, end)
+    
+    def get_audit_partitions(self) -> List[Dict[str, Any]]:
+        return self.catalog.get_audit_partitions()
+    
+    def set_audit_partition_status(self, partition_id: int, status: str):
+        self.catalog.set_audit_partition_status(partition_id, status)
+    
+    def count_failed_generations(self, user_id: Optional[int] = None, days: int = 30) -> int:
+        return self.catalog.count_failed_generations(user_id, days)
+    
+    # Text-Generierungen und Statistiken (Shards)
+    def save_text_generation(self, user_id: int, prompt: str, generated_text: str,
+                             model_used: str, tokens_used: int, processing_time: float,
+                             template_used: Optional[str] = None, context: Optional[str] = None,
+                             is_encrypted: bool = False, uid: Optional[str] = None,
+                             created_at: Optional[str] = None) -> int:
+        return self._shard_for_user(user_id, for_write=True).save_text_generation(
+            user_id, prompt, generated_text, model_used, tokens_used, processing_time,
+            template_used, context, is_encrypted, uid, created_at
+        )
+    
+    def get_generations_page(self, user_id: Optional[int] = None, limit: int = 50, cursor: Optional[str] = None,
+                             model: Optional[str] = None, start: Optional[str] = None,
+                             end: Optional[str] = None) -> Dict[str, Any]:
+        """Seite Text-Generierungen; ohne user_id über alle Shards zusammengeführt"""
+        if user_id:
+            return self._shard_for_user(user_id).get_generations_page(user_id, limit, cursor, model, start, end)
+        pages = self._fan_out(lambda shard: shard.get_generations_page(None, limit, cursor, model, start, end))
+        return _merge_pages(pages, 'created_at', 'id', limit)
+    
+    def get_statistics(self, user_id: Optional[int] = None) -> Dict[str, Any]:
+        """Statistiken eines Benutzers (ein Shard) oder systemweit (Aggregation über alle Shards)"""
+        if user_id:
+            stats = self._shard_for_user(user_id).get_statistics(user_id)
+            shard_stats = [stats]
+        else:
+            shard_stats = self._fan_out(lambda shard: shard.get_statistics())
+            stats = self._aggregate_statistics(shard_stats)
+        
+        # Benutzer und Audit-Logs liegen im Katalog
+        with self.catalog.get_connection() as conn:
+            stats['active_users'] = conn.execute("SELECT COUNT(*) FROM users WHERE is_active = 1").fetchone()[0]
+            stats['audit_events_today'] = conn.execute("""
+                SELECT COUNT(*) FROM audit_logs
+                WHERE created_at >= DATE('now') AND created_at < DATE('now', '+1 day')
+            """).fetchone()[0]
+        
+        failed_generations = self.count_failed_generations(user_id)
+        total_attempts = stats['total_generations'] + failed_generations
+        stats['success_rate'] = (
+            round((stats['total_generations'] / total_attempts) * 100, 1) if total_attempts > 0 else 100.0
+        )
+        return stats
+    
+    def _aggregate_statistics(self, shard_stats: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Summiert die Statistiken mehrerer Shards"""
+        total_generations = sum(s['total_generations'] for s in shard_stats)
+        weighted_time = sum(s['average_processing_time'] * s['total_generations'] for s in shard_stats)
+        
+        usage_trend: Dict[str, int] = {}
+        models: Dict[str, Dict[str, Any]] = {}
+        templates: Dict[str, int] = {}
+        for s in shard_stats:
+            for point in s['usage_trend']:
+                usage_trend[point['date']] = usage_trend.get(point['date'], 0) + point['count']
+            for usage in s['model_usage']:
+                model = models.setdefault(usage['model'], {'model': usage['model'], 'count': 0, 'total_tokens': 0, 'time': 0.0})
+                model['count'] += usage['count']
+                model['total_tokens'] += usage['total_tokens']
+                model['time'] += usage['avg_time'] * usage['count']
+            for usage in s['template_usage']:
+                templates[usage['template']] = templates.get(usage['template'], 0) + usage['count']
+        
+        return {
+            'total_generations': total_generations,
+            'total_tokens_used': sum(s['total_tokens_used'] for s in shard_stats),
+            'average_processing_time': round(weighted_time / total_generations, 2) if total_generations else 0.0,
+            'usage_trend': [{'date': day, 'count': count} for day, count in sorted(usage_trend.items())],
+            'model_usage': [
+                {
+                    'model': model['model'],
+                    'count': model['count'],
+                    'total_tokens': model['total_tokens'],
+                    'avg_time': round(model['time'] / model['count'], 2) if model['count'] else 0.0
+                }
+                for model in sorted(models.values(), key=lambda m: m['count'], reverse=True)
+            ],
+            'template_usage': [
+                {'template': template, 'count': count}
+                for template, count in sorted(templates.items(), key=lambda item: item[1], reverse=True)[:5]
+            ],
+            'generations_today': sum(s['generations_today'] for s in shard_stats)
+        }
+    
+    # Chat (Shards)
+    def create_chat_session(self, session_id: str, user_id: str, title: str, model: str,
+                            system_prompt: str = None) -> str:
+        shard = self._shard_for_user(user_id, for_write=True)
+        with self.catalog.get_connection() as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO chat_session_routes (session_id, user_id) VALUES (?, ?)
+            """, (session_id, str(user_id)))
+            conn.commit()
+        return shard.create_chat_session(session_id, user_id, title, model, system_prompt)
+    
+    def get_chat_sessions_page(self, user_id: str, limit: int = 50, cursor: Optional[str] = None,
+                               model: Optional[str] = None, start: Optional[str] = None,
+                               end: Optional[str] = None) -> Dict[str, Any]:
+        return self._shard_for_user(user_id).get_chat_sessions_page(user_id, limit, cursor, model, start, end)
+    
+    def get_chat_session(self, session_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        return self._shard_for_user(user_id).get_chat_session(session_id, user_id)
+    
+    def update_chat_session_title(self, session_id: str, user_id: str, title: str):
+        self._shard_for_user(user_id, for_write=True).update_chat_session_title(session_id, user_id, title)
+    
+    def update_chat_session(self, session_id: str, user_id: str, title: str,
+                            system_prompt: Optional[str] = None) -> bool:
+        return self._shard_for_user(user_id, for_write=True).update_chat_session(
+            session_id, user_id, title, system_prompt
+        )
+    
+    def delete_chat_session(self, session_id: str, user_id: str) -> bool:
+        deleted = self._shard_for_user(user_id, for_write=True).delete_chat_session(session_id, user_id)
+        if deleted:
+            with self.catalog.get_connection() as conn:
+                conn.execute("DELETE FROM chat_session_routes WHERE session_id = ?", (session_id,))
+                conn.commit()
+        return deleted
+    
+    def add_chat_message(self, message_id: str, chat_session_id: str, role: str,
+                         content: str, generation_id: Optional[str] = None) -> str:
+        return self._shard_for_chat_session(chat_session_id, for_write=True).add_chat_message(
+            message_id, chat_session_id, role, content, generation_id
+        )
+    
+    def delete_chat_message(self, message_id: str, chat_session_id: str) -> bool:
+        return self._shard_for_chat_session(chat_session_id, for_write=True).delete_chat_message(
+            message_id, chat_session_id
+        )
+    
+    def get_chat_messages(self, chat_session_id: str, limit: int = 100) -> List[Dict[str, Any]]:
+        return self._shard_for_chat_session(chat_session_id).get_chat_messages(chat_session_id, limit)
+    
+    def get_chat_session_with_messages(self, session_id: str, user_id: str, limit: int = 50,
+                                       before: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        return self._shard_for_user(user_id).get_chat_session_with_messages(session_id, user_id, limit, before)
+    
+    # Datenschlüssel (global im Katalog)
+    def get_organization_key(self, organization_id: int) -> Optional[bytes]:
+        return self.catalog.get_organization_key(organization_id)
+    
+    def create_organization_key(self, organization_id: int, wrapped_key: bytes) -> bytes:
+        return self.catalog.create_organization_key(organization_id, wrapped_key)
+    
+    # Extraktions-Cache: mandantenübergreifend im Katalog (Schlüssel ist der Dateiinhalt)
+    def get_cached_extraction(self, content_hash: str, processor: str) -> Optional[str]:
+        return self.catalog.get_cached_extraction(content_hash, processor)
+    
+    def save_cached_extraction(self, content_hash: str, processor: str, result: str):
+        self.catalog.save_cached_extraction(content_hash, processor, result)
+    
+    def save_pdf_pages(self, content_hash: str, processor: str, pages: List[str]):
+        self.catalog.save_pdf_pages(content_hash, processor, pages)
+    
+    def get_pdf_pages(self, content_hash: str, processor: str, start: int, end: int) -> List[Dict[str, Any]]:
+        return self.catalog.get_pdf_pages(content_hash, processor, start, end)
+    
+    def count_pdf_pages(self, content_hash: str, processor: str) -> int:
+        return self.catalog.count_pdf_pages(content_hash, processor)
+    
+    # Hochgeladene Dateien liegen wie die Chats im Shard der Organisation
+    def save_uploaded_file(self, file: Dict[str, Any]):
+        self._shard_for_user(file['user_id'], for_write=True).save_uploaded_file(file)
+    
+    def get_uploaded_file(self, file_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        return self._shard_for_user(user_id).get_uploaded_file(file_id, user_id)
+    
+    def get_session_uploaded_files(self, session_id: str, user_id: str) -> List[Dict[str, Any]]:
+        return self._shard_for_user(user_id).get_session_uploaded_files(session_id, user_id)
+    
+    def get_uploaded_files(self, file_ids: List[str], user_id: str,
+                           columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        return self._shard_for_user(user_id).get_uploaded_files(file_ids, user_id, columns)
+    
+    def link_uploaded_files(self, file_ids: List[str], user_id: str, session_id: str) -> int:
+        return self._shard_for_user(user_id, for_write=True).link_uploaded_files(file_ids, user_id, session_id)
+    
+    def update_uploaded_file(self, file_id: str, user_id: str, values: Dict[str, Any]) -> bool:
+        return self._shard_for_user(user_id, for_write=True).update_uploaded_file(file_id, user_id, values)
+    
+    def delete_uploaded_file(self, file_id: str, user_id: str) -> bool:
+        return self._shard_for_user(user_id, for_write=True).delete_uploaded_file(file_id, user_id)
+    
+    def find_uploaded_content(self, content_hash: str) -> Optional[str]:
+        """Die Inhalte liegen für alle Organisationen in einer Ablage"""
+        return next((path for path in self._fan_out(
+            lambda shard: shard.find_uploaded_content(content_hash)
+        ) if path), None)
+    
+    # Textkompression: Wörterbücher werden pro Shard trainiert
+    def train_compression_dictionary(self, sample_limit: int = 500) -> Optional[int]:
+        trained = [dict_id for dict_id in self._fan_out(
+            lambda shard: shard.train_compression_dictionary(sample_limit)
+        ) if dict_id]
+        return trained[0] if trained else None
+    
+    def recompress_text_columns(self, batch_size: int = 200) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for shard_counts in self._fan_out(lambda shard: shard.recompress_text_columns(batch_size)):
+            for table, count in shard_counts.items():
+                counts[table] = counts.get(table, 0) + count
+        return counts
+    
+    # Wartung: Shards nacheinander, damit das I/O-Budget nicht mit der Shard-Anzahl wächst
+    def run_maintenance(self, task: str, page_budget: int = 1000) -> Dict[str, Any]:
+        return {name: self._get_shard(name).run_maintenance(task, page_budget) for name in self.list_shards()}
+    
+    def get_backup_sources(self) -> Dict[str, str]:
+        """Katalog (Shard 'main') und alle Shard-Dateien"""
+        return {name: self._get_shard(name).db_path for name in self.list_shards()}
+    
+    # Mandantenverwaltung
+    def get_tenants(self) -> List[Dict[str, Any]]:
+        """Organisationen mit Shard, Status und Anzahl zugeordneter Benutzer"""
+        with self.catalog.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT o.id AS organization_id, o.name,
+                       COALESCE(ts.shard, ?) AS shard, COALESCE(ts.status, 'active') AS status,
+                       (SELECT COUNT(*) FROM tenant_members tm WHERE tm.organization_id = o.id) AS members
+                FROM organizations o
+                LEFT JOIN tenant_shards ts ON ts.organization_id = o.id
+                ORDER BY o.id
+            """, (MAIN_SHARD,))
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def _set_tenant_route(self, organization_id: int, shard: str, status: str):
+        with self.catalog.get_connection() as conn:
+            conn.execute("""
+                INSERT INTO tenant_shards (organization_id, shard, status, updated_at)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT (organization_id) DO UPDATE SET
+                    shard = excluded.shard, status = excluded.status, updated_at = CURRENT_TIMESTAMP
+            """, (organization_id, shard, status))
+            conn.commit()
+        self._invalidate_routes()
+    
+    def _organization_members(self, organization_id: int) -> List[str]:
+        with self.catalog.get_connection() as conn:
+            rows = conn.execute(
+                "SELECT user_id FROM tenant_members WHERE organization_id = ?", (organization_id,)
+            ).fetchall()
+        return [row['user_id'] for row in rows]
+    
+    def _route_chat_sessions(self, shard: DatabaseManager, user_ids: List[str]):
+        """Trägt Routen für Chat-Sessions ein, die noch aus der Zeit vor dem Sharding stammen"""
+        routes = []
+        with shard.get_connection() as conn:
+            for chunk in _chunks(user_ids):
+                marks = ", ".join("?" for _ in chunk)
+                routes.extend(
+                    (row['id'], str(row['user_id']))
+                    for row in conn.execute(f"SELECT id, user_id FROM chat_sessions WHERE user_id IN ({marks})", chunk)
+                )
+        with self.catalog.get_connection() as conn:
+            conn.executemany("INSERT OR IGNORE INTO chat_session_routes (session_id, user_id) VALUES (?, ?)", routes)
+            conn.commit()
+    
+    def move_tenant(self, organization_id: int, target_shard: str) -> Dict[str, Any]:
+        """Verschiebt alle Daten einer Organisation auf einen anderen Shard
+        
+        Während des Umzugs werden Schreibzugriffe der Organisation abgewiesen (Status 'moving',
+        TenantUnavailableError), Lesezugriffe gehen weiter an den alten Shard, bis das Routing
+        umgestellt ist.
+        """
+        source_name, _ = self._load_tenant_route(organization_id)
+        if source_name == target_shard:
+            return {'organization_id': organization_id, 'shard': target_shard, 'moved': False}
+        source = self._get_shard(source_name)
+        target = self._get_shard(target_shard)
+        user_ids = self._organization_members(organization_id)
+        
+        self._set_tenant_route(organization_id, source_name, 'moving')
+        # Andere Worker sehen den Status spätestens nach Ablauf ihres Routing-Caches
+        time.sleep(self.route_cache_ttl + 1)
+        try:
+            copied = _copy_user_data(source, target, user_ids)
+            self._route_chat_sessions(target, user_ids)
+        except Exception:
+            _delete_user_data(target, user_ids)
+            self._set_tenant_route(organization_id, source_name, 'active')
+            raise
+        
+        self._set_tenant_route(organization_id, target_shard, 'active')
+        _delete_user_data(source, user_ids)
+        logger.info(f"Moved organization {organization_id} from shard {source_name} to {target_shard}: {copied}")
+        return {'organization_id': organization_id, 'shard': target_shard, 'moved': True, 'rows': copied}
+    
+    def assign_user(self, user_id: str, organization_id: int) -> Dict[str, Any]:
+        """Ordnet einen Benutzer einer Organisation zu und verschiebt seine Daten bei Shard-Wechsel
+        
+        Wie bei move_tenant: während des Kopierens werden Schreibzugriffe des Benutzers abgewiesen
+        (user_moves), damit nichts mehr im alten Shard landet, das danach gelöscht würde.
+        """
+        user_id = str(user_id)
+        source = self._shard_for_user(user_id, for_write=True)
+        target = self._shard_for_org(organization_id, for_write=True)
+        copied = {}
+        if source is not target:
+            self._set_user_moving(user_id, True)
+            # Andere Worker sehen die Sperre spätestens nach Ablauf ihres Routing-Caches
+            time.sleep(self.route_cache_ttl + 1)
+            try:
+                copied = _copy_user_data(source, target, [user_id])
+                self._route_chat_sessions(target, [user_id])
+            except Exception:
+                _delete_user_data(target, [user_id])
+                self._set_user_moving(user_id, False)
+                raise
+        
+        # Zuordnung und Freigabe in einer Transaktion
+        with self.catalog.get_connection() as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO tenant_members (user_id, organization_id) VALUES (?, ?)
+            """, (user_id, organization_id))
+            conn.execute("DELETE FROM user_moves WHERE user_id = ?", (user_id,))
+            conn.commit()
+        self._invalidate_routes()
+        
+        if source is not target:
+            _delete_user_data(source, [user_id])
+        return {'user_id': user_id, 'organization_id': organization_id, 'rows': copied}
+    
+    def _set_user_moving(self, user_id: str, moving: bool):
+        with self.catalog.get_connection() as conn:
+            if moving:
+                conn.execute("INSERT OR IGNORE INTO user_moves (user_id) VALUES (?)", (user_id,))
+            else:
+                conn.execute("DELETE FROM user_moves WHERE user_id = ?", (user_id,))
+            conn.commit()
+        self._invalidate_routes()
+
+def _chunks(values: List[str], size: int = 500) -> Iterator[List[str]]:
+    for index in range(0, len(values), size):
+        yield values[index:index + size]
+
+def _copy_user_data(source: DatabaseManager, target: DatabaseManager, user_ids: List[str]) -> Dict[str, int]:
+    """Kopiert Generierungen, Chats und hochgeladene Dateien der Benutzer in einer Ziel-Transaktion"""
+    copied = {'text_generations': 0, 'chat_sessions': 0, 'chat_messages': 0, 'uploaded_files': 0}
+    with source.get_connection() as src, target.get_connection() as dst:
+        # Komprimierte Texte verweisen auf Wörterbücher der Quelle (IDs sind inhaltsbasiert)
+        for row in src.execute("SELECT * FROM compression_dictionaries"):
+            dst.execute(
+                "INSERT OR IGNORE INTO compression_dictionaries (id, algorithm, data, sample_count, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (row['id'], row['algorithm'], row['data'], row['sample_count'], row['created_at'])
+            )
+        for chunk in _chunks(user_ids):
+            marks = ", ".join("?" for _ in chunk)
+            queries = [
+                # IDs der Generierungen werden im Ziel neu vergeben
+                ('text_generations', f"SELECT * FROM text_generations WHERE user_id IN ({marks}) ORDER BY id", ('id',)),
+                ('chat_sessions', f"SELECT * FROM chat_sessions WHERE user_id IN ({marks})", ()),
+                # Einfügereihenfolge erhält die rowid-Reihenfolge der Nachrichten
+                ('chat_messages', f"""
+                    SELECT cm.* FROM chat_messages cm
+                    JOIN chat_sessions cs ON cs.id = cm.chat_session_id
+                    WHERE cs.user_id IN ({marks})
+                    ORDER BY cm.timestamp, cm.rowid
+                """, ()),
+                # Nur Metadaten; die Inhalte liegen für alle Shards in derselben Ablage
+                ('uploaded_files', f"SELECT * FROM uploaded_files WHERE user_id IN ({marks})", ())
+            ]
+            for table, sql, skip in queries:
+                for row in src.execute(sql, chunk):
+                    columns = [key for key in row.keys() if key not in skip]
+                    dst.execute(
+                        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+                        [row[key] for key in columns]
+                    )
+                    copied[table] += 1
+        dst.commit()
+    return copied
+
+def _delete_user_data(shard: DatabaseManager, user_ids: List[str]):
+    """Löscht Generierungen, Chats und hochgeladene Dateien der Benutzer aus einem Shard"""
+    with shard.get_connection() as conn:
+        for chunk in _chunks(user_ids):
+            marks = ", ".join("?" for _ in chunk)
+            conn.execute(f"""
+                DELETE FROM chat_messages WHERE chat_session_id IN (
+                    SELECT id FROM chat_sessions WHERE user_id IN ({marks})
+                )
+            """, chunk)
+            conn.execute(f"DELETE FROM chat_sessions WHERE user_id IN ({marks})", chunk)
+            conn.execute(f"DELETE FROM text_generations WHERE user_id IN ({marks})", chunk)
+            conn.execute(f"DELETE FROM uploaded_files WHERE user_id IN ({marks})", chunk)
+        conn.commit()
@@ -0,0 +1,174 @@
+"""
+Database Maintenance Module für Praivio
+Zeitgesteuerte SQLite-Wartung: PRAGMA optimize, ANALYZE, incremental_vacuum, WAL-Checkpoints, quick_check
+und die einmalige Umstellung von Bestandsdateien auf auto_vacuum = INCREMENTAL
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime, time as clock_time
+from typing import Optional, Dict, Any, Tuple
+
+from database import BaseDatabaseManager
+
+logger = logging.getLogger(__name__)
+
+# Aufgabe -> (Intervall in Sekunden, nur im Ruhefenster)
+MAINTENANCE_JOBS: Dict[str, Tuple[int, bool]] = {
+    'checkpoint': (5 * 60, False),        # PASSIVE, blockiert nie
+    'optimize': (60 * 60, False),         # PRAGMA optimize, durch analysis_limit begrenzt
+    'incremental_vacuum': (60 * 60, True),
+    'enable_auto_vacuum': (24 * 60 * 60, True),  # VACUUM der ganzen Datei, nur solange nicht umgestellt
+    'analyze': (24 * 60 * 60, True),
+    'truncate_wal': (24 * 60 * 60, True),
+    'quick_check': (7 * 24 * 60 * 60, True)
+}
+
+def parse_quiet_hours(value: str) -> Optional[Tuple[clock_time, clock_time]]:
+    """Parst ein Ruhefenster 'HH:MM-HH:MM' (darf über Mitternacht gehen), leer = keins"""
+    if not value or not value.strip():
+        return None
+    start, end = (datetime.strptime(part.strip(), "%H:%M").time() for part in value.split("-", 1))
+    return start, end
+
+def _total(result: Dict[str, Any], key: str) -> int:
+    """Summiert einen Wert über das Ergebnis einer Datei oder aller Shards"""
+    if key in result:
+        return result[key]
+    return sum(value.get(key, 0) for value in result.values() if isinstance(value, dict))
+
+def _integrity(result: Dict[str, Any]) -> str:
+    if 'ok' in result:
+        return "ok" if result['ok'] else "failed"
+    checks = [value['ok'] for value in result.values() if isinstance(value, dict) and 'ok' in value]
+    if not checks:
+        return "unknown"
+    return "ok" if all(checks) else "failed"
+
+class DatabaseMaintenance:
+    """Plant Wartungsaufgaben der SQLite-Dateien (mit Sharding: Katalog und alle Shards)
+    
+    Leichte Aufgaben laufen jederzeit, schreib- oder leseintensive nur im Ruhefenster.
+    page_budget begrenzt die I/O pro Schritt; incremental_vacuum gibt freie Seiten in
+    Schritten mit Pause zurück und hört auf, sobald das Ruhefenster endet.
+    """
+    
+    def __init__(self, db_manager: BaseDatabaseManager, quiet_hours: str = "01:00-05:00",
+                 page_budget: int = 1000, vacuum_steps: int = 50, step_pause: float = 0.5,
+                 tick_seconds: float = 60.0):
+        self.db_manager = db_manager
+        self.quiet_hours = parse_quiet_hours(quiet_hours)
+        self.page_budget = page_budget
+        self.vacuum_steps = vacuum_steps
+        self.step_pause = step_pause
+        self.tick_seconds = tick_seconds
+        
+        self._lock = threading.Lock()
+        self._run_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        self._last_run: Dict[str, float] = {}
+        self._results: Dict[str, Dict[str, Any]] = {}
+    
+    def start(self):
+        """Startet den Wartungs-Thread"""
+        if self._worker is not None:
+            return
+        self._stop_event.clear()
+        
+        def run():
+            while not self._stop_event.is_set():
+                try:
+                    self.run_due()
+                except Exception as e:
+                    logger.error(f"Database maintenance run failed: {e}")
+                self._stop_event.wait(self.tick_seconds)
+        
+        self._worker = threading.Thread(target=run, name="db-maintenance", daemon=True)
+        self._worker.start()
+    
+    def stop(self):
+        """Stoppt den Wartungs-Thread (ein laufender Vacuum-Schritt wird noch beendet)"""
+        if self._worker is None:
+            return
+        self._stop_event.set()
+        self._worker.join(30)
+        self._worker = None
+    
+    def in_quiet_hours(self, now: Optional[datetime] = None) -> bool:
+        if self.quiet_hours is None:
+            return True
+        current = (now or datetime.now()).time()
+        start, end = self.quiet_hours
+        if start <= end:
+            return start <= current < end
+        return current >= start or current < end
+    
+    def run_due(self) -> Dict[str, Dict[str, Any]]:
+        """Führt alle fälligen Aufgaben aus"""
+        now = time.monotonic()
+        quiet = self.in_quiet_hours()
+        ran = {}
+        for job, (interval, quiet_only) in MAINTENANCE_JOBS.items():
+            if self._stop_event.is_set():
+                break
+            if quiet_only and not quiet:
+                continue
+            last = self._last_run.get(job)
+            if last is not None and now - last < interval:
+                continue
+            ran[job] = self.run_job(job)
+        return ran
+    
+    def run_job(self, job: str) -> Dict[str, Any]:
+        """Führt eine Aufgabe sofort aus und speichert das Ergebnis für den Health-Check"""
+        with self._run_lock:
+            started = time.perf_counter()
+            entry: Dict[str, Any] = {'last_run_at': datetime.now().isoformat()}
+            try:
+                if job == 'incremental_vacuum':
+                    entry['result'] = self._incremental_vacuum()
+                else:
+                    entry['result'] = self.db_manager.run_maintenance(job, self.page_budget)
+                entry['error'] = None
+            except Exception as e:
+                logger.error(f"Database maintenance job {job} failed: {e}")
+                entry['result'] = None
+                entry['error'] = str(e)
+            entry['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+            
+            if job == 'quick_check' and entry['result'] is not None:
+                entry['integrity'] = _integrity(entry['result'])
+                if entry['integrity'] == "failed":
+                    logger.error(f"Database quick_check found problems: {entry['result']}")
+            self._last_run[job] = time.monotonic()
+            # Eigenes Lock: der Health-Check wartet nicht auf einen laufenden Vacuum
+            with self._lock:
+                self._results[job] = entry
+            return entry
+    
+    def _incremental_vacuum(self) -> Dict[str, Any]:
+        """Gibt freie Seiten schrittweise zurück, je Schritt höchstens page_budget Seiten"""
+        freed = steps = 0
+        result: Dict[str, Any] = {}
+        while steps < self.vacuum_steps and not self._stop_event.is_set():
+            result = self.db_manager.run_maintenance('incremental_vacuum', self.page_budget)
+            steps += 1
+            step_freed = _total(result, 'freed_pages')
+            freed += step_freed
+            if not step_freed or not _total(result, 'free_pages') or not self.in_quiet_hours():
+                break
+            self._stop_event.wait(self.step_pause)
+        return {'steps': steps, 'freed_pages': freed, 'last_step': result}
+    
+    def get_status(self) -> Dict[str, Any]:
+        """Ergebnisse der letzten Läufe für den Health-Check"""
+        with self._lock:
+            results = {job: dict(entry) for job, entry in self._results.items()}
+        check = results.get('quick_check')
+        return {
+            'integrity': check.get('integrity', "unknown") if check else "unknown",
+            'in_quiet_hours': self.in_quiet_hours(),
+            'jobs': results
+        }
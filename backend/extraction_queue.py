@@ -0,0 +1,357 @@
+"""
+Extraction Queue Module für Praivio
+Persistente Job-Queue (SQLite) für die Textextraktion hochgeladener Dateien in Worker-Prozessen
+"""
+
+import logging
+import multiprocessing
+import os
+import queue
+import socket
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Callable
+
+from file_extraction import extract_file
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUSES = ('queued', 'processing', 'done', 'failed')
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS extraction_jobs (
+        file_id TEXT PRIMARY KEY,
+        user_id TEXT NOT NULL,
+        file_type TEXT NOT NULL,
+        input_path TEXT NOT NULL,
+        content_hash TEXT,
+        status TEXT NOT NULL DEFAULT 'queued',  -- 'queued', 'processing', 'done', 'failed'
+        attempts INTEGER NOT NULL DEFAULT 0,
+        owner TEXT,
+        lease_until REAL,
+        result TEXT,
+        error TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        started_at TIMESTAMP,
+        finished_at TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_extraction_jobs_status ON extraction_jobs (status, created_at)",
+    # Zwischenergebnisse laufender Jobs (Audio-Segmente), bis zum Abschluss des Jobs
+    """
+    CREATE TABLE IF NOT EXISTS extraction_segments (
+        file_id TEXT NOT NULL,
+        segment INTEGER NOT NULL,
+        start_seconds REAL NOT NULL,
+        end_seconds REAL NOT NULL,
+        text TEXT NOT NULL,
+        PRIMARY KEY (file_id, segment)
+    )
+    """
+]
+
+def run_extraction(db_path: str, file_id: str, file_type: str, input_path: str) -> Optional[Dict[str, Any]]:
+    """Extraktion im Worker-Prozess; Zwischenergebnisse landen direkt in der Queue-Datei"""
+    def on_partial(segment: int, start: float, end: float, text: str):
+        try:
+            conn = sqlite3.connect(db_path, timeout=10)
+            try:
+                conn.execute("""
+                    INSERT OR REPLACE INTO extraction_segments (file_id, segment, start_seconds, end_seconds, text)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (file_id, segment, start, end, text))
+                conn.commit()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            # Zwischenergebnisse sind optional, die Extraktion läuft weiter
+            logger.warning(f"Could not store partial result of {file_id}: {e}")
+    
+    return extract_file(file_type, input_path, on_partial)
+
+class ExtractionQueue:
+    """Verteilt Extraktions-Jobs auf einen Pool von Worker-Prozessen
+    
+    Jobs stehen in einer eigenen SQLite-Datei und überstehen Neustarts. Ein Dispatcher-Thread
+    übernimmt Jobs mit einer Lease, die er verlängert, solange sie laufen. Stürzt ein
+    Worker-Prozess ab, wird der Pool neu erstellt und der Job erneut eingeplant (bis
+    max_attempts); stirbt der ganze Server, übernimmt nach Ablauf der Lease ein anderer.
+    """
+    
+    def __init__(self, db_path: str = "./data/extraction_jobs.db", spool_dir: str = "./data/extraction_spool",
+                 workers: int = 2, max_attempts: int = 3, lease_seconds: float = 60.0,
+                 retention_days: int = 7, on_complete: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.db_path = db_path
+        self.spool_dir = Path(spool_dir)
+        self.workers = max(1, workers)
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.retention_days = retention_days
+        self.on_complete = on_complete
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            for statement in SCHEMA:
+                conn.execute(statement)
+            # Queue-Dateien von vor dem Extraktions-Cache
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(extraction_jobs)")}
+            if 'content_hash' not in columns:
+                conn.execute("ALTER TABLE extraction_jobs ADD COLUMN content_hash TEXT")
+            conn.commit()
+        
+        self._wakeup: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._running: Dict[str, Future] = {}
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._stop_event = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        self._metrics = {
+            'completed': 0,
+            'failed': 0,
+            'retried': 0,
+            'pool_restarts': 0
+        }
+    
+    @contextmanager
+    def _connection(self):
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+    
+    # Jobs
+    def spool_path(self, file_id: str, suffix: str = "") -> Path:
+        """Ablage der Eingabedatei eines Jobs bis zur Verarbeitung"""
+        return self.spool_dir / f"{file_id}{suffix}"
+    
+    def enqueue(self, file_id: str, user_id: str, file_type: str, input_path: str,
+                content_hash: Optional[str] = None) -> Dict[str, Any]:
+        """Plant die Extraktion einer Datei ein (content_hash für den Extraktions-Cache)"""
+        with self._connection() as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO extraction_jobs (file_id, user_id, file_type, input_path, content_hash)
+                VALUES (?, ?, ?, ?, ?)
+            """, (file_id, user_id, file_type, input_path, content_hash))
+            conn.execute("DELETE FROM extraction_segments WHERE file_id = ?", (file_id,))
+            conn.commit()
+        self._wakeup.put(None)
+        return self.get_job(file_id)
+    
+    def get_job(self, file_id: str, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Status eines Jobs (mit user_id nur für den Eigentümer)"""
+        query = """
+            SELECT file_id, user_id, file_type, content_hash, status, attempts, result, error,
+                   created_at, started_at, finished_at
+            FROM extraction_jobs WHERE file_id = ?
+        """
+        params: List[Any] = [file_id]
+        if user_id is not None:
+            query += " AND user_id = ?"
+            params.append(str(user_id))
+        with self._connection() as conn:
+            row = conn.execute(query, params).fetchone()
+        return dict(row) if row else None
+    
+    def get_segments(self, file_id: str, after: int = -1) -> List[Dict[str, Any]]:
+        """Zwischenergebnisse eines laufenden Jobs nach Segment after, in Reihenfolge"""
+        with self._connection() as conn:
+            rows = conn.execute("""
+                SELECT segment, start_seconds, end_seconds, text FROM extraction_segments
+                WHERE file_id = ? AND segment > ?
+                ORDER BY segment
+            """, (file_id, after)).fetchall()
+        return [dict(row) for row in rows]
+    
+    def _claim(self, limit: int, retries: bool) -> List[Dict[str, Any]]:
+        """Übernimmt wartende Jobs und Jobs mit abgelaufener Lease (neue oder bereits versuchte)"""
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(f"""
+                SELECT file_id, user_id, file_type, input_path, attempts FROM extraction_jobs
+                WHERE (status = 'queued' OR (status = 'processing' AND lease_until < ?))
+                  AND attempts {'>' if retries else '='} 0
+                ORDER BY created_at
+                LIMIT ?
+            """, (now, limit)).fetchall()
+            for row in rows:
+                conn.execute("""
+                    UPDATE extraction_jobs
+                    SET status = 'processing', attempts = attempts + 1, owner = ?, lease_until = ?,
+                        started_at = CURRENT_TIMESTAMP
+                    WHERE file_id = ?
+                """, (self.owner, now + self.lease_seconds, row['file_id']))
+            conn.commit()
+        return [{**dict(row), 'attempts': row['attempts'] + 1} for row in rows]
+    
+    def _renew_leases(self):
+        if not self._running:
+            return
+        placeholders = ", ".join("?" for _ in self._running)
+        with self._connection() as conn:
+            conn.execute(f"""
+                UPDATE extraction_jobs SET lease_until = ?
+                WHERE owner = ? AND status = 'processing' AND file_id IN ({placeholders})
+            """, (time.time() + self.lease_seconds, self.owner, *self._running))
+            conn.commit()
+    
+    def _finish(self, job: Dict[str, Any], status: str, result: Optional[str] = None, error: Optional[str] = None,
+                pages: Optional[List[str]] = None):
+        """Schließt einen Job ab; pages (Text pro PDF-Seite) geht nur an on_complete, nicht in die Queue-Datei"""
+        with self._connection() as conn:
+            updated = conn.execute("""
+                UPDATE extraction_jobs
+                SET status = ?, result = ?, error = ?, owner = NULL, lease_until = NULL,
+                    finished_at = CURRENT_TIMESTAMP
+                WHERE file_id = ? AND owner = ?
+            """, (status, result, error, job['file_id'], self.owner)).rowcount
+            if updated:
+                # Das Endergebnis steht jetzt im Job
+                conn.execute("DELETE FROM extraction_segments WHERE file_id = ?", (job['file_id'],))
+            conn.commit()
+        if not updated:
+            # Lease abgelaufen, ein anderer Dispatcher hat den Job übernommen
+            return
+        Path(job['input_path']).unlink(missing_ok=True)
+        self._metrics['completed' if status == 'done' else 'failed'] += 1
+        if self.on_complete is not None:
+            try:
+                self.on_complete({**self.get_job(job['file_id']), 'pages': pages})
+            except Exception as e:
+                logger.error(f"Extraction completion handler failed for {job['file_id']}: {e}")
+    
+    def _retry(self, job: Dict[str, Any], error: str):
+        """Job nach einem Worker-Absturz erneut einplanen oder endgültig als fehlgeschlagen markieren"""
+        if job['attempts'] >= self.max_attempts:
+            logger.error(f"Extraction of {job['file_id']} failed after {job['attempts']} attempts: {error}")
+            self._finish(job, 'failed', error=error)
+            return
+        with self._connection() as conn:
+            conn.execute("""
+                UPDATE extraction_jobs SET status = 'queued', error = ?, owner = NULL, lease_until = NULL
+                WHERE file_id = ? AND owner = ?
+            """, (error, job['file_id'], self.owner))
+            conn.commit()
+        self._metrics['retried'] += 1
+    
+    def _prune(self):
+        """Entfernt abgeschlossene Jobs nach retention_days (der Inhalt steht dann in uploaded_files)"""
+        with self._connection() as conn:
+            conn.execute("""
+                DELETE FROM extraction_jobs
+                WHERE status IN ('done', 'failed') AND finished_at < datetime('now', ?)
+            """, (f"-{int(self.retention_days)} days",))
+            conn.commit()
+    
+    # Dispatcher
+    def start(self):
+        """Startet Worker-Pool und Dispatcher"""
+        if self._worker is not None:
+            return
+        self._stop_event.clear()
+        self._worker = threading.Thread(target=self._dispatch, name="extraction-dispatcher", daemon=True)
+        self._worker.start()
+    
+    def stop(self):
+        """Stoppt den Dispatcher; laufende Jobs übernimmt nach Ablauf der Lease der nächste Start"""
+        if self._worker is None:
+            return
+        self._stop_event.set()
+        self._wakeup.put(None)
+        self._worker.join(30)
+        self._worker = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+    
+    def _new_pool(self) -> ProcessPoolExecutor:
+        # spawn: Worker importieren nur file_extraction, nicht den ganzen Server samt Threads
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+    
+    def _restart_pool(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = self._new_pool()
+        self._metrics['pool_restarts'] += 1
+    
+    def _submit(self, job: Dict[str, Any]) -> Future:
+        return self._pool.submit(run_extraction, self.db_path, job['file_id'], job['file_type'], job['input_path'])
+    
+    def _dispatch(self):
+        self._pool = self._new_pool()
+        jobs: Dict[str, Dict[str, Any]] = {}
+        last_renewal = time.monotonic()
+        last_prune = 0.0
+        while not self._stop_event.is_set():
+            try:
+                # Wiederholungen laufen allein: ein Absturz ist dann eindeutig diesem Job zuzuordnen,
+                # und Jobs, die nur zufällig gleichzeitig liefen, verbrauchen keine weiteren Versuche
+                claimed = []
+                if not self._running:
+                    claimed = self._claim(1, retries=True)
+                if not claimed and not any(job['attempts'] > 1 for job in jobs.values()):
+                    claimed = self._claim(self.workers - len(self._running), retries=False)
+                for job in claimed:
+                    jobs[job['file_id']] = job
+                    try:
+                        future = self._submit(job)
+                    except BrokenProcessPool:
+                        # Absturz wurde noch nicht über ein Future gemeldet
+                        self._restart_pool()
+                        future = self._submit(job)
+                    self._running[job['file_id']] = future
+                    future.add_done_callback(lambda _, file_id=job['file_id']: self._wakeup.put((file_id,)))
+                
+                if time.monotonic() - last_renewal > self.lease_seconds / 3:
+                    self._renew_leases()
+                    last_renewal = time.monotonic()
+                if time.monotonic() - last_prune > 3600:
+                    self._prune()
+                    last_prune = time.monotonic()
+                
+                try:
+                    self._wakeup.get(timeout=1.0)
+                except queue.Empty:
+                    pass
+                
+                broken = False
+                for file_id, future in list(self._running.items()):
+                    if not future.done():
+                        continue
+                    del self._running[file_id]
+                    job = jobs.pop(file_id)
+                    try:
+                        output = future.result() or {'text': None, 'pages': None}
+                        self._finish(job, 'done', result=output['text'], pages=output['pages'])
+                    except BrokenProcessPool as e:
+                        broken = True
+                        logger.warning(f"Extraction worker crashed while processing {file_id}")
+                        self._retry(job, f"Worker-Prozess abgestürzt: {e}")
+                    except Exception as e:
+                        self._retry(job, str(e))
+                
+                if broken:
+                    self._restart_pool()
+            except Exception as e:
+                logger.error(f"Extraction dispatcher error: {e}")
+                self._stop_event.wait(1.0)
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._connection() as conn:
+            counts = {row['status']: row['count'] for row in conn.execute(
+                "SELECT status, COUNT(*) AS count FROM extraction_jobs GROUP BY status"
+            )}
+        return {
+            **self._metrics,
+            'running': len(self._running),
+            'jobs': {status: counts.get(status, 0) for status in JOB_STATUSES}
+        }
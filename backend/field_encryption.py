@@ -0,0 +1,168 @@
+"""
+Field Encryption Module für Praivio
+Envelope-Verschlüsselung einzelner Spalten: AES-GCM mit Datenschlüssel pro Organisation,
+der mit dem Master-Key verpackt gespeichert und entpackt mit TTL im Speicher gehalten wird
+"""
+
+import base64
+import logging
+import os
+import threading
+import time
+from typing import Optional, List, Dict, Any, Iterable
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+logger = logging.getLogger(__name__)
+
+# Format-Byte | Organisation (4 Byte) | Nonce (12 Byte) | Chiffretext + Tag
+FORMAT_V1 = 1
+NONCE_SIZE = 12
+HEADER_SIZE = 1 + 4 + NONCE_SIZE
+
+# Schlüssel für Benutzer ohne Organisationszuordnung
+UNASSIGNED_ORGANIZATION = 0
+
+class FieldDecryptionError(ValueError):
+    """Chiffretext ist beschädigt oder gehört nicht zu dieser Zeile/Spalte"""
+
+def load_master_key(encoded_key: Optional[str], secret_key: str) -> bytes:
+    """Master-Key aus FIELD_ENCRYPTION_KEY (Base64, 32 Byte), sonst per HKDF aus SECRET_KEY abgeleitet"""
+    if encoded_key:
+        key = base64.b64decode(encoded_key)
+        if len(key) != 32:
+            raise ValueError("FIELD_ENCRYPTION_KEY muss 32 Byte (Base64-kodiert) lang sein")
+        return key
+    logger.warning("FIELD_ENCRYPTION_KEY not set, deriving master key from SECRET_KEY")
+    return HKDF(
+        algorithm=hashes.SHA256(), length=32, salt=None, info=b"praivio field encryption master key"
+    ).derive(secret_key.encode())
+
+class DataKeyCache:
+    """Entpackte Datenschlüssel pro Organisation, im Speicher mit TTL gehalten
+    
+    Die verpackten Schlüssel liegen in organization_keys (bei Sharding im Katalog).
+    """
+    
+    def __init__(self, key_store, master_key: bytes, ttl: float = 300.0):
+        self.key_store = key_store
+        self.ttl = ttl
+        self._master = AESGCM(master_key)
+        self._lock = threading.Lock()
+        self._keys: Dict[int, tuple] = {}
+        self._hits = 0
+        self._misses = 0
+        self._created = 0
+    
+    def _wrap(self, organization_id: int, data_key: bytes) -> bytes:
+        nonce = os.urandom(NONCE_SIZE)
+        return nonce + self._master.encrypt(nonce, data_key, f"org:{organization_id}".encode())
+    
+    def _unwrap(self, organization_id: int, wrapped: bytes) -> bytes:
+        try:
+            return self._master.decrypt(wrapped[:NONCE_SIZE], wrapped[NONCE_SIZE:], f"org:{organization_id}".encode())
+        except InvalidTag:
+            raise FieldDecryptionError(f"Datenschlüssel der Organisation {organization_id} passt nicht zum Master-Key")
+    
+    def get(self, organization_id: int) -> AESGCM:
+        """Datenschlüssel einer Organisation (legt ihn beim ersten Zugriff an)"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._keys.get(organization_id)
+            if entry and entry[1] > now:
+                self._hits += 1
+                return entry[0]
+            self._misses += 1
+        
+        wrapped = self.key_store.get_organization_key(organization_id)
+        if wrapped is None:
+            # Bei gleichzeitigem Anlegen gewinnt der erste Schreiber, alle lesen dessen Schlüssel
+            wrapped = self.key_store.create_organization_key(
+                organization_id, self._wrap(organization_id, AESGCM.generate_key(bit_length=256))
+            )
+            with self._lock:
+                self._created += 1
+        cipher = AESGCM(self._unwrap(organization_id, bytes(wrapped)))
+        with self._lock:
+            self._keys[organization_id] = (cipher, now + self.ttl)
+        return cipher
+    
+    def clear(self):
+        with self._lock:
+            self._keys.clear()
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'cached_keys': len(self._keys),
+                'hits': self._hits,
+                'misses': self._misses,
+                'keys_created': self._created,
+                'ttl_seconds': self.ttl
+            }
+
+class FieldEncryptor:
+    """Verschlüsselt Textspalten einer Zeile mit dem Datenschlüssel der Organisation des Besitzers
+    
+    Associated Data bindet jeden Chiffretext an Spalte und Benutzer, vertauschte Werte
+    lassen sich daher nicht entschlüsseln.
+    """
+    
+    def __init__(self, key_store, master_key: bytes, key_ttl: float = 300.0):
+        self.key_store = key_store
+        self.keys = DataKeyCache(key_store, master_key, ttl=key_ttl)
+    
+    def organization_for(self, user_id: Any) -> int:
+        organization_id = self.key_store.get_user_organization(user_id)
+        return UNASSIGNED_ORGANIZATION if organization_id is None else organization_id
+    
+    @staticmethod
+    def _aad(column: str, user_id: Any) -> bytes:
+        return f"{column}:{user_id}".encode()
+    
+    def encrypt_fields(self, user_id: Any, values: Dict[str, Any]) -> Dict[str, Optional[bytes]]:
+        """Verschlüsselt alle Spalten einer Zeile (str oder bytes, None bleibt None) mit einem Schlüsselzugriff"""
+        organization_id = self.organization_for(user_id)
+        cipher = self.keys.get(organization_id)
+        header = bytes([FORMAT_V1]) + organization_id.to_bytes(4, "big")
+        encrypted = {}
+        for column, value in values.items():
+            if value is None:
+                encrypted[column] = None
+                continue
+            plaintext = value.encode("utf-8") if isinstance(value, str) else bytes(value)
+            nonce = os.urandom(NONCE_SIZE)
+            encrypted[column] = header + nonce + cipher.encrypt(nonce, plaintext, self._aad(column, user_id))
+        return encrypted
+    
+    def decrypt_rows(self, rows: List[Dict[str, Any]], columns: Iterable[str]):
+        """Entschlüsselt die Spalten verschlüsselter Zeilen in place (Ergebnis: bytes)
+        
+        Schlüssel werden pro Organisation einmal je Aufruf aufgelöst, nicht pro Zeile.
+        """
+        columns = list(columns)
+        ciphers: Dict[int, AESGCM] = {}
+        for row in rows:
+            for column in columns:
+                value = row.get(column)
+                if value is None:
+                    continue
+                data = bytes(value)
+                if len(data) < HEADER_SIZE or data[0] != FORMAT_V1:
+                    raise FieldDecryptionError(f"Unbekanntes Chiffretext-Format in Spalte {column}")
+                organization_id = int.from_bytes(data[1:5], "big")
+                cipher = ciphers.get(organization_id)
+                if cipher is None:
+                    cipher = ciphers[organization_id] = self.keys.get(organization_id)
+                try:
+                    row[column] = cipher.decrypt(
+                        data[5:HEADER_SIZE], data[HEADER_SIZE:], self._aad(column, row['user_id'])
+                    )
+                except InvalidTag:
+                    raise FieldDecryptionError(f"Spalte {column} der Zeile {row.get('id')} lässt sich nicht entschlüsseln")
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        return self.keys.get_metrics()
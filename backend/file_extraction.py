@@ -0,0 +1,505 @@
+"""
+File Extraction Module für Praivio
+Extrahiert Text aus PDFs, Bildern und Audio-Dateien (läuft in den Worker-Prozessen der Extraktions-Queue)
+"""
+
+import logging
+import multiprocessing
+import multiprocessing.util
+import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, List, Dict, Any, Tuple, Callable, Iterator
+
+# AI Processing
+import numpy as np
+import whisper
+from PIL import Image, ImageChops, ImageFilter, ImageOps
+import pytesseract
+import fitz  # PyMuPDF
+
+logger = logging.getLogger(__name__)
+
+# Version der Extraktion je Dateityp; Teil des Schlüssels im Extraktions-Cache.
+# Bei Änderungen an Extraktor, Sprache oder Modell erhöhen, damit alte Ergebnisse nicht mehr greifen.
+PROCESSOR_VERSIONS = {
+    'pdf': 'pymupdf-3+ocr-deu+eng',
+    'image': 'tesseract-deu+eng-2',
+    'audio': 'whisper-base-de-vad-2'
+}
+
+# Ergebnis, wenn eine Datei nicht verarbeitet werden konnte (wird nicht gecacht)
+FAILURE_MESSAGES = {
+    'pdf': "PDF konnte nicht verarbeitet werden.",
+    'image': "Bild konnte nicht verarbeitet werden.",
+    'audio': "Audio konnte nicht transkribiert werden."
+}
+
+# Große PDFs werden in Seitenbereiche aufgeteilt und in einem eigenen Prozess-Pool extrahiert
+# (derselbe Pool übernimmt die OCR gescannter Seiten und großer Bilder)
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "0")) or os.cpu_count() or 1
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+_pdf_executor: Optional[ProcessPoolExecutor] = None
+
+# OCR für Seiten ohne Textebene (weniger als PDF_OCR_MIN_CHARS Zeichen und mindestens ein Bild)
+PDF_OCR = os.getenv("PDF_OCR", "true").lower() == "true"
+PDF_OCR_DPI = int(os.getenv("PDF_OCR_DPI", "300"))
+PDF_OCR_MIN_CHARS = int(os.getenv("PDF_OCR_MIN_CHARS", "20"))
+
+# Bild-OCR: Zielauflösung, maximale Schräglage in Grad (0 = nicht begradigen), Schwellwert der
+# Binarisierung und Kacheln für große Bilder (Streifen mit Überlappung > Zeilenhöhe)
+IMAGE_OCR_DPI = int(os.getenv("IMAGE_OCR_DPI", "300"))
+IMAGE_OCR_MAX_SKEW = int(os.getenv("IMAGE_OCR_MAX_SKEW", "10"))
+IMAGE_OCR_THRESHOLD = int(os.getenv("IMAGE_OCR_THRESHOLD", "10"))
+IMAGE_OCR_TILE_PIXELS = int(os.getenv("IMAGE_OCR_TILE_PIXELS", "4000000"))
+IMAGE_OCR_TILE_HEIGHT = int(os.getenv("IMAGE_OCR_TILE_HEIGHT", "1024"))
+IMAGE_OCR_TILE_OVERLAP = int(os.getenv("IMAGE_OCR_TILE_OVERLAP", "128"))
+# Fotos ohne brauchbare DPI-Angabe: lange Seite entspricht einer A4-Seite
+A4_LONG_SIDE_INCHES = 11.69
+
+# Audio: Segmente an Sprechpausen, parallel in AUDIO_WORKERS Prozessen mit je einem Whisper-Modell
+AUDIO_WORKERS = int(os.getenv("AUDIO_WORKERS", "2"))
+AUDIO_SEGMENT_SECONDS = int(os.getenv("AUDIO_SEGMENT_SECONDS", "30"))
+AUDIO_VAD_MIN_SILENCE_MS = int(os.getenv("AUDIO_VAD_MIN_SILENCE_MS", "500"))
+AUDIO_VAD_MARGIN_DB = float(os.getenv("AUDIO_VAD_MARGIN_DB", "10"))
+AUDIO_VAD_FLOOR_DB = float(os.getenv("AUDIO_VAD_FLOOR_DB", "-50"))
+AUDIO_VAD_FRAME_MS = 30
+AUDIO_SAMPLE_RATE = 16000
+_audio_executor: Optional[ProcessPoolExecutor] = None
+
+# Zwischenergebnis: (Segment, Start in s, Ende in s, Text)
+PartialCallback = Callable[[int, float, float, str], None]
+
+# Whisper-Modell pro Worker-Prozess
+_whisper_model = None
+
+class ExtractionPoolError(RuntimeError):
+    """Ein Prozess eines inneren Pools (Seiten, OCR, Audio) ist abgestürzt
+    
+    Wird nicht in ein Fehlerergebnis umgewandelt, sondern an die Extraktions-Queue
+    weitergegeben, die den Job wie bei einem Absturz ihres eigenen Workers wiederholt.
+    """
+
+def _get_whisper_model():
+    """Lazy loading für Whisper model"""
+    global _whisper_model
+    if _whisper_model is None:
+        logger.info("Loading Whisper model...")
+        _whisper_model = whisper.load_model("base")
+    return _whisper_model
+
+def _nested_pool(workers: int, initializer=None) -> ProcessPoolExecutor:
+    """Prozess-Pool innerhalb eines Worker-Prozesses
+    
+    Wird beim Beenden des Worker-Prozesses heruntergefahren, bevor multiprocessing auf dessen
+    Kindprozesse wartet und die Queues des Pools schließt (exitpriority über deren 10); sonst
+    erreicht die Kinder kein Ende-Signal und beide Seiten warten aufeinander.
+    """
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=initializer)
+    multiprocessing.util.Finalize(executor, executor.shutdown, kwargs={'cancel_futures': True}, exitpriority=100)
+    return executor
+
+def _page_pool() -> ProcessPoolExecutor:
+    """Prozess-Pool für PDF-Seitenbereiche und OCR-Aufgaben (pro Worker-Prozess einmal angelegt)"""
+    global _pdf_executor
+    if _pdf_executor is None:
+        _pdf_executor = _nested_pool(PDF_WORKERS)
+    return _pdf_executor
+
+def _needs_ocr(page, text: str) -> bool:
+    """Seite ohne (nennenswerte) Textebene, aber mit Bildern: vermutlich gescannt"""
+    return len(text.strip()) < PDF_OCR_MIN_CHARS and bool(page.get_images(full=False))
+
+def extract_pdf_pages(path: str, start: int, end: int) -> List[Tuple[str, bool]]:
+    """Text der Seiten start..end-1 (0-basiert) und ob die Seite OCR braucht (läuft im Seiten-Pool)"""
+    doc = fitz.open(path)
+    try:
+        pages = []
+        for page_num in range(start, end):
+            page = doc.load_page(page_num)
+            text = page.get_text()
+            pages.append((text, _needs_ocr(page, text)))
+        return pages
+    finally:
+        doc.close()
+
+def ocr_pdf_page(path: str, page_num: int) -> str:
+    """Rendert eine Seite mit PDF_OCR_DPI in Graustufen und erkennt den Text mit Tesseract"""
+    # Ein Tesseract-Thread pro Prozess, parallelisiert wird über die Seiten
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+    doc = fitz.open(path)
+    try:
+        pixmap = doc.load_page(page_num).get_pixmap(dpi=PDF_OCR_DPI, colorspace=fitz.csGRAY)
+        image = Image.frombytes("L", (pixmap.width, pixmap.height), pixmap.samples)
+    finally:
+        doc.close()
+    return pytesseract.image_to_string(image, lang='deu+eng').strip()
+
+def _discard_page_pool():
+    global _pdf_executor
+    if _pdf_executor is not None:
+        _pdf_executor.shutdown(wait=False, cancel_futures=True)
+        _pdf_executor = None
+
+def _pool_map(get_pool: Callable[[], ProcessPoolExecutor], discard: Callable[[], None], func,
+              tasks: List[tuple]) -> Iterator[Any]:
+    """Führt func(*task) in einem inneren Pool aus und liefert die Ergebnisse in Reihenfolge
+    
+    Stürzt ein Prozess ab (z.B. OOM), wird der Pool verworfen und beim nächsten Aufruf neu
+    angelegt; ExtractionPoolError lässt die Extraktions-Queue den Job wiederholen.
+    """
+    try:
+        pool = get_pool()
+        futures = [pool.submit(func, *task) for task in tasks]
+        for future in futures:
+            yield future.result()
+    except BrokenProcessPool as e:
+        discard()
+        raise ExtractionPoolError(f"Worker-Prozess eines inneren Pools abgestürzt: {e}") from e
+
+def _map_pool(func, tasks: List[tuple]) -> List[Any]:
+    """Führt func(*task) für alle Aufgaben aus, mit mehreren Aufgaben im Seiten-Pool"""
+    if len(tasks) <= 1 or PDF_WORKERS <= 1:
+        return [func(*task) for task in tasks]
+    return list(_pool_map(_page_pool, _discard_page_pool, func, tasks))
+
+def extract_pdf(path: str) -> Dict[str, Any]:
+    """Extrahiert den Text aller Seiten eines PDFs (große Dateien seitenweise parallel)
+    
+    Seiten mit Textebene bleiben beim schnellen Weg über PyMuPDF. Nur Seiten ohne Textebene
+    (Scans) werden gerendert und per OCR erkannt, ebenfalls parallel im Seiten-Pool.
+    """
+    try:
+        # Öffne PDF mit PyMuPDF, nur für die Seitenzahl
+        doc = fitz.open(path)
+        page_count = len(doc)
+        doc.close()
+        
+        ranges = [
+            (path, start, min(start + PDF_PAGES_PER_TASK, page_count))
+            for start in range(0, page_count, PDF_PAGES_PER_TASK)
+        ]
+        # Ergebnisse in Seitenreihenfolge zusammensetzen
+        extracted = [page for pages in _map_pool(extract_pdf_pages, ranges) for page in pages]
+        pages = [text for text, _ in extracted]
+        
+        scanned = [page_num for page_num, (_, needs_ocr) in enumerate(extracted) if needs_ocr]
+        if scanned and PDF_OCR:
+            logger.info(f"OCR for {len(scanned)} of {page_count} PDF pages without text layer")
+            try:
+                for page_num, text in zip(scanned, _map_pool(ocr_pdf_page, [(path, n) for n in scanned])):
+                    pages[page_num] = text
+            except ExtractionPoolError:
+                raise
+            except Exception as ocr_error:
+                logger.warning(f"PDF OCR failed: {ocr_error}")
+        
+        # Kombiniere alle Seiten (vollständig, Kürzung erst beim Chat-Kontext)
+        return {'text': "\n\n".join(pages).strip(), 'pages': pages}
+    
+    except ExtractionPoolError:
+        raise
+    except Exception as e:
+        logger.error(f"PDF processing failed: {e}")
+        return {'text': FAILURE_MESSAGES['pdf'], 'pages': None}
+
+class _StageTimer:
+    """Dauer der einzelnen Verarbeitungsschritte in Millisekunden"""
+    
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+        self._last = time.perf_counter()
+    
+    def lap(self, stage: str):
+        now = time.perf_counter()
+        self.timings[stage] = round((now - self._last) * 1000, 1)
+        self._last = now
+    
+    def __str__(self) -> str:
+        return ", ".join(f"{stage}={ms}ms" for stage, ms in self.timings.items())
+
+def _binarize(gray: Image.Image) -> Image.Image:
+    """Adaptiver Schwellwert: Pixel deutlich dunkler als ihre Umgebung werden schwarz
+    
+    Der lokale Mittelwert (Box-Blur, Radius relativ zur Bildgröße) gleicht ungleichmäßige
+    Beleuchtung von Handyfotos aus, die ein globaler Schwellwert nicht schafft.
+    """
+    radius = max(2, max(gray.size) // 200)
+    background = gray.filter(ImageFilter.BoxBlur(radius))
+    darker = ImageChops.subtract(background, gray)
+    return darker.point(lambda value: 0 if value > IMAGE_OCR_THRESHOLD else 255)
+
+def _estimate_skew(gray: Image.Image) -> float:
+    """Schräglage in Grad per Projektionsprofil auf einem Vorschaubild
+    
+    Liegen die Textzeilen waagrecht, streuen die Zeilenmittelwerte am stärksten.
+    Grobsuche in 1°-Schritten, danach Feinsuche in 0,2°-Schritten um das beste Ergebnis.
+    """
+    thumb = gray.copy()
+    thumb.thumbnail((1000, 1000))
+    thumb = _binarize(thumb)
+    
+    def score(angle: float) -> float:
+        rotated = thumb.rotate(angle, resample=Image.Resampling.NEAREST, fillcolor=255)
+        rows = rotated.resize((1, rotated.height), Image.Resampling.BOX)
+        return statistics.pvariance(rows.getdata())
+    
+    coarse = max(range(-IMAGE_OCR_MAX_SKEW, IMAGE_OCR_MAX_SKEW + 1), key=score)
+    return max((coarse + step / 5 for step in range(-4, 5)), key=score)
+
+def preprocess_image(image: Image.Image, timer: Optional[_StageTimer] = None) -> Image.Image:
+    """Bereitet ein Foto oder einen Scan für Tesseract vor
+    
+    Graustufen, Verkleinern auf IMAGE_OCR_DPI (eingebettete Auflösung eines Scans oder,
+    bei Fotos ohne brauchbare Angabe, eine A4-Seite), Begradigen und Binarisieren.
+    """
+    timer = timer or _StageTimer()
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info):
+        # Transparente Flächen auf weißem Hintergrund statt schwarz
+        rgba = image.convert("RGBA")
+        image = Image.alpha_composite(Image.new("RGBA", rgba.size, "white"), rgba)
+    gray = image.convert("L")
+    timer.lap('grayscale')
+    
+    dpi = image.info.get('dpi', (0, 0))[0]
+    if dpi >= 100:
+        scale = IMAGE_OCR_DPI / dpi
+    else:
+        scale = A4_LONG_SIDE_INCHES * IMAGE_OCR_DPI / max(gray.size)
+    if scale < 1:
+        size = (max(1, round(gray.width * scale)), max(1, round(gray.height * scale)))
+        gray = gray.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+    timer.lap('scale')
+    
+    angle = _estimate_skew(gray) if IMAGE_OCR_MAX_SKEW > 0 else 0.0
+    if abs(angle) >= 0.2:
+        gray = gray.rotate(angle, resample=Image.Resampling.BICUBIC, expand=True, fillcolor=255)
+    timer.lap('deskew')
+    
+    binary = _binarize(gray)
+    timer.lap('binarize')
+    return binary
+
+def ocr_image_tile(tile: Image.Image, top: int, band: Tuple[int, int]) -> List[str]:
+    """OCR einer Bildkachel (läuft im Seiten-Pool)
+    
+    Liefert die Zeilen, deren Mitte in band liegt (Bildkoordinaten); Zeilen im Überlappungsbereich
+    gehören damit genau zu einer Kachel.
+    """
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+    data = pytesseract.image_to_data(tile, lang='deu+eng', config=f"--dpi {IMAGE_OCR_DPI}",
+                                     output_type=pytesseract.Output.DICT)
+    lines: Dict[Tuple[int, int, int], List[int]] = {}
+    words: Dict[Tuple[int, int, int], List[str]] = {}
+    for i, word in enumerate(data['text']):
+        if not word.strip():
+            continue
+        key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+        lines.setdefault(key, []).append(top + data['top'][i] + data['height'][i] // 2)
+        words.setdefault(key, []).append(word)
+    return [
+        " ".join(words[key])
+        for key, centers in lines.items()
+        if band[0] <= statistics.median(centers) < band[1]
+    ]
+
+def ocr_image(binary: Image.Image) -> str:
+    """Text eines vorverarbeiteten Bildes; große Bilder in überlappenden Streifen parallel"""
+    width, height = binary.size
+    if width * height <= IMAGE_OCR_TILE_PIXELS or height <= IMAGE_OCR_TILE_HEIGHT:
+        return pytesseract.image_to_string(binary, lang='deu+eng', config=f"--dpi {IMAGE_OCR_DPI}").strip()
+    
+    # Streifen über die volle Breite, damit keine Zeile längs geteilt wird
+    step = IMAGE_OCR_TILE_HEIGHT - IMAGE_OCR_TILE_OVERLAP
+    tops = list(range(0, height - IMAGE_OCR_TILE_OVERLAP, step))
+    half = IMAGE_OCR_TILE_OVERLAP // 2
+    tasks = []
+    for index, top in enumerate(tops):
+        bottom = min(top + IMAGE_OCR_TILE_HEIGHT, height)
+        band = (top + half if index else 0, bottom - half if index < len(tops) - 1 else height)
+        tasks.append((binary.crop((0, top, width, bottom)), top, band))
+    # Kacheln in Reihenfolge zusammensetzen
+    return "\n".join(line for lines in _map_pool(ocr_image_tile, tasks) for line in lines).strip()
+
+def extract_image(path: str) -> str:
+    """Analysiert Bild mit OCR und Vision"""
+    try:
+        timer = _StageTimer()
+        # Öffne Bild mit PIL
+        image = Image.open(path)
+        image.load()
+        timer.lap('load')
+        
+        # OCR mit Tesseract auf dem vorverarbeiteten Bild
+        try:
+            ocr_text = ocr_image(preprocess_image(image, timer))
+        except ExtractionPoolError:
+            raise
+        except Exception as ocr_error:
+            logger.warning(f"OCR failed: {ocr_error}")
+            ocr_text = ""
+        timer.lap('ocr')
+        logger.info(f"Image OCR {image.width}x{image.height}: {timer}")
+        
+        # Bildbeschreibung (falls Vision API verfügbar)
+        # Hier könnte man GPT-4V oder ähnliches integrieren
+        vision_description = "Bild erfolgreich verarbeitet."
+        
+        # Kombiniere OCR und Vision
+        if ocr_text:
+            result = f"OCR-Text aus Bild:\n{ocr_text}\n\n{vision_description}"
+        else:
+            result = vision_description
+        
+        return result
+    
+    except ExtractionPoolError:
+        raise
+    except Exception as e:
+        logger.error(f"Image processing failed: {e}")
+        return FAILURE_MESSAGES['image']
+
+def _init_audio_worker():
+    """Lädt das Whisper-Modell beim Start des Prozesses (warm für alle Segmente)"""
+    import torch
+    # Die CPU-Kerne auf die Audio-Prozesse aufteilen statt sie zu überbuchen
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // AUDIO_WORKERS))
+    _get_whisper_model()
+
+def _audio_pool() -> ProcessPoolExecutor:
+    """Prozess-Pool für Audio-Segmente, jeder Prozess mit eigenem Whisper-Modell"""
+    global _audio_executor
+    if _audio_executor is None:
+        _audio_executor = _nested_pool(AUDIO_WORKERS, initializer=_init_audio_worker)
+    return _audio_executor
+
+def _discard_audio_pool():
+    global _audio_executor
+    if _audio_executor is not None:
+        _audio_executor.shutdown(wait=False, cancel_futures=True)
+        _audio_executor = None
+
+def split_on_silence(audio: np.ndarray) -> List[Tuple[int, int]]:
+    """Energie-basierte VAD: Segmente (Start, Ende in Samples) mit Sprache, höchstens AUDIO_SEGMENT_SECONDS lang
+    
+    Stille sind Frames unter dem Grundrauschen (10. Perzentil) plus AUDIO_VAD_MARGIN_DB, mindestens
+    AUDIO_VAD_FLOOR_DB und höchstens die lauteste Stelle minus AUDIO_VAD_MARGIN_DB. Geschnitten wird in Pausen ab AUDIO_VAD_MIN_SILENCE_MS; Sprache dazwischen
+    wird bis zur Segmentlänge zusammengefasst (Whisper verarbeitet ohnehin 30-s-Fenster), zu lange
+    Abschnitte an ihrem leisesten Frame geteilt.
+    """
+    frame = AUDIO_SAMPLE_RATE * AUDIO_VAD_FRAME_MS // 1000
+    frame_count = len(audio) // frame
+    if frame_count == 0:
+        return []
+    frames = audio[:frame_count * frame].reshape(frame_count, frame)
+    energy = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+    # Ohne Pausen liegt das 10. Perzentil schon auf Sprachniveau: Schwelle höchstens Maximum minus Abstand
+    noise = float(np.percentile(energy, 10))
+    peak = float(np.max(energy))
+    threshold = max(min(noise + AUDIO_VAD_MARGIN_DB, peak - AUDIO_VAD_MARGIN_DB), AUDIO_VAD_FLOOR_DB)
+    speech = energy > threshold
+    
+    # Sprachabschnitte zwischen Pausen ab min_silence Frames (Stille am Anfang und Ende fällt weg)
+    min_silence = max(1, AUDIO_VAD_MIN_SILENCE_MS // AUDIO_VAD_FRAME_MS)
+    regions: List[List[int]] = []
+    silence = 0
+    for index, is_speech in enumerate(speech):
+        if not is_speech:
+            silence += 1
+            continue
+        if regions and silence < min_silence:
+            regions[-1][1] = index + 1
+        else:
+            regions.append([index, index + 1])
+        silence = 0
+    
+    # Abschnitte zu Segmenten zusammenfassen bzw. teilen
+    max_frames = AUDIO_SEGMENT_SECONDS * 1000 // AUDIO_VAD_FRAME_MS
+    padding = min_silence // 2
+    segments: List[Tuple[int, int]] = []
+    for region_start, region_end in regions:
+        region_start = max(0, region_start - padding)
+        region_end = min(frame_count, region_end + padding)
+        if segments and region_end - segments[-1][0] <= max_frames:
+            segments[-1] = (segments[-1][0], region_end)
+            continue
+        while region_end - region_start > max_frames:
+            cut = region_start + max_frames // 2 + int(np.argmin(energy[region_start + max_frames // 2:region_start + max_frames]))
+            segments.append((region_start, cut))
+            region_start = cut
+        segments.append((region_start, region_end))
+    
+    samples = [(start * frame, end * frame) for start, end in segments]
+    if samples and segments[-1][1] == frame_count:
+        # Rest nach dem letzten vollständigen Frame
+        samples[-1] = (samples[-1][0], len(audio))
+    return samples
+
+def transcribe_segment(samples: np.ndarray) -> str:
+    """Transkribiert ein Segment (läuft im Audio-Pool)"""
+    result = _get_whisper_model().transcribe(samples, language="de")
+    return result["text"].strip()
+
+def extract_audio(path: str, on_partial: Optional[PartialCallback] = None) -> str:
+    """Transkribiert Audio mit Whisper, in Segmenten an Sprechpausen parallel
+    
+    Die Datei wird einmal in den Speicher dekodiert (16 kHz mono). Fertige Segmente gehen in
+    Reihenfolge an on_partial(index, start, end, text), sobald alle vorherigen fertig sind.
+    """
+    try:
+        audio = whisper.load_audio(path, sr=AUDIO_SAMPLE_RATE)
+        segments = split_on_silence(audio)
+        logger.info(f"Audio of {len(audio) / AUDIO_SAMPLE_RATE:.1f}s split into {len(segments)} segments")
+        
+        if len(segments) <= 1 or AUDIO_WORKERS <= 1:
+            results = (transcribe_segment(audio[start:end]) for start, end in segments)
+        else:
+            results = _pool_map(_audio_pool, _discard_audio_pool, transcribe_segment,
+                                [(audio[start:end],) for start, end in segments])
+        
+        texts = []
+        for index, ((start, end), text) in enumerate(zip(segments, results)):
+            texts.append(text)
+            if on_partial is not None:
+                on_partial(index, start / AUDIO_SAMPLE_RATE, end / AUDIO_SAMPLE_RATE, text)
+        transcript = " ".join(text for text in texts if text)
+        
+        return f"Audio-Transkript:\n{transcript}"
+    
+    except ExtractionPoolError:
+        raise
+    except Exception as e:
+        logger.error(f"Audio processing failed: {e}")
+        return FAILURE_MESSAGES['audio']
+
+EXTRACTORS = {
+    'pdf': extract_pdf,
+    'image': extract_image,
+    'audio': extract_audio
+}
+
+# Extraktoren, die Zwischenergebnisse liefern
+PARTIAL_EXTRACTORS = {'audio'}
+
+def extract_file(file_type: str, path: str, on_partial: Optional[PartialCallback] = None) -> Optional[Dict[str, Any]]:
+    """Verarbeitet eine Datei mit AI und extrahiert Inhalt
+    
+    Ergebnis: {'text': ..., 'pages': Text pro Seite (nur PDF) oder None}
+    """
+    extractor = EXTRACTORS.get(file_type)
+    if not extractor:
+        return None
+    result = extractor(path, on_partial) if file_type in PARTIAL_EXTRACTORS else extractor(path)
+    return result if isinstance(result, dict) else {'text': result, 'pages': None}
+
+def processor_key(file_type: str) -> str:
+    """Schlüssel des Extraktors im Cache, z.B. 'pdf:pymupdf-1'"""
+    return f"{file_type}:{PROCESSOR_VERSIONS.get(file_type, '0')}"
+
+def is_cacheable(file_type: str, result: Optional[str]) -> bool:
+    """Nur erfolgreiche Extraktionen werden gecacht"""
+    return result is not None and result != FAILURE_MESSAGES.get(file_type)
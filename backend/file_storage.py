@@ -0,0 +1,269 @@
+"""
+File Storage Module für Praivio
+Ablage hochgeladener Dateien: lokales Dateisystem (Metadaten in der lokalen Datenbank) oder Supabase
+"""
+
+import logging
+import mmap
+from abc import ABC, abstractmethod
+import os
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Union
+
+from upload_intake import SpooledUpload
+
+logger = logging.getLogger(__name__)
+
+FSYNC_POLICIES = ('always', 'file', 'never')
+
+class BaseFileStorage(ABC):
+    """Schnittstelle der Ablage: Inhalte unter storage_path und Metadaten in uploaded_files"""
+    
+    name = ""
+    
+    # Inhalte
+    @abstractmethod
+    def put_blob(self, storage_path: str, upload: SpooledUpload, content_type: str):
+        """Legt den Inhalt eines Uploads unter storage_path ab"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def read_blob(self, storage_path: str) -> Union[bytes, memoryview]:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def remove_blob(self, storage_path: str):
+        raise NotImplementedError
+    
+    def local_path(self, storage_path: str) -> Optional[Path]:
+        """Pfad im lokalen Dateisystem (None bei entfernter Ablage)"""
+        return None
+    
+    # Metadaten
+    @abstractmethod
+    def insert_file(self, file_data: Dict[str, Any]):
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_file(self, file_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_session_files(self, session_id: str, user_id: str) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_files(self, file_ids: List[str], user_id: str, columns: List[str]) -> List[Dict[str, Any]]:
+        """Mehrere Dateien des Benutzers mit einer Abfrage, nur die angegebenen Spalten"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def link_files(self, file_ids: List[str], user_id: str, session_id: str):
+        """Ordnet Dateien des Benutzers mit einem Statement einer Chat-Session zu"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def update_file(self, file_id: str, user_id: str, values: Dict[str, Any]):
+        raise NotImplementedError
+    
+    @abstractmethod
+    def delete_file(self, file_id: str, user_id: str):
+        raise NotImplementedError
+    
+    @abstractmethod
+    def find_content(self, content_hash: str) -> Optional[str]:
+        """storage_path einer vorhandenen Datei mit diesem Inhalt (Deduplikation)"""
+        raise NotImplementedError
+
+class LocalFileStorage(BaseFileStorage):
+    """Inhalte im lokalen Dateisystem, Metadaten in der Praivio-Datenbank
+    
+    storage_path ist relativ zu root (blobs/ab/<sha256>, 256 Unterverzeichnisse). Geschrieben
+    wird in eine temporäre Datei im Zielverzeichnis und per rename übernommen; Leser sehen
+    nie halbe Dateien. fsync: 'always' (Datei und Verzeichnis), 'file' (nur Datei) oder 'never'.
+    """
+    
+    name = "local"
+    
+    def __init__(self, db_manager, root: str = "./data/files", fsync: str = "always"):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unbekannte fsync-Policy: {fsync}")
+        self.db_manager = db_manager
+        self.root = Path(root)
+        self.fsync = fsync
+        self.root.mkdir(parents=True, exist_ok=True)
+    
+    def local_path(self, storage_path: str) -> Path:
+        path = (self.root / storage_path).resolve()
+        if self.root.resolve() not in path.parents:
+            raise ValueError(f"Ungültiger Speicherpfad: {storage_path}")
+        return path
+    
+    def put_blob(self, storage_path: str, upload: SpooledUpload, content_type: str):
+        target = self.local_path(storage_path)
+        if target.exists():
+            # Inhaltsadressiert: gleicher Pfad, gleicher Inhalt
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = target.with_name(f".{target.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            content = upload.content()
+            if isinstance(content, Path):
+                try:
+                    # Spool-Datei auf demselben Dateisystem: Hardlink statt Kopie
+                    os.link(content, tmp_path)
+                except OSError:
+                    self._copy_file(content, tmp_path)
+            else:
+                with open(tmp_path, "wb") as f:
+                    f.write(content)
+            if self.fsync != 'never':
+                fd = os.open(tmp_path, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            os.replace(tmp_path, target)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        if self.fsync == 'always':
+            self._fsync_directory(target.parent)
+    
+    @staticmethod
+    def _copy_file(source: Path, target: Path):
+        """Kopie im Kernel per sendfile (ohne Umweg über Python-Puffer)"""
+        with open(source, "rb") as src, open(target, "wb") as dst:
+            remaining = os.fstat(src.fileno()).st_size
+            offset = 0
+            while remaining > 0:
+                sent = os.sendfile(dst.fileno(), src.fileno(), offset, remaining)
+                if sent == 0:
+                    break
+                offset += sent
+                remaining -= sent
+    
+    @staticmethod
+    def _fsync_directory(directory: Path):
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    
+    def read_blob(self, storage_path: str) -> Union[bytes, memoryview]:
+        """Inhalt per mmap (die Seiten kommen direkt aus dem Page Cache)"""
+        with open(self.local_path(storage_path), "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b""
+            return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    
+    def remove_blob(self, storage_path: str):
+        self.local_path(storage_path).unlink(missing_ok=True)
+    
+    def insert_file(self, file_data: Dict[str, Any]):
+        self.db_manager.save_uploaded_file(file_data)
+    
+    def get_file(self, file_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        return self.db_manager.get_uploaded_file(file_id, user_id)
+    
+    def get_session_files(self, session_id: str, user_id: str) -> List[Dict[str, Any]]:
+        return self.db_manager.get_session_uploaded_files(session_id, user_id)
+    
+    def get_files(self, file_ids: List[str], user_id: str, columns: List[str]) -> List[Dict[str, Any]]:
+        return self.db_manager.get_uploaded_files(file_ids, user_id, columns)
+    
+    def link_files(self, file_ids: List[str], user_id: str, session_id: str):
+        self.db_manager.link_uploaded_files(file_ids, user_id, session_id)
+    
+    def update_file(self, file_id: str, user_id: str, values: Dict[str, Any]):
+        self.db_manager.update_uploaded_file(file_id, user_id, values)
+    
+    def delete_file(self, file_id: str, user_id: str):
+        self.db_manager.delete_uploaded_file(file_id, user_id)
+    
+    def find_content(self, content_hash: str) -> Optional[str]:
+        return self.db_manager.find_uploaded_content(content_hash)
+
+class SupabaseFileStorage(BaseFileStorage):
+    """Inhalte im Supabase-Bucket 'files', Metadaten in der Supabase-Tabelle uploaded_files"""
+    
+    name = "supabase"
+    
+    def __init__(self, supabase_url: Optional[str] = None, supabase_key: Optional[str] = None, bucket: str = "files"):
+        # Supabase erst hier importieren: bei lokaler Ablage wird der Client nicht gebraucht
+        from supabase import create_client
+        self.supabase = create_client(
+            supabase_url or os.getenv("SUPABASE_URL", "https://vtvlbavlhlnfamlreiql.supabase.co"),
+            supabase_key or os.getenv("SUPABASE_SERVICE_KEY")
+        )
+        self.bucket = bucket
+    
+    @staticmethod
+    def _check(result, action: str):
+        # Prüfe auf Fehler in der Response
+        if hasattr(result, 'error') and result.error:
+            raise Exception(f"Supabase {action} failed: {result.error}")
+    
+    def put_blob(self, storage_path: str, upload: SpooledUpload, content_type: str):
+        # Kleine Uploads als bytes, große als Pfad (der Client liest die Spool-Datei selbst)
+        content = upload.content()
+        result = self.supabase.storage.from_(self.bucket).upload(
+            path=storage_path,
+            file=bytes(content) if isinstance(content, memoryview) else str(content),
+            # upsert: zwei gleichzeitige Erst-Uploads schreiben denselben Inhalt
+            file_options={"content-type": content_type, "upsert": "true"}
+        )
+        self._check(result, "upload")
+    
+    def read_blob(self, storage_path: str) -> bytes:
+        return self.supabase.storage.from_(self.bucket).download(storage_path)
+    
+    def remove_blob(self, storage_path: str):
+        self.supabase.storage.from_(self.bucket).remove([storage_path])
+    
+    def insert_file(self, file_data: Dict[str, Any]):
+        self._check(self.supabase.table('uploaded_files').insert(file_data).execute(), "insert")
+    
+    def get_file(self, file_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        result = self.supabase.table('uploaded_files').select('*').eq('id', file_id).eq('user_id', user_id).execute()
+        return result.data[0] if result.data else None
+    
+    def get_session_files(self, session_id: str, user_id: str) -> List[Dict[str, Any]]:
+        result = self.supabase.table('uploaded_files').select('*').eq('session_id', session_id).eq('user_id', user_id).execute()
+        return result.data or []
+    
+    def get_files(self, file_ids: List[str], user_id: str, columns: List[str]) -> List[Dict[str, Any]]:
+        result = self.supabase.table('uploaded_files').select(','.join(columns)).in_('id', file_ids).eq('user_id', user_id).execute()
+        return result.data or []
+    
+    def link_files(self, file_ids: List[str], user_id: str, session_id: str):
+        result = self.supabase.table('uploaded_files').update({
+            'session_id': session_id,
+            'updated_at': datetime.now().isoformat()
+        }).in_('id', file_ids).eq('user_id', user_id).execute()
+        self._check(result, "update")
+    
+    def update_file(self, file_id: str, user_id: str, values: Dict[str, Any]):
+        result = self.supabase.table('uploaded_files').update({
+            **values,
+            'updated_at': datetime.now().isoformat()
+        }).eq('id', file_id).eq('user_id', user_id).execute()
+        self._check(result, "update")
+    
+    def delete_file(self, file_id: str, user_id: str):
+        self.supabase.table('uploaded_files').delete().eq('id', file_id).eq('user_id', user_id).execute()
+    
+    def find_content(self, content_hash: str) -> Optional[str]:
+        result = self.supabase.table('uploaded_files').select('storage_path').eq('content_hash', content_hash).limit(1).execute()
+        return result.data[0]['storage_path'] if result.data else None
+
+def create_file_storage(backend: str, db_manager=None, root: str = "./data/files",
+                        fsync: str = "always") -> BaseFileStorage:
+    """Wählt die Ablage: 'local' (Dateisystem + lokale Datenbank) oder 'supabase'"""
+    if backend == "local":
+        return LocalFileStorage(db_manager, root=root, fsync=fsync)
+    if backend == "supabase":
+        return SupabaseFileStorage()
+    raise ValueError(f"Unbekanntes Speicher-Backend: {backend}")
@@ -5,33 +5,31 @@ Verarbeitet PDFs, Bilder und Audio-Dateien mit AI-Integration
 
 import os
 import uuid
+import asyncio
 import logging
-from typing import Optional, Dict, Any
+import threading
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any
 from datetime import datetime
 import httpx
 from pathlib import Path
-import tempfile
-import shutil
+from fastapi import UploadFile
 
-# Supabase
-from supabase import create_client, Client
 from supabase_auth import supabase_auth
 
-# AI Processing
-import whisper
-from PIL import Image
-import pytesseract
-import fitz  # PyMuPDF
-import io
+from file_storage import BaseFileStorage
+from file_extraction import extract_file, processor_key, is_cacheable
+from upload_intake import SpooledUpload, UploadTooLargeError, sniff_file_type
 
 logger = logging.getLogger(__name__)
 
+# Spalten, die der Chat-Kontext von einem Anhang braucht
+CONTEXT_COLUMNS = ['id', 'filename', 'file_type', 'processed_content']
+
 class FileUploadHandler:
     def __init__(self):
-        # Supabase Configuration
-        self.supabase_url = os.getenv("SUPABASE_URL", "https://vtvlbavlhlnfamlreiql.supabase.co")
-        self.supabase_key = os.getenv("SUPABASE_SERVICE_KEY")
-        self.supabase: Client = create_client(self.supabase_url, self.supabase_key)
+        # Ablage von Inhalten und Metadaten (file_storage.py), wird beim Start gesetzt
+        self.storage: Optional[BaseFileStorage] = None
         
         # File size limits (in bytes)
         self.max_sizes = {
@@ -47,77 +45,223 @@ class FileUploadHandler:
             'audio': ['audio/mpeg', 'audio/wav', 'audio/ogg', 'audio/mp4', 'audio/webm']
         }
         
-        # Initialize AI models
-        self.whisper_model = None
+        # Uploads werden blockweise angenommen; kleine bleiben im Speicher, große landen in spool_dir
+        # (gleiches Dateisystem wie EXTRACTION_SPOOL_DIR, dann wird an die Queue nur umbenannt)
+        self.spool_dir = os.getenv("UPLOAD_SPOOL_DIR", "./data/upload_spool")
+        self.chunk_size = 1024 * 1024
+        
+        # Optionale Job-Queue: Extraktion in Worker-Prozessen statt im Request
+        self.extraction_queue = None
+        # Verzögertes Löschen nicht mehr referenzierter Inhalte (blob_gc.BlobCollector)
+        self.blob_collector = None
+        # Datenbank mit dem Extraktions-Cache (database.BaseDatabaseManager)
+        self.db_manager = None
         
-    def _get_whisper_model(self):
-        """Lazy loading für Whisper model"""
-        if self.whisper_model is None:
-            logger.info("Loading Whisper model...")
-            self.whisper_model = whisper.load_model("base")
-        return self.whisper_model
+        # Verarbeitete Anhänge nach Datei-ID (Chat-Kontext), LRU bis file_cache_chars Zeichen
+        self.file_cache_chars = 32 * 1024 * 1024
+        self._file_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._file_cache_size = 0
+        self._file_cache_lock = threading.Lock()
+    
+    def set_storage(self, storage: BaseFileStorage):
+        """Wählt die Ablage (lokales Dateisystem oder Supabase)"""
+        self.storage = storage
+    
+    def set_extraction_queue(self, extraction_queue):
+        """Verarbeitet Uploads künftig im Hintergrund (extraction_queue.ExtractionQueue)"""
+        self.extraction_queue = extraction_queue
+    
+    def set_blob_collector(self, blob_collector):
+        """Entfernt Inhalte gelöschter Dateien künftig verzögert (blob_gc.BlobCollector)"""
+        self.blob_collector = blob_collector
     
-    def validate_file(self, file_content: bytes, filename: str, content_type: str) -> Dict[str, Any]:
-        """Validiert eine Datei und gibt Metadaten zurück"""
-        file_size = len(file_content)
+    def set_database_manager(self, db_manager):
+        """Aktiviert den Extraktions-Cache nach Dateiinhalt"""
+        self.db_manager = db_manager
+    
+    # Inhaltsadressierte Ablage
+    @staticmethod
+    def blob_path(content_hash: str) -> str:
+        """Storage-Pfad eines Inhalts; alle Uploads gleichen Inhalts teilen sich das Objekt"""
+        return f"blobs/{content_hash[:2]}/{content_hash}"
+    
+    def get_cached_extraction(self, content_hash: str, file_type: str) -> Optional[str]:
+        """Extraktionsergebnis für diesen Inhalt und die aktuelle Extraktor-Version"""
+        if self.db_manager is None or not content_hash:
+            return None
+        try:
+            return self.db_manager.get_cached_extraction(content_hash, processor_key(file_type))
+        except Exception as e:
+            logger.warning(f"Extraction cache lookup failed: {e}")
+            return None
+    
+    def cache_extraction(self, content_hash: Optional[str], file_type: str, result: Optional[str],
+                         pages: Optional[List[str]] = None):
+        """Merkt sich ein erfolgreiches Extraktionsergebnis (bei PDFs mit Seiten) für spätere Uploads gleichen Inhalts"""
+        if self.db_manager is None or not content_hash or not is_cacheable(file_type, result):
+            return
+        try:
+            # Seiten zuerst: ein Cache-Treffer bedeutet, dass auch die Seiten vorliegen
+            if pages:
+                self.db_manager.save_pdf_pages(content_hash, processor_key(file_type), pages)
+            self.db_manager.save_cached_extraction(content_hash, processor_key(file_type), result)
+        except Exception as e:
+            logger.warning(f"Extraction cache update failed: {e}")
+    
+    async def get_pages(self, file_id: str, user_id: str, start: int, end: int) -> Optional[Dict[str, Any]]:
+        """Seiten start..end (1-basiert) eines PDFs des Benutzers, None ohne gespeicherte Seiten"""
+        files = await asyncio.to_thread(self.storage.get_files, [file_id], user_id, ['id', 'file_type', 'content_hash'])
+        if not files or files[0]['file_type'] != 'pdf' or not files[0].get('content_hash') or self.db_manager is None:
+            return None
+        processor = processor_key('pdf')
+        content_hash = files[0]['content_hash']
+        page_count = await asyncio.to_thread(self.db_manager.count_pdf_pages, content_hash, processor)
+        if not page_count:
+            return None
+        return {
+            'file_id': file_id,
+            'page_count': page_count,
+            'pages': await asyncio.to_thread(self.db_manager.get_pdf_pages, content_hash, processor, start, end)
+        }
+    
+    # Anhänge für den Chat-Kontext
+    async def get_files(self, file_ids: List[str], user_id: str) -> List[Dict[str, Any]]:
+        """Anhänge mit processed_content in Reihenfolge von file_ids (fehlende/fremde entfallen)
+        
+        Bereits verarbeitete Dateien kommen aus dem Cache, alle übrigen mit einer Abfrage.
+        """
+        file_ids = list(dict.fromkeys(file_ids))
+        found: Dict[str, Dict[str, Any]] = {}
+        with self._file_cache_lock:
+            for file_id in file_ids:
+                entry = self._file_cache.get(file_id)
+                if entry is not None and entry['user_id'] == str(user_id):
+                    self._file_cache.move_to_end(file_id)
+                    found[file_id] = entry['file']
         
+        missing = [file_id for file_id in file_ids if file_id not in found]
+        if missing:
+            rows = await asyncio.to_thread(self.storage.get_files, missing, user_id, CONTEXT_COLUMNS)
+            for row in rows:
+                found[row['id']] = row
+                # Noch in Verarbeitung: nicht cachen, der Inhalt wird nachgetragen
+                if row.get('processed_content') is not None:
+                    self._cache_file(row, user_id)
+        return [found[file_id] for file_id in file_ids if file_id in found]
+    
+    def _cache_file(self, file_info: Dict[str, Any], user_id: str):
+        size = len(file_info['processed_content']) + len(file_info.get('filename') or "")
+        with self._file_cache_lock:
+            self._drop_cached_file(file_info['id'])
+            self._file_cache[file_info['id']] = {'user_id': str(user_id), 'file': file_info, 'size': size}
+            self._file_cache_size += size
+            while self._file_cache_size > self.file_cache_chars and self._file_cache:
+                _, evicted = self._file_cache.popitem(last=False)
+                self._file_cache_size -= evicted['size']
+    
+    def _drop_cached_file(self, file_id: str):
+        entry = self._file_cache.pop(file_id, None)
+        if entry is not None:
+            self._file_cache_size -= entry['size']
+    
+    def invalidate_file(self, file_id: str):
+        """Entfernt einen Anhang aus dem Cache (neues Extraktionsergebnis oder gelöscht)"""
+        with self._file_cache_lock:
+            self._drop_cached_file(file_id)
+    
+    def validate_file(self, head: bytes, filename: str, content_type: str) -> Dict[str, Any]:
+        """Bestimmt den Dateityp aus Magic Bytes, Content-Type und Endung"""
         # Bestimme Dateityp basierend auf Content-Type und Extension
-        file_type = None
+        declared_type = None
         for type_name, mime_types in self.allowed_types.items():
             if content_type in mime_types:
-                file_type = type_name
+                declared_type = type_name
                 break
         
-        if not file_type:
+        if not declared_type:
             # Fallback: Versuche es mit Dateiendung
             ext = Path(filename).suffix.lower()
             if ext == '.pdf':
-                file_type = 'pdf'
+                declared_type = 'pdf'
             elif ext in ['.jpg', '.jpeg', '.png', '.webp', '.gif']:
-                file_type = 'image'
+                declared_type = 'image'
             elif ext in ['.mp3', '.wav', '.ogg', '.m4a', '.webm']:
-                file_type = 'audio'
+                declared_type = 'audio'
+        
+        # Der Inhalt entscheidet; ohne erkannte Signatur gilt die Angabe des Clients
+        sniffed = sniff_file_type(head)
+        if sniffed and declared_type and sniffed[0] != declared_type:
+            raise ValueError(f"Dateiinhalt ({sniffed[1]}) passt nicht zum Dateityp {content_type}")
+        file_type = sniffed[0] if sniffed else declared_type
         
         if not file_type:
             raise ValueError(f"Nicht unterstützter Dateityp: {content_type}")
         
-        # Prüfe Dateigröße
-        max_size = self.max_sizes.get(file_type)
-        if file_size > max_size:
-            raise ValueError(f"Datei zu groß. Maximal {max_size // (1024*1024)} MB für {file_type}")
-        
         return {
             'file_type': file_type,
-            'file_size': file_size,
             'filename': filename,
-            'content_type': content_type
+            'content_type': content_type if content_type in self.allowed_types[file_type] else (
+                sniffed[1] if sniffed else content_type
+            )
         }
     
-    async def upload_file(self, file_content: bytes, filename: str, content_type: str, user_id: str, session_id: Optional[str] = None) -> Dict[str, Any]:
+    async def receive_upload(self, file: UploadFile) -> SpooledUpload:
+        """Liest einen Upload blockweise in eine Spool-Datei (Größe, SHA-256 und Typ nebenbei)"""
+        upload = SpooledUpload(file.filename, file.content_type, self.spool_dir)
+        try:
+            # Typ und Grenze stehen nach dem ersten Block fest
+            first = await file.read(self.chunk_size)
+            metadata = self.validate_file(first[:64], file.filename, file.content_type)
+            max_size = self.max_sizes[metadata['file_type']]
+            too_large = UploadTooLargeError(f"Datei zu groß. Maximal {max_size // (1024*1024)} MB für {metadata['file_type']}")
+            # Content-Length des Teils, falls der Client ihn mitschickt
+            if file.size is not None and file.size > max_size:
+                raise too_large
+            
+            upload.file_type = metadata['file_type']
+            upload.content_type = metadata['content_type']
+            chunk = first
+            while chunk:
+                if upload.size + len(chunk) > max_size:
+                    raise too_large
+                upload.write(chunk)
+                chunk = await file.read(self.chunk_size)
+            upload.finish()
+            return upload
+        except Exception:
+            upload.close()
+            raise
+    
+    async def upload_file(self, upload: SpooledUpload, user_id: str, session_id: Optional[str] = None) -> Dict[str, Any]:
         """Lädt eine Datei hoch und verarbeitet sie"""
         try:
-            # Validiere Datei
-            metadata = self.validate_file(file_content, filename, content_type)
+            filename = upload.filename
+            content_type = upload.content_type
+            metadata = {'file_type': upload.file_type, 'file_size': upload.size}
             
-            # Generiere eindeutige ID und Pfad
+            # Generiere eindeutige ID; der Speicherpfad ergibt sich aus dem Inhalt
             file_id = str(uuid.uuid4())
             file_extension = Path(filename).suffix
-            storage_path = f"uploads/{user_id}/{file_id}{file_extension}"
+            content_hash = upload.sha256
             
-            # Upload zu Supabase Storage
-            logger.info(f"Uploading file {filename} to Supabase Storage...")
-            result = self.supabase.storage.from_('files').upload(
-                path=storage_path,
-                file=file_content,
-                file_options={"content-type": content_type}
-            )
-            
-            # Prüfe auf Fehler in der Response
-            if hasattr(result, 'error') and result.error:
-                raise Exception(f"Supabase upload failed: {result.error}")
+            # Jeder Upload bekommt eine eigene Zeile (Eigentümer, Session), die Bytes liegen nur einmal in der Ablage
+            if self.blob_collector is not None:
+                # Vor der Prüfung vormerken: die GC entfernt den Inhalt nicht, solange der Upload läuft
+                await asyncio.to_thread(self.blob_collector.schedule, self.blob_path(content_hash), content_hash)
+            storage_path = await asyncio.to_thread(self.storage.find_content, content_hash)
+            deduplicated = storage_path is not None
+            if not deduplicated:
+                storage_path = self.blob_path(content_hash)
+                logger.info(f"Storing file {filename} in {self.storage.name} storage...")
+                # fsync bzw. Netzwerk-Upload außerhalb des Event-Loops
+                await asyncio.to_thread(self.storage.put_blob, storage_path, upload, content_type)
             
-            # Verarbeite Datei mit AI
-            processed_content = await self._process_file(file_content, metadata['file_type'])
+            processed_content = await asyncio.to_thread(self.get_cached_extraction, content_hash, metadata['file_type'])
+            processing_status = 'done' if processed_content is not None else 'processing'
+            if processed_content is None and self.extraction_queue is None:
+                # Ohne Queue: im Request verarbeiten, aber außerhalb des Event-Loops
+                processed_content = await self._process_file(str(upload.path()), metadata['file_type'], content_hash)
+                processing_status = 'done'
             
             # Speichere Metadaten in Datenbank
             file_data = {
@@ -127,6 +271,7 @@ class FileUploadHandler:
                 'file_size': metadata['file_size'],
                 'content_type': content_type,
                 'storage_path': storage_path,
+                'content_hash': content_hash,
                 'user_id': user_id,
                 'session_id': session_id,
                 'processed_content': processed_content,
@@ -134,13 +279,20 @@ class FileUploadHandler:
             }
             
             # Insert in database
-            result = self.supabase.table('uploaded_files').insert(file_data).execute()
+            await asyncio.to_thread(self.storage.insert_file, file_data)
             
-            # Prüfe auf Fehler in der Response
-            if hasattr(result, 'error') and result.error:
-                raise Exception(f"Database insert failed: {result.error}")
-            
-            logger.info(f"File {filename} uploaded and processed successfully")
+            if processing_status == 'processing':
+                # Erst nach dem Metadaten-Insert einplanen, das Ergebnis wird dort nachgetragen
+                input_path = upload.move_to(self.extraction_queue.spool_path(file_id, file_extension))
+                await asyncio.to_thread(
+                    self.extraction_queue.enqueue, file_id, user_id, metadata['file_type'], str(input_path), content_hash
+                )
+                logger.info(f"File {filename} uploaded, extraction queued")
+            else:
+                logger.info(f"File {filename} uploaded and processed successfully")
+            if deduplicated:
+                # Nur im Log: in der Antwort verriete das Flag, ob jemand anderes den Inhalt schon hochgeladen hat
+                logger.info(f"File {filename} deduplicated against {storage_path}")
             
             return {
                 'id': file_id,
@@ -148,119 +300,44 @@ class FileUploadHandler:
                 'file_type': metadata['file_type'],
                 'file_size': metadata['file_size'],
                 'processed_content': processed_content,
-                'storage_path': storage_path
+                'storage_path': storage_path,
+                'sha256': content_hash,
+                'status': processing_status
             }
-            
+        
         except Exception as e:
             logger.error(f"File upload failed: {e}")
             raise
     
-    async def _process_file(self, file_content: bytes, file_type: str) -> Optional[str]:
-        """Verarbeitet eine Datei mit AI und extrahiert Inhalt"""
+    async def _process_file(self, file_path: str, file_type: str, content_hash: Optional[str] = None) -> Optional[str]:
+        """Verarbeitet eine Datei mit AI und extrahiert Inhalt (ohne Queue, in einem Thread)"""
+        cached = await asyncio.to_thread(self.get_cached_extraction, content_hash, file_type)
+        if cached is not None:
+            return cached
         try:
-            if file_type == 'pdf':
-                return await self._process_pdf(file_content)
-            elif file_type == 'image':
-                return await self._process_image(file_content)
-            elif file_type == 'audio':
-                return await self._process_audio(file_content)
-            else:
-                return None
+            output = await asyncio.to_thread(extract_file, file_type, file_path)
         except Exception as e:
             logger.error(f"File processing failed: {e}")
             return None
+        if output is None:
+            return None
+        await asyncio.to_thread(self.cache_extraction, content_hash, file_type, output['text'], output['pages'])
+        return output['text']
     
-    async def _process_pdf(self, file_content: bytes) -> str:
-        """Extrahiert Text aus PDF"""
-        try:
-            # Öffne PDF mit PyMuPDF
-            doc = fitz.open(stream=file_content, filetype="pdf")
-            text_content = []
-            
-            for page_num in range(len(doc)):
-                page = doc.load_page(page_num)
-                text = page.get_text()
-                text_content.append(text)
-            
-            doc.close()
-            
-            # Kombiniere alle Seiten
-            full_text = "\n\n".join(text_content)
-            
-            # Kürze bei sehr langen Texten
-            if len(full_text) > 10000:
-                full_text = full_text[:10000] + "\n\n[Text gekürzt - zu lang für vollständige Anzeige]"
-            
-            return full_text.strip()
-            
-        except Exception as e:
-            logger.error(f"PDF processing failed: {e}")
-            return "PDF konnte nicht verarbeitet werden."
-    
-    async def _process_image(self, file_content: bytes) -> str:
-        """Analysiert Bild mit OCR und Vision"""
-        try:
-            # Öffne Bild mit PIL
-            image = Image.open(io.BytesIO(file_content))
-            
-            # OCR mit Tesseract
-            try:
-                ocr_text = pytesseract.image_to_string(image, lang='deu+eng')
-                ocr_text = ocr_text.strip()
-            except Exception as ocr_error:
-                logger.warning(f"OCR failed: {ocr_error}")
-                ocr_text = ""
-            
-            # Bildbeschreibung (falls Vision API verfügbar)
-            # Hier könnte man GPT-4V oder ähnliches integrieren
-            vision_description = "Bild erfolgreich verarbeitet."
-            
-            # Kombiniere OCR und Vision
-            if ocr_text:
-                result = f"OCR-Text aus Bild:\n{ocr_text}\n\n{vision_description}"
-            else:
-                result = vision_description
-            
-            return result
-            
-        except Exception as e:
-            logger.error(f"Image processing failed: {e}")
-            return "Bild konnte nicht verarbeitet werden."
+    def save_processed_content(self, file_id: str, user_id: str, processed_content: Optional[str]):
+        """Speichert das Ergebnis einer Extraktion in den Datei-Metadaten"""
+        self.storage.update_file(file_id, user_id, {'processed_content': processed_content})
+        self.invalidate_file(file_id)
     
-    async def _process_audio(self, file_content: bytes) -> str:
-        """Transkribiert Audio mit Whisper"""
-        try:
-            # Speichere temporäre Datei
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_file:
-                temp_file.write(file_content)
-                temp_path = temp_file.name
-            
-            try:
-                # Transkribiere mit Whisper
-                model = self._get_whisper_model()
-                result = model.transcribe(temp_path, language="de")
-                transcript = result["text"].strip()
-                
-                return f"Audio-Transkript:\n{transcript}"
-                
-            finally:
-                # Lösche temporäre Datei
-                if os.path.exists(temp_path):
-                    os.unlink(temp_path)
-                    
-        except Exception as e:
-            logger.error(f"Audio processing failed: {e}")
-            return "Audio konnte nicht transkribiert werden."
+    def link_files_to_session(self, file_ids: List[str], user_id: str, session_id: str):
+        """Ordnet bereits hochgeladene Dateien einer Chat-Session zu"""
+        self.storage.link_files(list(file_ids), user_id, session_id)
     
     async def get_file(self, file_id: str, user_id: str) -> Optional[Dict[str, Any]]:
         """Holt eine Datei aus der Datenbank"""
         try:
-            result = self.supabase.table('uploaded_files').select('*').eq('id', file_id).eq('user_id', user_id).execute()
-            
-            if result.data and len(result.data) > 0:
-                return result.data[0]
-            return None
-            
+            return await asyncio.to_thread(self.storage.get_file, file_id, user_id)
+        
         except Exception as e:
             logger.error(f"Get file failed: {e}")
             return None
@@ -268,10 +345,8 @@ class FileUploadHandler:
     async def get_session_files(self, session_id: str, user_id: str) -> list:
         """Holt alle Dateien einer Chat-Session"""
         try:
-            result = self.supabase.table('uploaded_files').select('*').eq('session_id', session_id).eq('user_id', user_id).execute()
-            
-            return result.data or []
-            
+            return await asyncio.to_thread(self.storage.get_session_files, session_id, user_id)
+        
         except Exception as e:
             logger.error(f"Get session files failed: {e}")
             return []
@@ -284,17 +359,22 @@ class FileUploadHandler:
             if not file_info:
                 return False
             
-            # Lösche aus Storage
-            try:
-                self.supabase.storage.from_('files').remove([file_info['storage_path']])
-            except Exception as storage_error:
-                logger.warning(f"Storage deletion failed: {storage_error}")
-            
             # Lösche aus Datenbank
-            result = self.supabase.table('uploaded_files').delete().eq('id', file_id).eq('user_id', user_id).execute()
+            await asyncio.to_thread(self.storage.delete_file, file_id, user_id)
+            self.invalidate_file(file_id)
             
-            return True
+            # Inhalt nicht sofort löschen: ein gleichzeitiger Upload kann ihn gerade wiederverwenden.
+            # Die GC entfernt ihn nach der Karenzzeit, falls dann keine Datei mehr darauf verweist.
+            if self.blob_collector is not None:
+                try:
+                    await asyncio.to_thread(
+                        self.blob_collector.schedule, file_info['storage_path'], file_info.get('content_hash')
+                    )
+                except Exception as storage_error:
+                    logger.warning(f"Scheduling storage deletion failed: {storage_error}")
             
+            return True
+        
         except Exception as e:
             logger.error(f"Delete file failed: {e}")
             return False
@@ -0,0 +1,297 @@
+"""
+Generation Journal Module für Praivio
+Write-behind für Text-Generierungen: lokales Append-only-Journal, Einfügen im Hintergrund
+"""
+
+import base64
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+from database import BaseDatabaseManager
+from database_sharding import TenantUnavailableError
+
+logger = logging.getLogger(__name__)
+
+_CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+def new_ulid() -> str:
+    """ULID: 48 Bit Millisekunden-Zeitstempel + 80 Bit Zufall, 26 Zeichen Crockford-Base32"""
+    value = (int(time.time() * 1000) << 80) | int.from_bytes(os.urandom(10), "big")
+    return "".join(_CROCKFORD[(value >> shift) & 31] for shift in range(125, -1, -5))
+
+class GenerationJournal:
+    """Nimmt Generierungen per Journal-Append an und fügt sie im Hintergrund in die Datenbank ein
+    
+    append() kehrt zurück, sobald der Datensatz im Journal steht (mit fsync auch nach einem
+    Stromausfall). Der Applier liest ab dem gespeicherten Offset und speichert über
+    save_text_generation mit der vorab vergebenen uid; ein erneutes Nachspielen nach einem
+    Absturz erzeugt daher keine Duplikate. Ist alles angewendet, wird das Journal gekürzt.
+    
+    Mehrere API-Prozesse dürfen dasselbe Verzeichnis nutzen: Append, Kürzen und Reparatur
+    laufen unter einem flock auf dem Journal, angewendet wird jeweils nur von einem Prozess
+    (flock auf generations.lock, Offset wird danach neu aus der Datei gelesen).
+    
+    Scheitert ein Eintrag bei erreichbarer Datenbank max_attempts-mal (z.B. nicht
+    entschlüsselbar oder Constraint-Verletzung), wandert er unverändert in die
+    Dead-Letter-Datei und der Applier macht mit dem nächsten weiter. Nicht erreichbare
+    Datenbank und Mandanten-Umzüge zählen nicht als Fehlversuch.
+    """
+    
+    def __init__(self, db_manager: BaseDatabaseManager, journal_dir: str = "./data/journal",
+                 fsync: bool = True, apply_interval_ms: int = 200, batch_size: int = 500,
+                 max_attempts: int = 5, encryptor=None):
+        self.db_manager = db_manager
+        self.fsync = fsync
+        self.apply_interval = apply_interval_ms / 1000
+        self.batch_size = batch_size
+        self.max_attempts = max(1, max_attempts)
+        # Mit Feldverschlüsselung liegen die Datensätze auch im Journal nur verschlüsselt vor
+        self.encryptor = encryptor
+        
+        directory = Path(journal_dir)
+        directory.mkdir(parents=True, exist_ok=True)
+        self.path = directory / "generations.journal"
+        self.offset_path = directory / "generations.offset"
+        self.dead_letter_path = directory / "generations.dead"
+        self.apply_lock_path = directory / "generations.lock"
+        
+        self._lock = threading.Lock()
+        self._apply_lock = threading.Lock()
+        self._file = open(self.path, "ab")
+        self._offset = self._read_offset()
+        self._repair_tail()
+        # Fehlversuche des ersten noch nicht angewendeten Eintrags
+        self._failures = 0
+        
+        self._stop_event = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        self._metrics = {
+            'appended': 0,
+            'applied': 0,
+            'apply_errors': 0,
+            'dead_lettered': 0,
+            'last_error': None,
+            'append_time_ms': 0.0
+        }
+    
+    # Journal
+    @contextmanager
+    def _locked(self):
+        """Exklusiver Zugriff auf die Journal-Datei, auch gegenüber anderen Prozessen"""
+        with self._lock:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+    
+    @contextmanager
+    def _applying(self):
+        """Nur ein Thread bzw. Prozess wendet gleichzeitig an"""
+        with self._apply_lock, open(self.apply_lock_path, "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            # Schließen der Datei gibt den flock frei
+            yield
+    
+    def _read_offset(self) -> int:
+        try:
+            offset = int(self.offset_path.read_text().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            offset = 0
+        # Absturz zwischen Kürzen und Offset-Schreiben: Journal ist leer, Offset veraltet
+        return offset if offset <= self.path.stat().st_size else 0
+    
+    def _write_offset(self, offset: int):
+        tmp_path = self.offset_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            f.write(str(offset))
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, self.offset_path)
+        self._offset = offset
+    
+    def _repair_tail(self):
+        """Entfernt eine unvollständige letzte Zeile (Absturz während des Schreibens)"""
+        with self._locked():
+            self._truncate_partial_tail()
+    
+    def _truncate_partial_tail(self):
+        size = self.path.stat().st_size
+        valid = size
+        with open(self.path, "rb") as f:
+            # Rückwärts bis zum letzten Zeilenende suchen
+            while valid > 0:
+                start = max(valid - 65536, 0)
+                f.seek(start)
+                chunk = f.read(valid - start)
+                cut = chunk.rfind(b"\n")
+                if cut >= 0:
+                    valid = start + cut + 1
+                    break
+                valid = start
+        if valid == size:
+            return
+        logger.warning(f"Truncating incomplete generation journal record ({size - valid} bytes)")
+        self._file.truncate(valid)
+    
+    def _encode(self, record: Dict[str, Any]) -> bytes:
+        payload = json.dumps(record, ensure_ascii=False, default=str)
+        if self.encryptor is not None:
+            sealed = self.encryptor.encrypt_fields(record['user_id'], {'journal': payload})['journal']
+            payload = json.dumps({
+                'uid': record['uid'],
+                'user_id': record['user_id'],
+                'sealed': base64.b64encode(sealed).decode("ascii")
+            })
+        return payload.encode("utf-8") + b"\n"
+    
+    def _decode(self, line: bytes) -> Dict[str, Any]:
+        record = json.loads(line)
+        if 'sealed' in record:
+            row = {'user_id': record['user_id'], 'journal': base64.b64decode(record['sealed'])}
+            self.encryptor.decrypt_rows([row], ['journal'])
+            record = json.loads(row['journal'])
+        return record
+    
+    def append(self, record: Dict[str, Any]) -> str:
+        """Schreibt eine Generierung (Argumente von save_text_generation) ins Journal, liefert die uid"""
+        record = dict(record)
+        record.setdefault('uid', new_ulid())
+        # Zeitpunkt der Generierung, nicht des späteren Einfügens
+        record.setdefault('created_at', datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"))
+        line = self._encode(record)
+        
+        started = time.perf_counter()
+        with self._locked():
+            self._file.write(line)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._metrics['appended'] += 1
+            self._metrics['append_time_ms'] += (time.perf_counter() - started) * 1000
+        return record['uid']
+    
+    # Applier
+    def start(self):
+        """Startet den Applier; spielt zuerst noch nicht angewendete Einträge nach"""
+        if self._worker is not None:
+            return
+        self._stop_event.clear()
+        
+        def run():
+            while not self._stop_event.is_set():
+                try:
+                    self.apply_pending()
+                except Exception as e:
+                    logger.error(f"Generation journal apply failed: {e}")
+                self._stop_event.wait(self.apply_interval)
+        
+        self._worker = threading.Thread(target=run, name="generation-journal", daemon=True)
+        self._worker.start()
+    
+    def stop(self):
+        """Stoppt den Applier und wendet alle verbleibenden Einträge an"""
+        if self._worker is not None:
+            self._stop_event.set()
+            self._worker.join(30)
+            self._worker = None
+        try:
+            self.apply_pending()
+        except Exception as e:
+            logger.error(f"Generation journal final apply failed, entries stay in {self.path}: {e}")
+        with self._lock:
+            self._file.close()
+    
+    def apply_pending(self) -> int:
+        """Fügt alle vollständigen Einträge ab dem gespeicherten Offset ein"""
+        applied = 0
+        with self._applying():
+            # Ein anderer Prozess kann seit dem letzten Lauf angewendet oder gekürzt haben
+            self._offset = self._read_offset()
+            while True:
+                with open(self.path, "rb") as f:
+                    f.seek(self._offset)
+                    lines = []
+                    for line in f:
+                        if not line.endswith(b"\n") or len(lines) >= self.batch_size:
+                            break
+                        lines.append(line)
+                if not lines:
+                    break
+                
+                offset, batch_applied = self._offset, 0
+                try:
+                    for line in lines:
+                        try:
+                            self.db_manager.save_text_generation(**self._decode(line))
+                            batch_applied += 1
+                        except Exception as e:
+                            self._metrics['apply_errors'] += 1
+                            self._metrics['last_error'] = str(e)
+                            if not self._give_up(e):
+                                raise
+                            self._dead_letter(line, offset, e)
+                        self._failures = 0
+                        offset += len(line)
+                finally:
+                    if offset != self._offset:
+                        self._write_offset(offset)
+                        self._metrics['applied'] += batch_applied
+                        applied += batch_applied
+            
+            # Alles angewendet: Journal kürzen, solange kein Append läuft (auch in anderen Prozessen)
+            with self._locked():
+                if self._offset and self._offset == self.path.stat().st_size:
+                    self._file.truncate(0)
+                    self._write_offset(0)
+        return applied
+    
+    def _give_up(self, error: Exception) -> bool:
+        """Zählt einen Fehlversuch des ersten offenen Eintrags; True, wenn er aussortiert wird"""
+        if isinstance(error, TenantUnavailableError):
+            # Umzug läuft: später erneut versuchen
+            return False
+        try:
+            reachable = self.db_manager.ping()
+        except Exception:
+            reachable = False
+        if not reachable:
+            # Liegt an der Datenbank, nicht am Eintrag
+            return False
+        self._failures += 1
+        return self._failures >= self.max_attempts
+    
+    def _dead_letter(self, line: bytes, offset: int, error: Exception):
+        """Legt einen dauerhaft fehlschlagenden Eintrag unverändert (ggf. verschlüsselt) beiseite"""
+        with open(self.dead_letter_path, "ab") as f:
+            f.write(line)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        self._metrics['dead_lettered'] += 1
+        logger.error(
+            f"Moved generation journal record at offset {offset} to {self.dead_letter_path} "
+            f"after {self._failures} attempts: {error}"
+        )
+    
+    def pending_bytes(self) -> int:
+        return self.path.stat().st_size - self._offset
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            **self._metrics,
+            'pending_bytes': self.pending_bytes(),
+            'avg_append_ms': (
+                round(self._metrics['append_time_ms'] / self._metrics['appended'], 3)
+                if self._metrics['appended'] else 0
+            )
+        }
@@ -0,0 +1,328 @@
+"""
+Migrations Module für Praivio
+Gemeinsames Schema und Migrationen für alle Speicher-Backends (SQLite, PostgreSQL)
+"""
+
+from typing import Any, List, Tuple
+
+# Länge der Vorschau der letzten Nachricht in chat_sessions
+CHAT_PREVIEW_LENGTH = 120
+
+# Dialekt-spezifische Bausteine, die in den Statements als {platzhalter} stehen
+DIALECTS = {
+    'sqlite': {
+        'pk': 'INTEGER PRIMARY KEY AUTOINCREMENT',
+        'true': '1',
+        'false': '0',
+        'real': 'REAL',
+        # SQLite ist dynamisch typisiert, Supabase-IDs landen trotzdem in INTEGER-Spalten
+        'user_ref': 'INTEGER',
+        'user_fk': ',\n                FOREIGN KEY (user_id) REFERENCES users (id)',
+        # SQLite hat eine implizite rowid
+        'message_rowid': '',
+        'blob': 'BLOB',
+        'preview_length': str(CHAT_PREVIEW_LENGTH)
+    },
+    'postgresql': {
+        'pk': 'BIGSERIAL PRIMARY KEY',
+        'true': 'TRUE',
+        'false': 'FALSE',
+        'real': 'DOUBLE PRECISION',
+        # Supabase-User-IDs sind UUIDs, daher TEXT ohne Fremdschlüssel auf users
+        'user_ref': 'TEXT',
+        'user_fk': '',
+        # Explizite Spalte, damit Reihenfolge-Abfragen auf cm.rowid in beiden Dialekten gleich bleiben
+        'message_rowid': 'rowid BIGSERIAL NOT NULL,',
+        'blob': 'BYTEA',
+        'preview_length': str(CHAT_PREVIEW_LENGTH)
+    }
+}
+
+# Basisschema, idempotent (CREATE ... IF NOT EXISTS), in Abhängigkeitsreihenfolge
+SCHEMA = [
+    # Rollen-Tabelle
+    """
+    CREATE TABLE IF NOT EXISTS roles (
+        id {pk},
+        name TEXT UNIQUE NOT NULL,
+        description TEXT,
+        permissions TEXT,  -- JSON string of permissions
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # Organisationen-Tabelle
+    """
+    CREATE TABLE IF NOT EXISTS organizations (
+        id {pk},
+        name TEXT NOT NULL,
+        type TEXT NOT NULL,  -- 'hospital', 'law_firm', 'government', etc.
+        address TEXT,
+        contact_person TEXT,
+        contact_email TEXT,
+        is_active BOOLEAN DEFAULT {true},
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # Erweiterte Benutzer-Tabelle
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id {pk},
+        username TEXT UNIQUE NOT NULL,
+        email TEXT UNIQUE,
+        password_hash TEXT NOT NULL,
+        password_salt TEXT NOT NULL,
+        role_id INTEGER NOT NULL,
+        organization_id INTEGER NOT NULL,
+        is_active BOOLEAN DEFAULT {true},
+        last_login TIMESTAMP,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (role_id) REFERENCES roles (id),
+        FOREIGN KEY (organization_id) REFERENCES organizations (id)
+    )
+    """,
+    # Erweiterte Text-Generierungen-Tabelle
+    """
+    CREATE TABLE IF NOT EXISTS text_generations (
+        id {pk},
+        user_id {user_ref} NOT NULL,
+        prompt TEXT NOT NULL,
+        generated_text TEXT NOT NULL,
+        model_used TEXT NOT NULL,
+        tokens_used INTEGER,
+        processing_time {real},
+        template_used TEXT,
+        context TEXT,
+        is_encrypted BOOLEAN DEFAULT {false},
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP{user_fk}
+    )
+    """,
+    # Erweiterte Audit-Logs-Tabelle
+    """
+    CREATE TABLE IF NOT EXISTS audit_logs (
+        id {pk},
+        user_id {user_ref},
+        action TEXT NOT NULL,
+        details TEXT,
+        ip_address TEXT,
+        user_agent TEXT,
+        success BOOLEAN DEFAULT {true},
+        error_message TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP{user_fk}
+    )
+    """,
+    # Sessions-Tabelle für JWT-Token-Management
+    """
+    CREATE TABLE IF NOT EXISTS user_sessions (
+        id {pk},
+        user_id INTEGER NOT NULL,
+        session_token TEXT UNIQUE NOT NULL,
+        expires_at TIMESTAMP NOT NULL,
+        ip_address TEXT,
+        user_agent TEXT,
+        is_active BOOLEAN DEFAULT {true},
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    """,
+    # Rate Limiting-Tabelle
+    """
+    CREATE TABLE IF NOT EXISTS rate_limits (
+        id {pk},
+        user_id INTEGER NOT NULL,
+        endpoint TEXT NOT NULL,
+        request_count INTEGER DEFAULT 1,
+        window_start TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    """,
+    # Chat-Sessions-Tabelle
+    """
+    CREATE TABLE IF NOT EXISTS chat_sessions (
+        id TEXT PRIMARY KEY,
+        user_id TEXT NOT NULL,  -- Changed from INTEGER to TEXT for Supabase user IDs
+        title TEXT NOT NULL,
+        model TEXT NOT NULL,
+        system_prompt TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # Chat-Messages-Tabelle
+    """
+    CREATE TABLE IF NOT EXISTS chat_messages (
+        id TEXT PRIMARY KEY,
+        {message_rowid}
+        chat_session_id TEXT NOT NULL,
+        role TEXT NOT NULL CHECK (role IN ('user', 'assistant')),
+        content TEXT NOT NULL,
+        generation_id TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (chat_session_id) REFERENCES chat_sessions (id) ON DELETE CASCADE
+    )
+    """,
+    # Versiegelte Audit-Partitionen (Archiv-Segmente pro Monat)
+    """
+    CREATE TABLE IF NOT EXISTS audit_partitions (
+        id {pk},
+        period TEXT NOT NULL,  -- 'YYYY-MM'
+        segment INTEGER NOT NULL,
+        archive_path TEXT NOT NULL,
+        row_count INTEGER NOT NULL,
+        min_id INTEGER,
+        max_id INTEGER,
+        sha256 TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'sealed',  -- 'sealed', 'expired'
+        sealed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE (period, segment)
+    )
+    """,
+    # Indizes
+    "CREATE INDEX IF NOT EXISTS idx_audit_logs_created_at ON audit_logs (created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_audit_logs_user_created ON audit_logs (user_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_audit_logs_action_created ON audit_logs (action, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_audit_logs_success_created ON audit_logs (success, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_text_generations_user_created ON text_generations (user_id, created_at)",
+    """
+    CREATE INDEX IF NOT EXISTS idx_text_generations_user_model_created
+    ON text_generations (user_id, model_used, created_at)
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_chat_sessions_user_updated ON chat_sessions (user_id, updated_at, id)"
+]
+
+# Schema-Migrationen: (Version, Name, SQL-Statements), je Migration eine explizite Transaktion
+# (SQLite: BEGIN/COMMIT im Autocommit-Modus, VACUUM danach außerhalb)
+MIGRATIONS: List[Tuple[int, str, List[Any]]] = [
+    (1, "chat_session_counters", [
+        "ALTER TABLE chat_sessions ADD COLUMN message_count INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE chat_sessions ADD COLUMN last_message_at TIMESTAMP",
+        "ALTER TABLE chat_sessions ADD COLUMN last_message_preview TEXT",
+        # Backfill aus bestehenden Nachrichten
+        """
+        UPDATE chat_sessions SET
+            message_count = (
+                SELECT COUNT(*) FROM chat_messages cm WHERE cm.chat_session_id = chat_sessions.id
+            ),
+            last_message_at = (
+                SELECT MAX(cm.timestamp) FROM chat_messages cm WHERE cm.chat_session_id = chat_sessions.id
+            ),
+            last_message_preview = (
+                SELECT substr(cm.content, 1, {preview_length}) FROM chat_messages cm
+                WHERE cm.chat_session_id = chat_sessions.id
+                ORDER BY cm.timestamp DESC, cm.rowid DESC
+                LIMIT 1
+            )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_chat_messages_session ON chat_messages (chat_session_id, timestamp)"
+    ]),
+    (2, "text_compression", [
+        # Bitmaske der komprimierten Textspalten (siehe text_codec.py), 0 = Klartext
+        "ALTER TABLE text_generations ADD COLUMN codec_flags INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE chat_messages ADD COLUMN codec_flags INTEGER NOT NULL DEFAULT 0",
+        # Trainierte Wörterbücher; bei Sharding liegt jede Organisation in eigener Datei
+        """
+        CREATE TABLE IF NOT EXISTS compression_dictionaries (
+            id INTEGER PRIMARY KEY,  -- inhaltsbasierte ID, steht im Header komprimierter Werte
+            algorithm TEXT NOT NULL,
+            data {blob} NOT NULL,
+            sample_count INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    ]),
+    (3, "organization_keys", [
+        # Datenschlüssel pro Organisation, mit dem Master-Key verpackt (AES-GCM)
+        """
+        CREATE TABLE IF NOT EXISTS organization_keys (
+            organization_id INTEGER PRIMARY KEY,  -- 0 = Benutzer ohne Organisationszuordnung
+            wrapped_key {blob} NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    ]),
+    (4, "text_generation_uid", [
+        # Vorab vergebene ULID, macht das Nachspielen des Generierungs-Journals idempotent
+        "ALTER TABLE text_generations ADD COLUMN uid TEXT",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_text_generations_uid ON text_generations (uid)"
+    ]),
+    (5, "incremental_auto_vacuum", [
+        # Freie Seiten (gelöschte Chats) gibt die Wartung schrittweise per incremental_vacuum zurück.
+        # Bestandsdateien übernehmen den Modus erst mit einem VACUUM; das schreibt die ganze Datei neu
+        # und läuft deshalb nicht beim Start, sondern als Wartungsaufgabe enable_auto_vacuum im
+        # Ruhefenster (db_maintenance.py). PostgreSQL nutzt Autovacuum.
+        {'sqlite': "PRAGMA auto_vacuum = INCREMENTAL"}
+    ]),
+    (6, "extraction_cache", [
+        # Extrahierter Text hochgeladener Dateien nach Inhalt (SHA-256) und Extraktor-Version
+        """
+        CREATE TABLE IF NOT EXISTS extraction_cache (
+            content_hash TEXT NOT NULL,
+            processor TEXT NOT NULL,  -- z.B. 'pdf:pymupdf-1', siehe file_extraction.PROCESSOR_VERSIONS
+            result TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (content_hash, processor)
+        )
+        """
+    ]),
+    (7, "uploaded_files", [
+        # Metadaten hochgeladener Dateien bei lokaler Ablage (FILE_STORAGE_BACKEND=local)
+        """
+        CREATE TABLE IF NOT EXISTS uploaded_files (
+            id TEXT PRIMARY KEY,
+            filename TEXT NOT NULL,
+            file_type TEXT NOT NULL CHECK (file_type IN ('pdf', 'image', 'audio')),
+            file_size INTEGER NOT NULL,
+            content_type TEXT NOT NULL,
+            storage_path TEXT NOT NULL,
+            content_hash TEXT,
+            user_id TEXT NOT NULL,
+            session_id TEXT,
+            processed_content TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_uploaded_files_user_session ON uploaded_files (user_id, session_id)",
+        "CREATE INDEX IF NOT EXISTS idx_uploaded_files_content_hash ON uploaded_files (content_hash)"
+    ]),
+    (8, "pdf_pages", [
+        # Vollständiger Text pro PDF-Seite, wie extraction_cache nach Inhalt und Extraktor-Version
+        """
+        CREATE TABLE IF NOT EXISTS pdf_pages (
+            content_hash TEXT NOT NULL,
+            processor TEXT NOT NULL,
+            page_number INTEGER NOT NULL,  -- 1-basiert
+            text TEXT NOT NULL,
+            PRIMARY KEY (content_hash, processor, page_number)
+        )
+        """
+    ]),
+]
+
+def render(statement: str, dialect: str) -> str:
+    """Setzt die Dialekt-Bausteine in ein Statement ein"""
+    return statement.format(**DIALECTS[dialect])
+
+def schema_statements(dialect: str) -> List[str]:
+    """Basisschema für einen Dialekt"""
+    return [render(statement, dialect) for statement in SCHEMA]
+
+def pending_migrations(current_version: int, dialect: str) -> List[Tuple[int, str, List[str]]]:
+    """Noch nicht angewendete Migrationen für einen Dialekt
+    
+    Ein Statement kann auch ein Dict {dialekt: statement} sein; fehlt der Dialekt, entfällt es.
+    """
+    return [
+        (version, name, [
+            render(statement, dialect) for statement in (
+                entry.get(dialect) if isinstance(entry, dict) else entry for entry in statements
+            ) if statement
+        ])
+        for version, name, statements in MIGRATIONS
+        if version > current_version
+    ]
+
+def latest_version() -> int:
+    """Höchste bekannte Schema-Version"""
+    return max((version for version, _, _ in MIGRATIONS), default=0)
@@ -75,7 +75,8 @@ class TextGenerationRequest(BaseModel):
 
 class TextGenerationResponse(BaseModel):
     """Modell für Text-Generierungs-Response"""
-    id: int
+    id: Optional[int] = None  # None im Write-behind-Modus, bis der Datensatz eingefügt ist
+    uid: Optional[str] = None  # vorab vergebene ULID
     generated_text: str
     model_name: str
     tokens_used: int
@@ -152,6 +153,10 @@ class OrganizationResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class TenantMoveRequest(BaseModel):
+    """Modell für das Verschieben einer Organisation auf einen anderen Shard"""
+    shard: str = Field(..., pattern=r"^[a-z0-9_-]{1,64}$", description="Ziel-Shard")
+
 class RoleResponse(BaseModel):
     """Modell für Rollen-Response"""
     id: int
@@ -171,6 +176,7 @@ class HealthCheckResponse(BaseModel):
     services: Dict[str, str]
     database: str
     ollama: str
+    maintenance: Optional[Dict[str, Any]] = None  # letzte Läufe der Datenbankwartung
 
 class ErrorResponse(BaseModel):
     """Modell für Fehler-Response"""
@@ -213,6 +219,8 @@ class ChatSessionResponse(BaseModel):
     model: str
     system_prompt: Optional[str]
     message_count: int
+    last_message_at: Optional[datetime] = None
+    last_message_preview: Optional[str] = None
     created_at: datetime
     updated_at: datetime
     
@@ -238,6 +246,8 @@ class ChatSessionWithMessages(BaseModel):
     model: str
     system_prompt: Optional[str]
     messages: List[ChatMessage]
+    has_more: bool = Field(False, description="Ältere Nachrichten vorhanden")
+    next_before: Optional[str] = Field(None, description="Cursor für ältere Nachrichten")
     created_at: datetime
     updated_at: datetime
     
@@ -0,0 +1,181 @@
+"""
+Statistics Cache Module für Praivio
+In-Memory-Cache für Dashboard-Statistiken mit schreibgesteuerter Invalidierung
+"""
+
+import asyncio
+import copy
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+
+from database import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+class StatisticsCache:
+    """Cache für Statistik-Payloads pro Benutzer und systemweit"""
+
+    GLOBAL_KEY = "__global__"
+
+    def __init__(self, db_manager: DatabaseManager, max_age: float = 300.0):
+        self.db_manager = db_manager
+        self.max_age = max_age
+
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._versions: Dict[str, int] = {}
+        self._compute_locks: Dict[str, threading.Lock] = {}
+        self._subscribers: Dict[str, set] = {}
+
+        # Metriken
+        self.hits = 0
+        self.misses = 0
+
+        db_manager.add_write_listener(self._on_write)
+
+    def _key(self, user_id: Optional[str]) -> str:
+        return str(user_id) if user_id else self.GLOBAL_KEY
+
+    def _is_fresh(self, entry: Optional[Dict[str, Any]]) -> bool:
+        if not entry:
+            return False
+        # Tageswechsel (UTC, wie DATE('now') in SQLite) macht "heute"-Zähler ungültig
+        if entry['day'] != datetime.utcnow().date():
+            return False
+        return time.monotonic() - entry['computed_at'] < self.max_age
+
+    def get(self, user_id: Optional[str] = None) -> Dict[str, Any]:
+        """Liefert die Statistiken aus dem Cache oder berechnet sie genau einmal neu"""
+        key = self._key(user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if self._is_fresh(entry):
+                self.hits += 1
+                return entry['stats']
+            compute_lock = self._compute_locks.setdefault(key, threading.Lock())
+
+        # Single-Flight: parallele Anfragen warten auf dieselbe Berechnung
+        with compute_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if self._is_fresh(entry):
+                    self.hits += 1
+                    return entry['stats']
+                self.misses += 1
+                version = self._versions.get(key, 0)
+
+            stats = self.db_manager.get_statistics(user_id)
+
+            with self._lock:
+                # Nur übernehmen, wenn während der Berechnung nichts geschrieben wurde
+                if self._versions.get(key, 0) == version:
+                    self._entries[key] = {
+                        'stats': stats,
+                        'computed_at': time.monotonic(),
+                        'day': datetime.utcnow().date()
+                    }
+            return stats
+
+    def version(self, user_id: Optional[str] = None) -> int:
+        """Aktuelle Version des Eintrags (wird bei jeder Änderung erhöht)"""
+        with self._lock:
+            return self._versions.get(self._key(user_id), 0)
+
+    def invalidate(self, user_id: Optional[str] = None):
+        """Verwirft den Eintrag eines Benutzers und den globalen Eintrag"""
+        keys = {self.GLOBAL_KEY}
+        if user_id:
+            keys.add(self._key(user_id))
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+                self._versions[key] = self._versions.get(key, 0) + 1
+        self._notify(keys)
+
+    def invalidate_all(self):
+        """Verwirft alle Einträge"""
+        with self._lock:
+            keys = set(self._entries) | set(self._subscribers) | {self.GLOBAL_KEY}
+            self._entries.clear()
+            for key in keys:
+                self._versions[key] = self._versions.get(key, 0) + 1
+        self._notify(keys)
+
+    def _increment_audit_events(self, count: int):
+        """Aktualisiert audit_events_today inkrementell in allen Einträgen"""
+        today = datetime.utcnow().date()
+        with self._lock:
+            keys = set(self._entries) | set(self._subscribers)
+            for key, entry in self._entries.items():
+                if entry['day'] != today:
+                    continue
+                stats = copy.copy(entry['stats'])
+                stats['audit_events_today'] += count
+                entry['stats'] = stats
+            for key in keys:
+                self._versions[key] = self._versions.get(key, 0) + 1
+        self._notify(keys)
+
+    def _on_write(self, table: str, rows: List[Dict[str, Any]]):
+        """Write-Listener des DatabaseManagers"""
+        if table == 'text_generations':
+            for user_id in {row.get('user_id') for row in rows}:
+                self.invalidate(user_id)
+        elif table == 'audit_logs':
+            # Fehlgeschlagene Generierungen beeinflussen die Erfolgsrate
+            failed_users = {
+                row.get('user_id') for row in rows
+                if not row.get('success', True) and str(row.get('action', '')).lower() == 'text_generation'
+            }
+            for user_id in failed_users:
+                self.invalidate(user_id)
+            self._increment_audit_events(len(rows))
+        elif table == 'users':
+            self.invalidate_all()
+
+    def _notify(self, keys):
+        with self._lock:
+            waiters = [waiter for key in keys for waiter in self._subscribers.get(key, ())]
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # Event-Loop wurde bereits geschlossen
+                pass
+
+    async def wait_for_change(self, user_id: Optional[str], version: int, timeout: float) -> int:
+        """Wartet, bis sich die Version des Eintrags ändert oder der Timeout abläuft"""
+        key = self._key(user_id)
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            current = self._versions.get(key, 0)
+            if current != version:
+                return current
+            self._subscribers.setdefault(key, set()).add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                subscribers = self._subscribers.get(key)
+                if subscribers is not None:
+                    subscribers.discard(waiter)
+                    if not subscribers:
+                        del self._subscribers[key]
+        return self.version(user_id)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Liefert Cache-Metriken"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'subscribers': sum(len(s) for s in self._subscribers.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 3) if total else 0.0
+            }
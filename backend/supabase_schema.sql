@@ -9,6 +9,7 @@ CREATE TABLE IF NOT EXISTS uploaded_files (
     file_size INTEGER NOT NULL CHECK (file_size > 0),
     content_type TEXT NOT NULL,
     storage_path TEXT NOT NULL,
+    content_hash TEXT,  -- SHA-256 des Inhalts, Uploads gleichen Inhalts teilen sich storage_path
     user_id TEXT NOT NULL,
     session_id TEXT,
     processed_content TEXT,
@@ -21,6 +22,10 @@ CREATE INDEX IF NOT EXISTS idx_uploaded_files_user_id ON uploaded_files(user_id)
 CREATE INDEX IF NOT EXISTS idx_uploaded_files_session_id ON uploaded_files(session_id);
 CREATE INDEX IF NOT EXISTS idx_uploaded_files_created_at ON uploaded_files(created_at);
 
+-- Bestehende Installationen: inhaltsadressierte Ablage (Deduplikation)
+ALTER TABLE uploaded_files ADD COLUMN IF NOT EXISTS content_hash TEXT;
+CREATE INDEX IF NOT EXISTS idx_uploaded_files_content_hash ON uploaded_files(content_hash);
+
 -- Erstelle RLS (Row Level Security) Policies
 ALTER TABLE uploaded_files ENABLE ROW LEVEL SECURITY;
 
@@ -0,0 +1,145 @@
+"""
+Text Codec Module für Praivio
+Transparente Kompression großer Textspalten (zlib oder zstd, optional mit trainiertem Wörterbuch)
+"""
+
+import hashlib
+import logging
+import threading
+import zlib
+from collections import Counter
+from typing import Optional, List, Dict, Any, Callable, Tuple
+
+try:
+    import zstandard
+except ImportError:  # optionale Abhängigkeit
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Erstes Byte eines komprimierten Werts
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+CODEC_ZLIB_DICT = 3
+CODEC_ZSTD_DICT = 4
+
+# Bits der Spalte codec_flags: welche Spalten einer Zeile komprimiert sind
+TEXT_GENERATION_COLUMNS = {'prompt': 1, 'generated_text': 2, 'context': 4}
+CHAT_MESSAGE_COLUMNS = {'content': 1}
+
+# zlib nutzt höchstens die letzten 32 KB eines Wörterbuchs
+MAX_DICTIONARY_SIZE = 32 * 1024
+
+def dictionary_id(data: bytes) -> int:
+    """Inhaltsbasierte ID eines Wörterbuchs (gleich in allen Shards, 31 Bit)"""
+    return int.from_bytes(hashlib.sha256(data).digest()[:4], "big") & 0x7FFFFFFF
+
+def decode_text(value: Any, get_dictionary: Callable[[int], bytes]) -> str:
+    """Dekomprimiert einen mit TextCodec.encode geschriebenen Wert"""
+    if isinstance(value, str) or value is None:
+        return value
+    data = bytes(value)
+    codec = data[0]
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(data[1:]).decode("utf-8")
+    if codec == CODEC_ZLIB_DICT:
+        decompressor = zlib.decompressobj(zdict=get_dictionary(int.from_bytes(data[1:5], "big")))
+        return (decompressor.decompress(data[5:]) + decompressor.flush()).decode("utf-8")
+    if zstandard is None:
+        raise RuntimeError("zstd-komprimierte Daten gefunden, aber das Paket 'zstandard' ist nicht installiert")
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdDecompressor().decompress(data[1:]).decode("utf-8")
+    if codec == CODEC_ZSTD_DICT:
+        dictionary = zstandard.ZstdCompressionDict(get_dictionary(int.from_bytes(data[1:5], "big")))
+        return zstandard.ZstdDecompressor(dict_data=dictionary).decompress(data[5:]).decode("utf-8")
+    raise ValueError(f"Unbekannter Text-Codec: {codec}")
+
+def decode_row(row: Dict[str, Any], columns: Dict[str, int], get_dictionary: Callable[[int], bytes]) -> Dict[str, Any]:
+    """Dekomprimiert die per codec_flags markierten Spalten einer Zeile"""
+    flags = row.pop('codec_flags', 0) or 0
+    if flags:
+        for column, bit in columns.items():
+            if flags & bit and column in row:
+                row[column] = decode_text(row[column], get_dictionary)
+    return row
+
+class TextCodec:
+    """Kodiert Texte oberhalb eines Schwellwerts komprimiert"""
+    
+    ALGORITHMS = ('zlib', 'zstd')
+    
+    def __init__(self, algorithm: str = "zlib", threshold: int = 1024, level: Optional[int] = None,
+                 use_dictionary: bool = False):
+        if algorithm not in self.ALGORITHMS:
+            raise ValueError(f"Unbekannter Kompressionsalgorithmus: {algorithm}")
+        if algorithm == "zstd" and zstandard is None:
+            logger.warning("Paket 'zstandard' nicht installiert, Textkompression nutzt zlib")
+            algorithm = "zlib"
+        self.algorithm = algorithm
+        self.threshold = threshold
+        self.level = level if level is not None else (6 if algorithm == "zlib" else 9)
+        self.use_dictionary = use_dictionary
+        # zstd-Kompressoren sind nicht threadsicher
+        self._local = threading.local()
+    
+    def encode(self, text: Optional[str], dictionary: Optional[Tuple[int, bytes]] = None) -> Tuple[Any, bool]:
+        """Liefert (Wert, komprimiert); kleine oder schlecht komprimierbare Texte bleiben unverändert"""
+        if text is None:
+            return None, False
+        raw = text.encode("utf-8")
+        if len(raw) < self.threshold:
+            return text, False
+        
+        if not self.use_dictionary:
+            dictionary = None
+        if self.algorithm == "zstd":
+            header, payload = self._zstd_compress(raw, dictionary)
+        elif dictionary:
+            compressor = zlib.compressobj(self.level, zdict=dictionary[1])
+            header = bytes([CODEC_ZLIB_DICT]) + dictionary[0].to_bytes(4, "big")
+            payload = compressor.compress(raw) + compressor.flush()
+        else:
+            header, payload = bytes([CODEC_ZLIB]), zlib.compress(raw, self.level)
+        
+        encoded = header + payload
+        # Nur speichern, wenn sich die Kompression lohnt
+        if len(encoded) > len(raw) * 0.9:
+            return text, False
+        return encoded, True
+    
+    def _zstd_compress(self, raw: bytes, dictionary: Optional[Tuple[int, bytes]]) -> Tuple[bytes, bytes]:
+        compressors = getattr(self._local, "compressors", None)
+        if compressors is None:
+            compressors = self._local.compressors = {}
+        key = dictionary[0] if dictionary else None
+        compressor = compressors.get(key)
+        if compressor is None:
+            dict_data = zstandard.ZstdCompressionDict(dictionary[1]) if dictionary else None
+            compressor = compressors[key] = zstandard.ZstdCompressor(level=self.level, dict_data=dict_data)
+        if dictionary:
+            return bytes([CODEC_ZSTD_DICT]) + dictionary[0].to_bytes(4, "big"), compressor.compress(raw)
+        return bytes([CODEC_ZSTD]), compressor.compress(raw)
+    
+    def train_dictionary(self, samples: List[str], size: int = MAX_DICTIONARY_SIZE) -> Optional[bytes]:
+        """Trainiert ein Wörterbuch aus Beispieltexten (z.B. wiederkehrende Briefköpfe und Formeln)"""
+        encoded = [sample.encode("utf-8") for sample in samples if sample]
+        if len(encoded) < 8:
+            return None
+        if self.algorithm == "zstd":
+            try:
+                return zstandard.train_dictionary(size, encoded).as_bytes()
+            except zstandard.ZstdError as e:
+                logger.warning(f"zstd dictionary training failed: {e}")
+                return None
+        
+        # zlib: häufige Zeilen, die in mehreren Texten vorkommen; die häufigsten ans Ende
+        counts = Counter(
+            line for sample in encoded for line in set(sample.splitlines()) if len(line) >= 16
+        )
+        common = [line for line, count in counts.most_common() if count > 1]
+        dictionary = b""
+        for line in common:
+            if len(dictionary) + len(line) + 1 > size:
+                break
+            dictionary = line + b"\n" + dictionary
+        return dictionary or None
@@ -0,0 +1,81 @@
+"""
+Text Recompression Module für Praivio
+Hintergrundjob, der Bestandszeilen mit dem konfigurierten Text-Codec komprimiert
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Optional, Dict, Any
+
+from database import BaseDatabaseManager
+
+logger = logging.getLogger(__name__)
+
+class TextRecompressor:
+    """Komprimiert unkomprimierte Bestandszeilen in kleinen Batches"""
+    
+    def __init__(self, db_manager: BaseDatabaseManager, batch_size: int = 200):
+        self.db_manager = db_manager
+        self.batch_size = batch_size
+        
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        self._metrics: Dict[str, Any] = {
+            'runs': 0,
+            'rows_compressed': {},
+            'last_run_at': None,
+            'last_duration_ms': None,
+            'last_error': None
+        }
+    
+    def start(self, interval_hours: float = 24.0):
+        """Startet die periodische Nachkompression im Hintergrund"""
+        if self._worker is not None:
+            return
+        self._stop_event.clear()
+        
+        def run():
+            while not self._stop_event.is_set():
+                try:
+                    self.run_once()
+                except Exception as e:
+                    logger.error(f"Text recompression run failed: {e}")
+                self._stop_event.wait(interval_hours * 3600)
+        
+        self._worker = threading.Thread(target=run, name="text-recompression", daemon=True)
+        self._worker.start()
+    
+    def stop(self):
+        """Stoppt den Hintergrund-Thread"""
+        if self._worker is None:
+            return
+        self._stop_event.set()
+        self._worker.join(30)
+        self._worker = None
+    
+    def run_once(self) -> Dict[str, int]:
+        """Ein Durchlauf über alle Tabellen (bzw. Shards)"""
+        with self._lock:
+            started = time.perf_counter()
+            try:
+                counts = self.db_manager.recompress_text_columns(self.batch_size)
+            except Exception as e:
+                self._metrics['last_error'] = str(e)
+                raise
+            
+            self._metrics['runs'] += 1
+            self._metrics['last_run_at'] = datetime.now().isoformat()
+            self._metrics['last_duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+            self._metrics['last_error'] = None
+            for table, count in counts.items():
+                self._metrics['rows_compressed'][table] = self._metrics['rows_compressed'].get(table, 0) + count
+            if any(counts.values()):
+                logger.info(f"Recompressed text columns: {counts}")
+            return counts
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Kennzahlen für /admin/metrics"""
+        return {**self._metrics, 'rows_compressed': dict(self._metrics['rows_compressed'])}
@@ -0,0 +1,125 @@
+"""
+Upload Intake Module für Praivio
+Nimmt Uploads blockweise mit begrenztem Speicher an: Spool-Datei, SHA-256 und Typerkennung per Magic Bytes
+"""
+
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+class UploadTooLargeError(ValueError):
+    """Upload überschreitet die Größengrenze seines Dateityps"""
+
+def sniff_file_type(head: bytes) -> Optional[Tuple[str, str]]:
+    """Erkennt (file_type, content_type) an den ersten Bytes einer Datei"""
+    if head.startswith(b"%PDF-"):
+        return 'pdf', 'application/pdf'
+    if head.startswith(b"\xff\xd8\xff"):
+        return 'image', 'image/jpeg'
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return 'image', 'image/png'
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return 'image', 'image/gif'
+    if head.startswith(b"RIFF") and head[8:12] == b"WEBP":
+        return 'image', 'image/webp'
+    if head.startswith(b"RIFF") and head[8:12] == b"WAVE":
+        return 'audio', 'audio/wav'
+    if head.startswith(b"ID3") or (len(head) > 1 and head[0] == 0xff and head[1] & 0xe0 == 0xe0):
+        return 'audio', 'audio/mpeg'
+    if head.startswith(b"OggS"):
+        return 'audio', 'audio/ogg'
+    if head[4:8] == b"ftyp":
+        return 'audio', 'audio/mp4'
+    if head.startswith(b"\x1a\x45\xdf\xa3"):
+        return 'audio', 'audio/webm'
+    return None
+
+class SpooledUpload:
+    """Upload-Inhalt bis memory_limit im Speicher, darüber in einer benannten Datei in spool_dir
+    
+    Der Inhalt wird nur einmal geschrieben; Speicher und Prozessoren erhalten einen Pfad
+    (path(), move_to()) oder eine memoryview (view()) statt weiterer Kopien als bytes.
+    """
+    
+    def __init__(self, filename: str, content_type: str, spool_dir: str, memory_limit: int = 1024 * 1024):
+        self.filename = filename
+        self.content_type = content_type
+        self.spool_dir = Path(spool_dir)
+        self.memory_limit = memory_limit
+        self.size = 0
+        self.head = b""
+        self.file_type: Optional[str] = None
+        
+        self._hash = hashlib.sha256()
+        self._buffer: Optional[io.BytesIO] = io.BytesIO()
+        self._file = None
+        self._path: Optional[Path] = None
+        # False, sobald die Datei per move_to übergeben wurde
+        self._owned = True
+    
+    def write(self, chunk: bytes):
+        """Hängt einen Block an und aktualisiert Größe und Prüfsumme"""
+        if len(self.head) < 64:
+            self.head += chunk[:64 - len(self.head)]
+        self._hash.update(chunk)
+        self.size += len(chunk)
+        if self._buffer is not None and self._buffer.tell() + len(chunk) > self.memory_limit:
+            self._spill()
+        (self._buffer if self._buffer is not None else self._file).write(chunk)
+    
+    def _spill(self):
+        """Wechselt vom Speicher in eine Datei im Spool-Verzeichnis"""
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        self._file = tempfile.NamedTemporaryFile(dir=self.spool_dir, prefix="upload_", delete=False)
+        self._path = Path(self._file.name)
+        self._file.write(self._buffer.getbuffer())
+        self._buffer = None
+    
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+    
+    def finish(self):
+        """Abschluss des Empfangs: Spool-Datei schließen"""
+        if self._file is not None:
+            self._file.close()
+    
+    def view(self) -> Optional[memoryview]:
+        """Inhalt als memoryview, solange er im Speicher liegt (sonst None)"""
+        return self._buffer.getbuffer() if self._buffer is not None else None
+    
+    def content(self) -> Union[memoryview, Path]:
+        """memoryview (kleine Uploads) oder Pfad der Spool-Datei"""
+        return self.view() if self._buffer is not None else self._path
+    
+    def path(self) -> Path:
+        """Pfad des Inhalts; kleine Uploads werden dafür einmalig in die Spool-Datei geschrieben"""
+        if self._path is None:
+            self._spill()
+            self.finish()
+        return self._path
+    
+    def move_to(self, target: Path) -> Path:
+        """Übergibt den Inhalt als Datei an target (rename statt Kopie, wenn möglich)"""
+        source = self.path()
+        target.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.replace(source, target)
+        except OSError:
+            # Anderes Dateisystem
+            shutil.move(str(source), str(target))
+        self._path = target
+        self._owned = False
+        return target
+    
+    def close(self):
+        """Entfernt eine nicht übergebene Spool-Datei"""
+        if self._file is not None:
+            self._file.close()
+        if self._path is not None and self._owned:
+            self._path.unlink(missing_ok=True)
+        self._buffer = None
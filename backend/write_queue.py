@@ -0,0 +1,162 @@
+"""
+Write Queue Module für Praivio
+Ein Schreib-Thread pro SQLite-Datei, der Schreiboperationen als Gruppen-Commit ausführt
+"""
+
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Optional, Dict, Any, Callable, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+class WriteResult(NamedTuple):
+    """Ergebnis eines einzelnen Statements aus WriteQueue.execute"""
+    lastrowid: Optional[int]
+    rowcount: int
+
+class WriteQueueClosedError(RuntimeError):
+    """Die Schreib-Queue wurde bereits gestoppt"""
+
+class WriteQueue:
+    """Besitzt die einzige Schreibverbindung einer SQLite-Datei
+    
+    Operationen laufen in Eingangsreihenfolge. Alles, was sich während eines Commits
+    angesammelt hat, wird im nächsten gemeinsamen Commit ausgeführt; jede Operation
+    läuft in einem eigenen SAVEPOINT, ein Fehler betrifft daher nur ihr eigenes Future.
+    Futures werden erst nach dem Commit erfüllt: wer auf das Ergebnis wartet, liest
+    anschließend die eigenen Schreibvorgänge (read-your-writes).
+    """
+    
+    def __init__(self, db_path: str, max_batch: int = 256, busy_timeout_ms: int = 5000):
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self.busy_timeout_ms = busy_timeout_ms
+        
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._closed = False
+        self._metrics = {
+            'operations': 0,
+            'failed_operations': 0,
+            'commits': 0,
+            'max_batch_size': 0,
+            'commit_time_ms': 0.0
+        }
+        self._metrics_lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name=f"db-writer-{db_path}", daemon=True)
+        self._worker.start()
+    
+    def submit(self, operation: Callable[[sqlite3.Cursor], Any]) -> Future:
+        """Reiht eine Operation ein; sie erhält einen Cursor der Schreibverbindung"""
+        if self._closed:
+            raise WriteQueueClosedError("Schreib-Queue ist gestoppt")
+        future: Future = Future()
+        self._queue.put((operation, future))
+        return future
+    
+    def execute(self, sql: str, params: tuple = ()) -> Future:
+        """Reiht ein einzelnes Statement ein, das Future liefert WriteResult(lastrowid, rowcount)"""
+        def operation(cursor: sqlite3.Cursor) -> WriteResult:
+            cursor.execute(sql, params)
+            return WriteResult(cursor.lastrowid, cursor.rowcount)
+        return self.submit(operation)
+    
+    def run(self, operation: Callable[[sqlite3.Cursor], Any]) -> Any:
+        """Führt eine Operation aus und wartet auf den Commit"""
+        return self.submit(operation).result()
+    
+    def close(self, timeout: float = 30.0):
+        """Arbeitet die Queue ab und schließt die Schreibverbindung"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._worker.join(timeout)
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        metrics['queue_depth'] = self._queue.qsize()
+        metrics['avg_batch_size'] = (
+            round(metrics['operations'] / metrics['commits'], 1) if metrics['commits'] else 0
+        )
+        return metrics
+    
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit-Modus: Transaktionen werden hier explizit gesteuert
+        conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        return conn
+    
+    def _run(self):
+        conn = self._connect()
+        try:
+            stopping = False
+            while not stopping:
+                item = self._queue.get()
+                if item is None:
+                    break
+                batch = [item]
+                # Alles einsammeln, was während des letzten Commits eingetroffen ist
+                while len(batch) < self.max_batch:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stopping = True
+                        break
+                    batch.append(item)
+                self._commit_batch(conn, batch)
+        finally:
+            conn.close()
+            # Nach dem Stopp eingereihte Operationen nicht hängen lassen
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None:
+                    item[1].set_exception(WriteQueueClosedError("Schreib-Queue ist gestoppt"))
+    
+    def _commit_batch(self, conn: sqlite3.Connection, batch: list):
+        started = time.perf_counter()
+        batch = [(operation, future) for operation, future in batch if future.set_running_or_notify_cancel()]
+        results = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            cursor = conn.cursor()
+            for operation, future in batch:
+                cursor.execute("SAVEPOINT write_op")
+                try:
+                    results.append((future, operation(cursor), None))
+                    cursor.execute("RELEASE write_op")
+                except Exception as e:
+                    cursor.execute("ROLLBACK TO write_op")
+                    cursor.execute("RELEASE write_op")
+                    results.append((future, None, e))
+            conn.execute("COMMIT")
+        except Exception as e:
+            logger.error(f"Group commit failed for {self.db_path}: {e}")
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        
+        for future, value, error in results:
+            if error is None:
+                future.set_result(value)
+            else:
+                future.set_exception(error)
+        
+        with self._metrics_lock:
+            self._metrics['operations'] += len(results)
+            self._metrics['failed_operations'] += sum(1 for _, _, error in results if error is not None)
+            self._metrics['commits'] += 1
+            self._metrics['max_batch_size'] = max(self._metrics['max_batch_size'], len(results))
+            self._metrics['commit_time_ms'] += (time.perf_counter() - started) * 1000
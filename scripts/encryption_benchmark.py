@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark der Feldverschlüsselung: Overhead pro Zeile in Mikrosekunden
+
+Vergleicht AES-GCM mit gecachtem Datenschlüssel (field_encryption) mit dem bisherigen
+Fernet-Pfad (SecurityManager.encrypt_sensitive_data) und misst Speichern und Listen
+von Generierungen gegen eine temporäre SQLite-Datenbank mit und ohne Verschlüsselung.
+
+    python scripts/encryption_benchmark.py --rows 2000 --sizes 1024 8192 65536
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from database import DatabaseManager  # noqa: E402
+from field_encryption import FieldEncryptor  # noqa: E402
+from security import SecurityManager  # noqa: E402
+
+def per_row_us(func, rows: int) -> float:
+    started = time.perf_counter()
+    func()
+    return (time.perf_counter() - started) / rows * 1_000_000
+
+def sample_text(size: int) -> str:
+    line = "Befund: Patient zeigt unauffällige Vitalparameter, Kontrolle in vier Wochen.\n"
+    return (line * (size // len(line) + 1))[:size]
+
+def bench_primitives(encryptor: FieldEncryptor, rows: int, size: int):
+    text = sample_text(size)
+    encrypted = []
+    
+    def encrypt():
+        for _ in range(rows):
+            encrypted.append({'user_id': "bench-user", **encryptor.encrypt_fields("bench-user", {'generated_text': text})})
+    
+    def decrypt():
+        encryptor.decrypt_rows(encrypted, ['generated_text'])
+    
+    security = SecurityManager("benchmark-secret")
+    tokens = []
+    
+    def fernet_encrypt():
+        for _ in range(rows):
+            tokens.append(security.encrypt_sensitive_data(text))
+    
+    def fernet_decrypt():
+        for token in tokens:
+            security.decrypt_sensitive_data(token)
+    
+    print(f"  {size:>6} B  AES-GCM enc {per_row_us(encrypt, rows):8.1f} µs  dec {per_row_us(decrypt, rows):8.1f} µs"
+          f"  | Fernet enc {per_row_us(fernet_encrypt, rows):8.1f} µs  dec {per_row_us(fernet_decrypt, rows):8.1f} µs")
+
+def bench_database(tmp: str, master_key: bytes, rows: int, size: int, encrypted: bool) -> tuple:
+    db = DatabaseManager(os.path.join(tmp, f"bench_{size}_{int(encrypted)}.db"))
+    if encrypted:
+        db.set_field_encryptor(FieldEncryptor(db, master_key))
+    text = sample_text(size)
+    
+    def save():
+        for _ in range(rows):
+            db.save_text_generation("bench-user", "Prompt", text, "llama2", 100, 1.0)
+    
+    def list_pages():
+        cursor = None
+        while True:
+            page = db.get_user_generations_page("bench-user", limit=100, cursor=cursor)
+            cursor = page['next_cursor']
+            if not cursor:
+                break
+    
+    return per_row_us(save, rows), per_row_us(list_pages, rows)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1024, 8192, 65536])
+    args = parser.parse_args()
+    master_key = os.urandom(32)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        key_store = DatabaseManager(os.path.join(tmp, "keys.db"))
+        encryptor = FieldEncryptor(key_store, master_key)
+        
+        print(f"Verschlüsselung pro Zeile ({args.rows} Zeilen)")
+        for size in args.sizes:
+            bench_primitives(encryptor, args.rows, size)
+        
+        started = time.perf_counter()
+        encryptor.keys.clear()
+        encryptor.keys.get(0)
+        print(f"\nDatenschlüssel laden (Cache-Miss, Entpacken): {(time.perf_counter() - started) * 1_000_000:.1f} µs")
+        
+        print(f"\nSQLite speichern/listen pro Zeile ({args.rows} Zeilen, Seiten à 100)")
+        for size in args.sizes:
+            plain_save, plain_list = bench_database(tmp, master_key, args.rows, size, encrypted=False)
+            enc_save, enc_list = bench_database(tmp, master_key, args.rows, size, encrypted=True)
+            print(f"  {size:>6} B  speichern {plain_save:8.1f} -> {enc_save:8.1f} µs (+{enc_save - plain_save:.1f})"
+                  f"  listen {plain_list:8.1f} -> {enc_list:8.1f} µs (+{enc_list - plain_list:.1f})")
+
+if __name__ == "__main__":
+    main()
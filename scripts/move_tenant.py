@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Verschiebt eine Organisation auf einen anderen SQLite-Shard
+
+    python scripts/move_tenant.py --list
+    python scripts/move_tenant.py 3 org_3
+    python scripts/move_tenant.py --assign <supabase-user-id> 3
+
+Die Pfade entsprechen DATABASE_URL und DATABASE_SHARD_DIR des Backends.
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from database_sharding import ShardedDatabaseManager  # noqa: E402
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("organization_id", nargs="?", type=int, help="Organisation")
+    parser.add_argument("shard", nargs="?", help="Ziel-Shard, z.B. org_3 oder main")
+    parser.add_argument("--list", action="store_true", help="Organisationen und Shards anzeigen")
+    parser.add_argument("--assign", metavar="USER_ID", help="Benutzer der Organisation zuordnen")
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL", "sqlite:///./data/app.db"))
+    parser.add_argument("--shard-dir", default=os.getenv("DATABASE_SHARD_DIR") or "./data/shards")
+    args = parser.parse_args()
+    
+    if not args.database_url.startswith("sqlite:///"):
+        parser.error("Sharding wird nur mit SQLite unterstützt")
+    db = ShardedDatabaseManager(args.database_url[len("sqlite:///"):], args.shard_dir)
+    
+    try:
+        if args.list:
+            for tenant in db.get_tenants():
+                print(f"{tenant['organization_id']:>5}  {tenant['shard']:<20} {tenant['status']:<8} "
+                      f"{tenant['members']:>5} Benutzer  {tenant['name']}")
+        elif args.assign and args.organization_id is not None:
+            result = db.assign_user(args.assign, args.organization_id)
+            print(f"✅ Benutzer {result['user_id']} -> Organisation {result['organization_id']} {result['rows']}")
+        elif args.organization_id is not None and args.shard:
+            print(f"Verschiebe Organisation {args.organization_id} nach {args.shard} ...")
+            result = db.move_tenant(args.organization_id, args.shard)
+            if result['moved']:
+                print(f"✅ Verschoben: {result['rows']}")
+            else:
+                print("Organisation liegt bereits auf diesem Shard")
+        else:
+            parser.print_help()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Schreibdurchsatz mit und ohne Gruppen-Commit (SQLite)
+
+Mehrere Threads schreiben gleichzeitig Chat-Nachrichten und Generierungen in eine
+temporäre Datenbank, wie parallele API-Requests:
+
+    python scripts/write_throughput.py --threads 16 --rows 500
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from database import DatabaseManager  # noqa: E402
+
+def run(path: str, group_commit: bool, threads: int, rows: int) -> tuple:
+    db = DatabaseManager(path, group_commit=group_commit)
+    errors = []
+    
+    def worker(index: int):
+        session_id = f"bench_{index}_{uuid.uuid4().hex[:8]}"
+        db.create_chat_session(session_id, f"user-{index}", "Benchmark", "llama2")
+        for i in range(rows):
+            try:
+                if i % 2:
+                    db.add_chat_message(f"{session_id}_{i}", session_id, "user", f"Nachricht {i}")
+                else:
+                    db.save_text_generation(f"user-{index}", "Prompt", f"Text {i}", "llama2", 10, 0.5)
+            except Exception as e:
+                errors.append(e)
+    
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(worker, range(threads)))
+    elapsed = time.perf_counter() - started
+    metrics = db.get_write_metrics()
+    db.close()
+    return threads * rows / elapsed, len(errors), metrics
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--rows", type=int, default=500, help="Schreibvorgänge pro Thread")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        for group_commit in (False, True):
+            rate, errors, metrics = run(
+                os.path.join(tmp, f"bench_{int(group_commit)}.db"), group_commit, args.threads, args.rows
+            )
+            label = "Gruppen-Commit " if group_commit else "Eigene Commits "
+            print(f"{label} {rate:10.0f} Zeilen/s  Fehler: {errors}")
+            if metrics:
+                print(f"                 Commits: {metrics['commits']}, Ø Batch: {metrics['avg_batch_size']}, "
+                      f"max. Batch: {metrics['max_batch_size']}")
+
+if __name__ == "__main__":
+    main()